@@ -8,6 +8,7 @@ from rest_framework import routers
 from api.status import views
 
 router = routers.DefaultRouter(trailing_slash=False)
+router.register(r'cache', views.CacheViewSet, base_name='cache')
 router.register(r'celery', views.CeleryViewSet, base_name='celery')
 
 api_status_urls = router.urls
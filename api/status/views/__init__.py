@@ -1,2 +1,3 @@
 # flake8: noqa
+from .cache import CacheViewSet
 from .celery import CeleryViewSet
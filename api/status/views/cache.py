@@ -0,0 +1,23 @@
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+
+from core.redis_pool import redis_health_check
+from service.cache import cache_stats
+
+
+class CacheViewSet(ViewSet):
+    """
+    API endpoint that prints the cloud cache counters of this worker
+    """
+
+    def list(self, request):
+        """
+        Return whether redis is reachable, and the hit/miss/refresh
+        counters keyed by '<resource>.<event>'
+        """
+        resp = {
+            'redis_available': redis_health_check(),
+            'counters': cache_stats()
+        }
+        status_code = 200 if resp['redis_available'] else 503
+        return Response(resp, status=status_code)
@@ -2,6 +2,8 @@ import uuid
 import mock
 
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from rest_framework.test import APIClient
@@ -10,7 +12,10 @@ from rest_framework.test import APITestCase
 from api.tests.factories import (
     UserFactory, AnonymousUserFactory, InstanceFactory, InstanceHistoryFactory,
     InstanceStatusFactory, ProviderMachineFactory, IdentityFactory,
-    ProviderFactory
+    ProviderFactory, AllocationSourceFactory
+)
+from core.models import (
+    AllocationSourceSnapshot, InstanceAllocationSourceSnapshot
 )
 from .base import APISanityTestCase
 from api.v2.views import InstanceViewSet
@@ -164,3 +169,40 @@ class InstanceTests(APITestCase, APISanityTestCase):
         with mock.patch('api.v2.views.instance.destroy_instance'):
             response = client.delete(url, HTTP_ACCEPT='application/json')
         self.assertEquals(response.status_code, 204)
+
+    def _list_queries(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse(self.url_route + "-list"))
+        self.assertEquals(response.status_code, 200)
+        return len(queries)
+
+    def test_list_query_count_does_not_grow_with_instances(self):
+        allocation_source = AllocationSourceFactory.create(name='TG-1')
+        AllocationSourceSnapshot.objects.create(
+            allocation_source=allocation_source,
+            compute_used=0,
+            global_burn_rate=0
+        )
+        InstanceAllocationSourceSnapshot.objects.create(
+            instance=self.active_instance, allocation_source=allocation_source
+        )
+        few_instances = self._list_queries()
+
+        for _ in range(5):
+            instance = InstanceFactory.create(
+                provider_alias=uuid.uuid4(),
+                source=ProviderMachineFactory.create_provider_machine(
+                    self.user, self.user_identity
+                ).instance_source,
+                created_by=self.user,
+                created_by_identity=self.user_identity,
+                start_date=timezone.now()
+            )
+            InstanceHistoryFactory.create(instance=instance)
+            InstanceHistoryFactory.create(instance=instance)
+            InstanceAllocationSourceSnapshot.objects.create(
+                instance=instance, allocation_source=allocation_source
+            )
+        self.assertEquals(self._list_queries(), few_instances)
@@ -1,9 +1,10 @@
 from decimal import Decimal
 
 import django
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
 
-from core.models.allocation_source import AllocationSource, AllocationSourceSnapshot, UserAllocationSnapshot
+from core.models.allocation_source import AllocationSource, UserAllocationSnapshot
 from api.v2.serializers.fields.base import UUIDHyperlinkedIdentityField
 
 
@@ -20,10 +21,10 @@ class AllocationSourceSerializer(serializers.HyperlinkedModelSerializer):
     )
 
     def _get_allocation_source_snapshot(self, allocation_source, attr_name):
-        snapshot = AllocationSourceSnapshot.objects.filter(
-            allocation_source=allocation_source
-        ).first()
-        if not snapshot:
+        # NOTE: Uses the snapshot loaded by `select_related('snapshot')`, when available.
+        try:
+            snapshot = allocation_source.snapshot
+        except ObjectDoesNotExist:
             return None
         attr = getattr(snapshot, attr_name)
         return attr
@@ -34,10 +35,16 @@ class AllocationSourceSerializer(serializers.HyperlinkedModelSerializer):
         return self.context['request'].user
 
     def _get_user_allocation_snapshot(self, allocation_source, attr_name):
-        user = self._get_request_user()
-        snapshot = UserAllocationSnapshot.objects.filter(
-            allocation_source=allocation_source, user=user
-        ).first()
+        # Serializers of many rows pass the request user's snapshots
+        # (by allocation source id) instead of querying once per row.
+        user_snapshots = self.context.get('user_allocation_snapshots')
+        if user_snapshots is not None:
+            snapshot = user_snapshots.get(allocation_source.id)
+        else:
+            user = self._get_request_user()
+            snapshot = UserAllocationSnapshot.objects.filter(
+                allocation_source=allocation_source, user=user
+            ).first()
         if not snapshot:
             return None
         attr = getattr(snapshot, attr_name)
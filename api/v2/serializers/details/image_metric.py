@@ -1,5 +1,7 @@
 from core.models import Application as Image
-from core.metrics.application import _get_summarized_application_metrics
+from core.metrics.application import (
+    _get_summarized_application_metrics, get_cached_application_metrics
+)
 from rest_framework import serializers
 from api.v2.serializers.fields.base import UUIDHyperlinkedIdentityField
 
@@ -23,6 +25,21 @@ class ImageMetricSerializer(serializers.HyperlinkedModelSerializer):
     is_featured = serializers.SerializerMethodField()
     metrics = serializers.SerializerMethodField()
 
+    def _cached_metrics(self):
+        """
+        When listing, fetch the cached metrics of every application on the
+        page in one round trip (instead of one redis call per row).
+        """
+        if not hasattr(self, '_metrics_by_application'):
+            applications = getattr(self.parent, 'instance', None)
+            if self.parent is None or applications is None:
+                self._metrics_by_application = {}
+            else:
+                self._metrics_by_application = get_cached_application_metrics(
+                    applications
+                )
+        return self._metrics_by_application
+
     def get_is_featured(self, application):
         return application.featured()
 
@@ -36,6 +53,9 @@ class ImageMetricSerializer(serializers.HyperlinkedModelSerializer):
                 "context! context={'user':user}"
             )
         # Summarized metrics example
+        cached_metrics = self._cached_metrics().get(application.id)
+        if cached_metrics is not None:
+            return cached_metrics
         return _get_summarized_application_metrics(application)
 
     class Meta:
@@ -1,7 +1,4 @@
-from core.models import (
-    Project, BootScript, Instance, Application as Image,
-    InstanceAllocationSourceSnapshot
-)
+from core.models import (Project, BootScript, Instance, UserAllocationSnapshot)
 from rest_framework import serializers
 from core.serializers.fields import ModelRelatedField
 from api.v2.serializers.details import AllocationSourceSerializer
@@ -46,22 +43,40 @@ class InstanceSerializer(serializers.HyperlinkedModelSerializer):
         uuid_field='provider_alias'
     )
 
+    def _allocation_source_context(self):
+        """
+        Load the request user's allocation snapshots once (not once per
+        instance) for AllocationSourceSerializer.
+        """
+        if not hasattr(self, '_user_snapshots'):
+            request = self.context.get('request')
+            self._user_snapshots = None
+            if request:
+                snapshots = UserAllocationSnapshot.objects.filter(
+                    user=request.user
+                )
+                self._user_snapshots = dict(
+                    (snapshot.allocation_source_id, snapshot)
+                    for snapshot in snapshots
+                )
+        return dict(
+            self.context, user_allocation_snapshots=self._user_snapshots
+        )
+
     def get_allocation_source(self, instance):
-        snapshot = InstanceAllocationSourceSnapshot.objects.filter(
-            instance=instance
-        ).first()
-        if not snapshot:
+        allocation_source = instance.allocation_source
+        if not allocation_source:
             return None
         serializer = AllocationSourceSerializer(
-            snapshot.allocation_source, context=self.context
+            allocation_source, context=self._allocation_source_context()
         )
         return serializer.data
 
     def get_usage(self, instance):
-        if not instance.allocation_source\
-                or not instance.allocation_source.snapshot:
+        allocation_source = instance.allocation_source
+        if not allocation_source:
             return -1
-        return instance.allocation_source.snapshot.compute_used
+        return allocation_source.compute_used
 
     def get_size(self, obj):
         size = obj.get_size()
@@ -71,8 +86,7 @@ class InstanceSerializer(serializers.HyperlinkedModelSerializer):
     def get_image(self, obj):
         if not obj.source.is_machine():
             return {}
-        image_uuid = obj.application_uuid()
-        image = Image.objects.get(uuid=image_uuid)
+        image = obj.source.providermachine.application_version.application
         serializer = ImageSuperSummarySerializer(image, context=self.context)
         return serializer.data
 
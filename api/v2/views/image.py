@@ -7,6 +7,9 @@ from api.v2.views.base import AuthOptionalViewSet
 from api.v2.views.mixins import MultipleFieldLookup
 
 from core.models import Application as Image
+from core.models.search_document import (
+    full_text_search_enabled, search_applications
+)
 
 #
 # The following imports and method and monkey patch are a quick fix for a big
@@ -46,6 +49,28 @@ def filter_queryset(self, request, queryset, view):
 filters.SearchFilter.filter_queryset = filter_queryset
 
 
+class ImageSearchFilter(filters.SearchFilter):
+    """
+    Search images by (prefix) matching every search term against their
+    full-text search document, best matches first (unless the request
+    asks for an explicit 'ordering').
+    Falls back to the `search_fields` filters when full-text search is
+    unavailable.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or not full_text_search_enabled():
+            return super(ImageSearchFilter,
+                         self).filter_queryset(request, queryset, view)
+        ordering_param = filters.OrderingFilter.ordering_param
+        return search_applications(
+            queryset,
+            search_terms,
+            rank=not request.query_params.get(ordering_param)
+        )
+
+
 class ImageFilter(filters.FilterSet):
     created_by = django_filters.CharFilter('created_by__username')
     project_id = django_filters.CharFilter('projects__uuid')
@@ -107,8 +132,8 @@ class ImageViewSet(MultipleFieldLookup, AuthOptionalViewSet):
 
     serializer_class = ImageSerializer
     filter_backends = (
-        filters.OrderingFilter, filters.DjangoFilterBackend,
-        filters.SearchFilter, FeaturedFilterBackend, BookmarkedFilterBackend
+        filters.OrderingFilter, filters.DjangoFilterBackend, ImageSearchFilter,
+        FeaturedFilterBackend, BookmarkedFilterBackend
     )
     filter_class = ImageFilter
     search_fields = (
@@ -1,5 +1,5 @@
 import django_filters
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 
 from api.v2.serializers.details import InstanceSerializer, InstanceActionSerializer
 from api.v2.serializers.post import InstanceSerializer as POST_InstanceSerializer
@@ -7,9 +7,12 @@ from api.v2.views.base import AuthModelViewSet
 from api.v2.views.mixins import MultipleFieldLookup
 
 from core.exceptions import ProviderNotActive
-from core.models import Instance, Identity, UserAllocationSource, Project, AllocationSource
+from core.models import (
+    Instance, Identity, UserAllocationSource, Project, AllocationSource,
+    BootScript
+)
 from core.models.boot_script import _save_scripts_to_instance
-from core.models.instance import find_instance
+from core.models.instance import find_instance, ALLOCATION_SOURCE_RELATED
 from core.models.instance_action import InstanceAction
 from core.query import only_current_instances
 
@@ -82,10 +85,23 @@ class InstanceViewSet(MultipleFieldLookup, AuthModelViewSet):
         if 'archived' not in self.request.query_params:
             qs = qs.filter(only_current_instances())
         # logger.info("DEBUG- User %s querying for instances, available IDs are:%s" % (user, qs.values_list('id',flat=True)))
+        # Load everything InstanceSerializer reads up front,
+        # so listing instances does not query once per instance.
         qs = qs.select_related("created_by")\
-            .select_related('created_by_identity')\
-            .select_related('source')\
-            .select_related('project')
+            .select_related('created_by_identity__provider')\
+            .select_related(
+                'source__providermachine__application_version__application'
+            )\
+            .select_related('project__owner', 'project__created_by')\
+            .select_related('last_size')\
+            .select_related(ALLOCATION_SOURCE_RELATED)\
+            .prefetch_related(
+                'created_by_identity__credential_set',
+                Prefetch(
+                    'scripts',
+                    queryset=BootScript.objects.select_related('script_type')
+                )
+            )
         return qs
 
     @detail_route(methods=['post'])
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 cwd_path = os.path.dirname(os.path.dirname(__file__))
 os.environ.setdefault('PYTHONPATH', cwd_path)
@@ -43,6 +44,18 @@ serialization.registry._disabled_content_types.discard(
 )
 
 
+@worker_process_init.connect
+def preload_lookup_caches(**kwargs):
+    from core.lookup_cache import preload
+    preload()
+
+
+@worker_process_init.connect
+def preload_plugins(**kwargs):
+    from core.plugins import preload_plugins
+    preload_plugins()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
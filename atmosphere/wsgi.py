@@ -62,3 +62,6 @@ try:
     application = get_wsgi_application()
 except Exception as e:
     raise
+
+from core.plugins import preload_plugins
+preload_plugins()
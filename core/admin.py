@@ -9,10 +9,40 @@ from threepio import logger
 from core import email
 from core import models
 from core.events.serializers.quota_assigned import QuotaAssignedSerializer
+from core.models.image_visibility import refresh_application_visibility
+
+
+def _refresh_image_visibility(queryset):
+    """
+    `queryset.update` skips the post_save signals that keep
+    ApplicationVisibility current: refresh the applications affected by
+    an update of `queryset` here instead.
+    """
+    model = queryset.model
+    if model == models.Application:
+        application_ids = queryset.values_list('id', flat=True)
+    elif model == models.ApplicationVersion:
+        application_ids = queryset.values_list('application_id', flat=True)
+    elif model == models.ProviderMachine:
+        application_ids = queryset.values_list(
+            'application_version__application_id', flat=True
+        )
+    elif model == models.InstanceSource:
+        application_ids = models.ProviderMachine.objects.filter(
+            instance_source__in=queryset
+        ).values_list(
+            'application_version__application_id', flat=True
+        )
+    else:
+        return
+    refresh_application_visibility(
+        [app_id for app_id in application_ids if app_id]
+    )
 
 
 def private_object(modeladmin, request, queryset):
     queryset.update(private=True)
+    _refresh_image_visibility(queryset)
 
 
 private_object.short_description = 'Make objects private True'
@@ -24,6 +54,7 @@ def end_date_machine(modeladmin, request, queryset):
         id__in=instance_source_ids
     )
     instance_source_qs.update(end_date=timezone.now())
+    _refresh_image_visibility(queryset)
 
 
 end_date_machine.short_description = 'Add end-date to machines'
@@ -31,6 +62,7 @@ end_date_machine.short_description = 'Add end-date to machines'
 
 def end_date_object(modeladmin, request, queryset):
     queryset.update(end_date=timezone.now())
+    _refresh_image_visibility(queryset)
 
 
 end_date_object.short_description = 'Add end-date to objects'
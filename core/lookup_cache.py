@@ -0,0 +1,69 @@
+"""
+Process-local caches of small lookup rows that are read far more often
+than they change (InstanceStatus by name, the 'Unknown Size' sentinel
+of each provider).
+
+A row is only remembered once the transaction that read (or created) it
+commits, so a rolled back row is never served. Deleting a row drops it
+from the cache, and every miss is refreshed from the database.
+Celery workers preload the caches when they start (see `preload`).
+"""
+import threading
+
+from django.db import transaction
+
+
+class LookupCache(object):
+    def __init__(self, name):
+        self.name = name
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """
+        Return the cached row for `key`, or the row returned by `load()`
+        (remembered after the current transaction commits).
+        """
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        row = load()
+        transaction.on_commit(lambda: self._remember(key, row))
+        return row
+
+    def _remember(self, key, row):
+        with self._lock:
+            self._rows[key] = row
+
+    def load(self, rows_by_key):
+        """
+        Replace the cached rows with `rows_by_key`.
+        """
+        with self._lock:
+            self._rows = dict(rows_by_key)
+
+    def discard(self, pk):
+        """
+        Forget every key cached for the row with primary key `pk`.
+        """
+        with self._lock:
+            self._rows = dict(
+                (key, row) for key, row in self._rows.items() if row.pk != pk
+            )
+
+    def clear(self):
+        with self._lock:
+            self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def preload():
+    """
+    Load every cached lookup table (e.g. when a worker process starts).
+    """
+    from core.models.instance_history import preload_instance_statuses
+    from core.models.size import preload_unknown_sizes
+    preload_instance_statuses()
+    preload_unknown_sizes()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.models.image_visibility import (
+    rebuild_application_visibility, REBUILD_CHUNK_SIZE
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized image visibility table from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=REBUILD_CHUNK_SIZE,
+            help="Number of applications to rebuild at a time"
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_application_visibility(chunk_size=options['chunk_size'])
+        self.stdout.write("Rebuilt %s image visibility rows" % total)
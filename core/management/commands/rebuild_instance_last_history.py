@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.models.instance_history import (
+    rebuild_last_histories, REFRESH_CHUNK_SIZE
+)
+
+
+class Command(BaseCommand):
+    help = "Recompute every instance's last_* (newest history) fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=REFRESH_CHUNK_SIZE,
+            help="Number of instances to update at a time"
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_last_histories(chunk_size=options['chunk_size'])
+        self.stdout.write("Updated the last history of %s instances" % total)
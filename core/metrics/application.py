@@ -1,28 +1,51 @@
 import pickle
 import collections
-import redis
 
 from threepio import logger
 from core.models import Instance
+from core.redis_pool import get_redis_connection, get_many
 
 METRICS_CACHE_DURATION = 4 * 24 * 60 * 60    # 4 days (persist over the weekend)
 
 
+def _metrics_key(application):
+    return "metrics-application-summary-%s" % (application.id)
+
+
+def get_cached_application_metrics(applications):
+    """
+    Return {application.id: metrics} for every application in
+    `applications` that is already cached, using a single round trip.
+    """
+    applications = list(applications)
+    try:
+        cached_values = get_many(
+            [_metrics_key(application) for application in applications]
+        )
+    except:
+        logger.exception("Unexpected errror in application metrics")
+        return {}
+    return {
+        application.id: pickle.loads(pickled_object)
+        for application, pickled_object in zip(applications, cached_values)
+        if pickled_object is not None
+    }
+
+
 def _get_summarized_application_metrics(
     application, force=False, read_only=False
 ):
     metrics = collections.OrderedDict()
-    redis_cache = redis.StrictRedis()
-    key = "metrics-application-summary-%s" % (application.id)
+    redis_cache = get_redis_connection()
+    key = _metrics_key(application)
     try:
-        if redis_cache.exists(key) and not force:
-            pickled_object = redis_cache.get(key)
+        pickled_object = None if force else redis_cache.get(key)
+        if pickled_object is not None:
             metrics = pickle.loads(pickled_object)
         elif not read_only:
             metrics = calculate_summarized_application_metrics(application)
             pickled_object = pickle.dumps(metrics)
-            redis_cache.set(key, pickled_object)
-            redis_cache.expire(key, METRICS_CACHE_DURATION)
+            redis_cache.set(key, pickled_object, ex=METRICS_CACHE_DURATION)
     except:
         logger.exception("Unexpected errror in application metrics")
     return metrics
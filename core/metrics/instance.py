@@ -4,13 +4,14 @@
 import json
 
 from django.conf import settings
-import redis
 import requests
 
 from rest_framework.exceptions import NotFound
 
 from threepio import logger
 
+from core.redis_pool import get_redis_connection
+
 # The hyper-stats service fetches metrics every minute
 CACHE_DURATION = 60
 
@@ -109,17 +110,20 @@ def _to_instance_key(instance, fields):
 def get_instance_metrics(instance, params=None):
     fields = params_to_fields(params)
     key = _to_instance_key(instance, fields)
-    redis_cache = redis.StrictRedis()
+    redis_cache = get_redis_connection()
     instance_metrics = {}
     try:
-        if redis_cache.exists(key):
-            instance_metrics = json.loads(redis_cache.get(key))
+        # A single GET (None on a miss) rather than EXISTS + GET
+        cached_metrics = redis_cache.get(key)
+        if cached_metrics is not None:
+            instance_metrics = json.loads(cached_metrics)
         else:
             instance_metrics = request_instance_metrics(
                 instance.provider_alias, params=params
             )
-            redis_cache.set(key, json.dumps(instance_metrics))
-            redis_cache.expire(key, CACHE_DURATION)
+            redis_cache.set(
+                key, json.dumps(instance_metrics), ex=CACHE_DURATION
+            )
     except Exception:
         logger.exception("Failed to retrieve metrics")
     return instance_metrics
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import TextField, Value
+import django.db.models.deletion
+
+
+def _text(values):
+    return ' '.join(value for value in values if value)
+
+
+def _weighted(text, weight):
+    return SearchVector(
+        Value(text, output_field=TextField()), config='simple', weight=weight
+    )
+
+
+def rebuild_search_documents(apps, schema_editor):
+    """
+    Backfill the search document of every application.
+    NOTE: Uses the historical models; keep this in sync with
+    `core.models.search_document.refresh_search_documents`.
+    """
+    Application = apps.get_model('core', 'Application')
+    ApplicationSearchDocument = apps.get_model(
+        'core', 'ApplicationSearchDocument'
+    )
+    ApplicationVersion = apps.get_model('core', 'ApplicationVersion')
+    ProviderMachine = apps.get_model('core', 'ProviderMachine')
+    application_tags = Application.tags.through.objects
+    tags = defaultdict(list)
+    tag_descriptions = defaultdict(list)
+    for application_id, name, description in application_tags.values_list(
+        'application_id', 'tag__name', 'tag__description'
+    ):
+        tags[application_id].append(name)
+        tag_descriptions[application_id].append(description)
+    details = defaultdict(list)
+    for application_id, change_log in ApplicationVersion.objects.values_list(
+        'application_id', 'change_log'
+    ):
+        details[application_id].append(change_log)
+    for application_id, identifier, location in ProviderMachine.objects.filter(
+        application_version__isnull=False
+    ).values_list(
+        'application_version__application_id', 'instance_source__identifier',
+        'instance_source__provider__location'
+    ):
+        details[application_id].extend([identifier, location])
+
+    applications = list(
+        Application.objects.values_list(
+            'id', 'name', 'description', 'created_by__username'
+        )
+    )
+    ApplicationSearchDocument.objects.bulk_create(
+        [
+            ApplicationSearchDocument(application_id=application_id)
+            for application_id, _, _, _ in applications
+        ],
+        batch_size=500
+    )
+    for application_id, name, description, username in applications:
+        ApplicationSearchDocument.objects.filter(
+            application_id=application_id
+        ).update(
+            document=(
+                _weighted(name, 'A') +
+                _weighted(_text(tags[application_id]), 'B') + _weighted(
+                    _text([description] + tag_descriptions[application_id]), 'C'
+                ) + _weighted(
+                    _text(
+                        [str(application_id), username] +
+                        details[application_id]
+                    ), 'D'
+                )
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'application_visibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationSearchDocument',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID'
+                    )
+                ),
+                (
+                    'document',
+                    django.contrib.postgres.search.SearchVectorField(null=True)
+                ),
+                (
+                    'application',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='search_document',
+                        to='core.Application'
+                    )
+                ),
+            ],
+            options={
+                'db_table': 'application_search_document',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='applicationsearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['document'], name='app_search_document_gin'
+            ),
+        ),
+        migrations.RunPython(
+            rebuild_search_documents, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rebuild_visibility(apps, schema_editor):
+    """
+    Backfill one row per machine of each application and group it is
+    shared with (group=NULL for public applications).
+    NOTE: Uses the historical models; keep this in sync with
+    `core.models.image_visibility._visibility_rows`.
+    """
+    ApplicationVisibility = apps.get_model('core', 'ApplicationVisibility')
+    ApplicationVersionMembership = apps.get_model(
+        'core', 'ApplicationVersionMembership'
+    )
+    ProviderMachine = apps.get_model('core', 'ProviderMachine')
+    ProviderMachineMembership = apps.get_model(
+        'core', 'ProviderMachineMembership'
+    )
+    version_groups = defaultdict(set)
+    for version_id, group_id in ApplicationVersionMembership.objects.values_list(
+        'image_version_id', 'group_id'
+    ):
+        version_groups[version_id].add(group_id)
+    machine_groups = defaultdict(set)
+    for machine_id, group_id in ProviderMachineMembership.objects.values_list(
+        'provider_machine_id', 'group_id'
+    ):
+        machine_groups[machine_id].add(group_id)
+
+    rows = set()
+    for (
+        machine_id, version_id, application_id, private, provider_id, app_start,
+        app_end, version_start, version_end, machine_start, machine_end
+    ) in ProviderMachine.objects.filter(
+        application_version__isnull=False
+    ).values_list(
+        'id', 'application_version_id', 'application_version__application_id',
+        'application_version__application__private',
+        'instance_source__provider_id',
+        'application_version__application__start_date',
+        'application_version__application__end_date',
+        'application_version__start_date', 'application_version__end_date',
+        'instance_source__start_date', 'instance_source__end_date'
+    ):
+        if private:
+            group_ids = version_groups[version_id] | machine_groups[machine_id]
+        else:
+            group_ids = [None]
+        start_date = max(
+            date for date in (app_start, version_start, machine_start) if date
+        )
+        end_dates = [
+            date for date in (app_end, version_end, machine_end) if date
+        ]
+        end_date = min(end_dates) if end_dates else None
+        for group_id in group_ids:
+            rows.add(
+                (application_id, provider_id, group_id, start_date, end_date)
+            )
+    ApplicationVisibility.objects.bulk_create(
+        [
+            ApplicationVisibility(
+                application_id=application_id,
+                provider_id=provider_id,
+                group_id=group_id,
+                start_date=start_date,
+                end_date=end_date
+            ) for (application_id, provider_id, group_id, start_date,
+                   end_date) in rows
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'instance_owner_alias_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationVisibility',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID'
+                    )
+                ),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField(null=True)),
+                (
+                    'application',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='visibility',
+                        to='core.Application'
+                    )
+                ),
+                (
+                    'group',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='core.Group'
+                    )
+                ),
+                (
+                    'provider',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='core.Provider'
+                    )
+                ),
+            ],
+            options={
+                'db_table': 'application_visibility',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='applicationvisibility',
+            index=models.Index(
+                fields=['provider', 'group'],
+                name='app_visibility_provider_group'
+            ),
+        ),
+        migrations.RunPython(
+            rebuild_visibility, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_events_dispatched(apps, schema_editor):
+    # Existing events already ran their listeners (synchronously)
+    EventTable = apps.get_model("core", "EventTable")
+    EventTable.objects.update(dispatched_at=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'instance_last_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventtable',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_events_dispatched, migrations.RunPython.noop),
+    ]
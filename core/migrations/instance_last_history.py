@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def rebuild_last_histories(apps, schema_editor):
+    """
+    Backfill the last_* fields from the newest history of each instance.
+    NOTE: Uses the historical models; keep this in sync with
+    `core.models.instance_history.refresh_last_histories`.
+    """
+    Instance = apps.get_model('core', 'Instance')
+    InstanceStatusHistory = apps.get_model('core', 'InstanceStatusHistory')
+    newest = InstanceStatusHistory.objects.filter(instance=OuterRef('pk')
+                                                 ).order_by('-start_date')
+    Instance.objects.update(
+        last_history=Subquery(newest.values('id')[:1]),
+        last_status=Subquery(newest.values('status__name')[:1]),
+        last_activity=Subquery(newest.values('activity')[:1]),
+        last_size=Subquery(newest.values('size_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'application_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instance',
+            name='last_activity',
+            field=models.CharField(blank=True, max_length=36, null=True),
+        ),
+        migrations.AddField(
+            model_name='instance',
+            name='last_history',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='+',
+                to='core.InstanceStatusHistory'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instance',
+            name='last_size',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='+',
+                to='core.Size'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instance',
+            name='last_status',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+        migrations.RunPython(
+            rebuild_last_histories, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'user_allocation_snapshot_usage_watermark'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='instance',
+            index=models.Index(
+                fields=['created_by', 'provider_alias'],
+                name='instance_owner_alias_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'remove_provider_dns_server_ip_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userallocationsnapshot',
+            name='usage_start_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userallocationsnapshot',
+            name='usage_watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userallocationsnapshot',
+            name='usage_seconds',
+            field=models.DecimalField(
+                blank=True, decimal_places=3, max_digits=19, null=True
+            ),
+        ),
+    ]
@@ -31,6 +31,8 @@ from core.models.provider import (
 )
 from core.models.license import LicenseType, License, ApplicationVersionLicense
 from core.models.machine import ProviderMachine, ProviderMachineMembership
+from core.models.image_visibility import ApplicationVisibility
+from core.models.search_document import ApplicationSearchDocument
 from core.models.machine_request import MachineRequest
 from core.models.pattern_match import PatternMatch, MatchType
 from core.models.maintenance import MaintenanceRecord
@@ -3,10 +3,13 @@ import decimal
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
 from threepio import logger
 from uuid import uuid4
 
+from core.plugins import invalidate_plugin_results
+
 
 class AllocationSource(models.Model):
     uuid = models.UUIDField(default=uuid4, unique=True, editable=False)
@@ -71,11 +74,7 @@ class AllocationSource(models.Model):
         else:
             compute_allowed = self.compute_allowed
             last_snapshot = self.snapshot
-        if compute_allowed < 0:
-            return decimal.Decimal('Infinity')
-        compute_used = last_snapshot.compute_used if last_snapshot else 0
-        remaining_compute = compute_allowed - compute_used
-        return remaining_compute
+        return _remaining_compute(compute_allowed, last_snapshot)
 
     @property
     def compute_used_updated(self):
@@ -157,6 +156,14 @@ class UserAllocationSnapshot(models.Model):
     compute_used = models.DecimalField(max_digits=19, decimal_places=3)
     burn_rate = models.DecimalField(max_digits=19, decimal_places=3)
     updated = models.DateTimeField(auto_now=True)
+    # Incremental accounting: `usage_seconds` (exact CPU seconds) were used
+    # between `usage_start_date` and `usage_watermark`. The next refresh
+    # only has to account for the time after the watermark.
+    usage_start_date = models.DateTimeField(null=True, blank=True)
+    usage_watermark = models.DateTimeField(null=True, blank=True)
+    usage_seconds = models.DecimalField(
+        max_digits=19, decimal_places=3, null=True, blank=True
+    )
 
     def __unicode__(self):
         return "User %s + AllocationSource %s: Total AU Usage:%s Burn Rate:%s hours/hour Updated:%s" %\
@@ -205,6 +212,57 @@ class AllocationSourceSnapshot(models.Model):
         app_label = 'core'
 
 
+def _remaining_compute(compute_allowed, last_snapshot):
+    if compute_allowed < 0:
+        return decimal.Decimal('Infinity')
+    compute_used = last_snapshot.compute_used if last_snapshot else 0
+    return compute_allowed - compute_used
+
+
+def find_over_allocation(user_allocation_sources):
+    """
+    Bulk version of `allocation_source.is_over_allocation(user)`.
+
+    Evaluates every UserAllocationSource in the queryset with two queries
+    (user allocation sources with their snapshots, and the user snapshots
+    of 'special' allocation sources).
+
+    Returns a dict of (user_id, allocation_source_id) -> bool
+    """
+    time_shared_allocations = getattr(
+        settings, 'SPECIAL_ALLOCATION_SOURCES', {}
+    )
+    user_snapshots = dict(
+        ((snapshot.user_id, snapshot.allocation_source_id), snapshot)
+        for snapshot in UserAllocationSnapshot.objects.
+        filter(allocation_source__name__in=time_shared_allocations.keys())
+    ) if time_shared_allocations else {}
+    over_allocation = {}
+    for user_allocation_source in user_allocation_sources.select_related(
+        'allocation_source__snapshot'
+    ):
+        allocation_source = user_allocation_source.allocation_source
+        key = (user_allocation_source.user_id, allocation_source.id)
+        if allocation_source.name in time_shared_allocations:
+            last_snapshot = user_snapshots.get(key)
+            if not last_snapshot:
+                # Same as `time_remaining`: no user snapshot means -1
+                over_allocation[key] = True
+                continue
+            compute_allowed = time_shared_allocations[allocation_source.name
+                                                     ]['compute_allowed']
+        else:
+            compute_allowed = allocation_source.compute_allowed
+            try:
+                last_snapshot = allocation_source.snapshot
+            except ObjectDoesNotExist:
+                last_snapshot = None
+        over_allocation[key] = _remaining_compute(
+            compute_allowed, last_snapshot
+        ) < 0
+    return over_allocation
+
+
 def total_usage(
     username,
     start_date,
@@ -216,22 +274,22 @@ def total_usage(
     """
         This function outputs the total allocation usage in hours
     """
-    from service.allocation_logic import create_report
+    from service.allocation_logic import create_report, calculate_usage
     if not end_date:
         end_date = timezone.now()
-    user_allocation = create_report(
-        start_date,
-        end_date,
-        user_id=username,
-        allocation_source_name=allocation_source_name
-    )
     if email:
-        return user_allocation
-    total_allocation = 0.0
-    for data in user_allocation:
-        if not data['allocation_source'] == 'N/A':
-            total_allocation += data['applicable_duration']
-    compute_used_total = round(total_allocation / 3600.0, 2)
+        return create_report(
+            start_date,
+            end_date,
+            user_id=username,
+            allocation_source_name=allocation_source_name
+        )
+    user_usage = [
+        usage for (_, source_name), usage in
+        calculate_usage(start_date, end_date, usernames=[username]).items()
+        if not allocation_source_name or source_name == allocation_source_name
+    ]
+    compute_used_total = sum(usage.compute_used for usage in user_usage)
     if compute_used_total > 0:
         logger.info(
             "Total usage for User %s with AllocationSource %s from %s-%s = %s" %
@@ -241,8 +299,7 @@ def total_usage(
             )
         )
     if burn_rate:
-        burn_rate_total = 0 if len(user_allocation
-                                  ) < 1 else user_allocation[-1]['burn_rate']
+        burn_rate_total = sum(usage.burn_rate for usage in user_usage)
         if burn_rate_total != 0:
             logger.info(
                 "User %s with AllocationSource %s Burn Rate: %s" %
@@ -259,3 +316,22 @@ def get_allocation_source_object(source_id):
         )
 
     return AllocationSource.objects.filter(uuid=source_id).last()
+
+
+def _invalidate_allocation_source_results(sender, instance, **kwargs):
+    invalidate_plugin_results(allocation_source=instance)
+
+
+def _invalidate_user_allocation_source_results(sender, instance, **kwargs):
+    invalidate_plugin_results(user=instance.user_id)
+
+
+post_save.connect(
+    _invalidate_allocation_source_results, sender=AllocationSource
+)
+post_save.connect(
+    _invalidate_user_allocation_source_results, sender=UserAllocationSource
+)
+post_delete.connect(
+    _invalidate_user_allocation_source_results, sender=UserAllocationSource
+)
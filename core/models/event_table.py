@@ -1,6 +1,8 @@
+from collections import defaultdict
 from uuid import uuid4
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models.signals import post_save, pre_save
 from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
@@ -32,6 +34,8 @@ class EventTable(models.Model):
     name = models.CharField(max_length=128, db_index=True)
     payload = JSONField()
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    # Set once the listeners of this event have run
+    dispatched_at = models.DateTimeField(blank=True, null=True)
 
     @classmethod
     def create_event(cls, name, payload, entity_id):
@@ -51,34 +55,152 @@ class EventTable(models.Model):
         app_label = "core"
 
 
-# Save hooks
-def listen_for_changes(sender, instance, created, **kwargs):
+# Event listeners, by event name
+_pre_save_listeners = defaultdict(list)
+_post_save_listeners = defaultdict(list)
+
+
+def register_event_listener(event_name, listener, pre_save=False):
     """
-    Ideally, this would be the master listener. On each save, it could contact all listeners and send them the payload.
+    Call `listener` for every EventTable event named `event_name`.
+
+    `pre_save` listeners are called like a `pre_save` signal receiver
+    (before the event is saved, when dispatching synchronously) and always
+    before the other listeners of the event.
+    """
+    if pre_save:
+        _pre_save_listeners[event_name].append(listener)
+    else:
+        _post_save_listeners[event_name].append(listener)
+
 
-    For now, it will do nothing.
+def event_dispatch_mode():
     """
-    return None
+    'sync' (default): listeners run inside the save of the event.
+    'async': listeners run in the `dispatch_entity_events` celery task,
+    once the transaction that saved the event commits.
+    """
+    return getattr(settings, 'EVENT_DISPATCH_MODE', 'sync')
+
+
+def _call_listener(listener, stats, **kwargs):
+    if stats is None:
+        return listener(sender=EventTable, **kwargs)
+    with stats.phase(listener.__name__):
+        return listener(sender=EventTable, **kwargs)
+
+
+def run_event_listeners(event, stats=None):
+    """
+    Run every listener registered for `event` (timed in `stats`, a
+    RunStats, if given).
+    """
+    for listener in _pre_save_listeners.get(event.name, ()):
+        _call_listener(listener, stats, instance=event, raw=False)
+    for listener in _post_save_listeners.get(event.name, ()):
+        _call_listener(listener, stats, instance=event, created=True)
+
+
+def dispatch_pending_events(entity_id, stats=None):
+    """
+    Run the listeners of every event of `entity_id` that has not been
+    dispatched yet, oldest first.
+
+    The pending events stay locked until they are all dispatched, so
+    concurrent dispatchers of an entity take turns and every event is
+    dispatched once. A failing listener is logged and its event is not
+    retried (listeners may have sent emails).
+    """
+    with transaction.atomic():
+        events = list(
+            EventTable.objects.select_for_update().filter(
+                entity_id=entity_id, dispatched_at__isnull=True
+            ).order_by('id')
+        )
+        for event in events:
+            try:
+                with transaction.atomic():
+                    run_event_listeners(event, stats)
+            except Exception:
+                logger.exception(
+                    "Listeners of event %s (%s) failed" %
+                    (event.uuid, event.name)
+                )
+                if stats is not None:
+                    stats.incr('events_failed')
+            EventTable.objects.filter(uuid=event.uuid
+                                     ).update(dispatched_at=timezone.now())
+        if stats is not None:
+            stats.incr('events_dispatched', len(events))
+    return events
+
+
+def _dispatch_before_save(sender, instance, **kwargs):
+    if event_dispatch_mode() == 'async':
+        return
+    for listener in _pre_save_listeners.get(instance.name, ()):
+        listener(sender=sender, instance=instance, **kwargs)
+    if instance.dispatched_at is None:
+        instance.dispatched_at = timezone.now()
+
+
+def _dispatch_after_save(sender, instance, **kwargs):
+    if event_dispatch_mode() != 'async':
+        for listener in _post_save_listeners.get(instance.name, ()):
+            listener(sender=sender, instance=instance, **kwargs)
+        return
+    if instance.dispatched_at is not None:
+        return
+    from core.tasks import dispatch_entity_events
+    entity_id = instance.entity_id
+    transaction.on_commit(lambda: dispatch_entity_events.delay(entity_id))
 
 
 # Instantiate the hooks:
-post_save.connect(listen_for_allocation_threshold_met, sender=EventTable)
-post_save.connect(listen_for_instance_allocation_changes, sender=EventTable)
-post_save.connect(
-    listen_for_allocation_source_created_or_renewed, sender=EventTable
+register_event_listener(
+    'allocation_source_threshold_met', listen_for_allocation_threshold_met
+)
+register_event_listener(
+    'instance_allocation_source_changed', listen_for_instance_allocation_changes
+)
+register_event_listener(
+    'allocation_source_created_or_renewed',
+    listen_for_allocation_source_created_or_renewed
+)
+register_event_listener(
+    'allocation_source_compute_allowed_changed',
+    listen_for_allocation_source_compute_allowed_changed
+)
+register_event_listener(
+    'user_allocation_source_created', listen_for_user_allocation_source_created
+)
+register_event_listener(
+    'user_allocation_source_deleted', listen_for_user_allocation_source_deleted
+)
+register_event_listener(
+    'allocation_source_snapshot',
+    listen_before_allocation_snapshot_changes,
+    pre_save=True
+)
+register_event_listener(
+    'instance_allocation_source_removed', listen_for_instance_allocation_removed
+)
+register_event_listener(
+    'allocation_source_snapshot', listen_for_allocation_snapshot_changes
+)
+register_event_listener(
+    'user_allocation_snapshot_changed', listen_for_user_snapshot_changes
+)
+register_event_listener(
+    'allocation_source_renewal_strategy_changed',
+    listen_for_allocation_source_renewal_strategy_changed
 )
-post_save.connect(
-    listen_for_allocation_source_compute_allowed_changed, sender=EventTable
+register_event_listener(
+    'allocation_source_name_changed', listen_for_allocation_source_name_changed
 )
-post_save.connect(listen_for_user_allocation_source_created, sender=EventTable)
-post_save.connect(listen_for_user_allocation_source_deleted, sender=EventTable)
-pre_save.connect(listen_before_allocation_snapshot_changes, sender=EventTable)
-post_save.connect(listen_for_instance_allocation_removed, sender=EventTable)
-post_save.connect(listen_for_allocation_snapshot_changes, sender=EventTable)
-post_save.connect(listen_for_user_snapshot_changes, sender=EventTable)
-post_save.connect(
-    listen_for_allocation_source_renewal_strategy_changed, sender=EventTable
+register_event_listener(
+    'allocation_source_removed', listen_for_allocation_source_removed
 )
-post_save.connect(listen_for_allocation_source_name_changed, sender=EventTable)
-post_save.connect(listen_for_allocation_source_removed, sender=EventTable)
-post_save.connect(listen_for_quota_assigned, sender=EventTable)
+register_event_listener('quota_assigned', listen_for_quota_assigned)
+pre_save.connect(_dispatch_before_save, sender=EventTable)
+post_save.connect(_dispatch_after_save, sender=EventTable)
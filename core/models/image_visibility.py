@@ -0,0 +1,247 @@
+"""
+Materialized image (Application) visibility.
+
+`Application.images_for_user` used to decide which images a user can see
+with one large OR of joins across versions, machines, members, providers
+and memberships. ApplicationVisibility stores the result of those joins:
+one row for each ProviderMachine of an Application and each group it is
+shared with (group=NULL when the Application is public).
+
+Rows are rebuilt per application whenever an Application, ApplicationVersion,
+ProviderMachine or one of their memberships is saved (see the signals at
+the bottom of this module). Bulk updates must call
+`refresh_application_visibility` themselves.
+To rebuild the table from scratch, run:
+    ./manage.py rebuild_image_visibility
+"""
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from threepio import logger
+
+from core.models.application import Application
+from core.models.application_version import (
+    ApplicationVersion, ApplicationVersionMembership
+)
+from core.models.machine import ProviderMachine, ProviderMachineMembership
+
+REBUILD_CHUNK_SIZE = 500
+
+
+class ApplicationVisibility(models.Model):
+    """
+    `application` can be seen on `provider` by members of `group`
+    (by everyone, if group is NULL) between start_date and end_date.
+    NOTE: Rows are derived data -- never edit them by hand.
+    """
+    application = models.ForeignKey(
+        Application, related_name='visibility', on_delete=models.CASCADE
+    )
+    provider = models.ForeignKey('Provider', on_delete=models.CASCADE)
+    group = models.ForeignKey('Group', null=True, on_delete=models.CASCADE)
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'application_visibility'
+        app_label = 'core'
+        indexes = [
+            models.Index(
+                fields=['provider', 'group'],
+                name='app_visibility_provider_group'
+            ),
+        ]
+
+    def __unicode__(self):
+        return "%s visible on %s to %s" % (
+            self.application_id, self.provider_id, self.group_id or 'everyone'
+        )
+
+    @classmethod
+    def current(cls, now_time=None):
+        """
+        Rows whose application, version and machine (and provider) are
+        all current.
+        """
+        if not now_time:
+            now_time = timezone.now()
+        return cls.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gt=now_time),
+            Q(provider__end_date__isnull=True) |
+            Q(provider__end_date__gt=now_time),
+            start_date__lt=now_time,
+            provider__active=True
+        )
+
+    @classmethod
+    def application_ids_for_user(cls, user, now_time=None):
+        """
+        Ids of the current applications on `user`'s providers that are
+        public or shared with one of `user`'s groups.
+        """
+        group_ids = list(user.group_ids())
+        return cls.current(now_time).filter(
+            Q(group__isnull=True) | Q(group__in=group_ids),
+            provider__in=list(user.current_providers),
+        ).values('application_id')
+
+    @classmethod
+    def public_application_ids(cls, now_time=None):
+        """
+        Ids of the current, public applications on public providers.
+        """
+        return cls.current(now_time).filter(
+            group__isnull=True, provider__public=True
+        ).values('application_id')
+
+
+def _latest(*dates):
+    return max(date for date in dates if date)
+
+
+def _earliest(*dates):
+    dates = [date for date in dates if date]
+    return min(dates) if dates else None
+
+
+def _visibility_rows(application_ids):
+    machines = ProviderMachine.objects.filter(
+        application_version__application__in=application_ids
+    ).values_list(
+        'id', 'application_version_id', 'application_version__application_id',
+        'application_version__application__private',
+        'instance_source__provider_id',
+        'application_version__application__start_date',
+        'application_version__application__end_date',
+        'application_version__start_date', 'application_version__end_date',
+        'instance_source__start_date', 'instance_source__end_date'
+    )
+    version_groups = defaultdict(set)
+    for version_id, group_id in ApplicationVersionMembership.objects.filter(
+        image_version__application__in=application_ids
+    ).values_list('image_version_id', 'group_id'):
+        version_groups[version_id].add(group_id)
+    machine_groups = defaultdict(set)
+    for machine_id, group_id in ProviderMachineMembership.objects.filter(
+        provider_machine__application_version__application__in=application_ids
+    ).values_list('provider_machine_id', 'group_id'):
+        machine_groups[machine_id].add(group_id)
+
+    rows = set()
+    for (
+        machine_id, version_id, application_id, private, provider_id, app_start,
+        app_end, version_start, version_end, machine_start, machine_end
+    ) in machines:
+        if private:
+            group_ids = version_groups[version_id] | machine_groups[machine_id]
+        else:
+            group_ids = [None]
+        start_date = _latest(app_start, version_start, machine_start)
+        end_date = _earliest(app_end, version_end, machine_end)
+        for group_id in group_ids:
+            rows.add(
+                (application_id, provider_id, group_id, start_date, end_date)
+            )
+    return [
+        ApplicationVisibility(
+            application_id=application_id,
+            provider_id=provider_id,
+            group_id=group_id,
+            start_date=start_date,
+            end_date=end_date
+        ) for (application_id, provider_id, group_id, start_date,
+               end_date) in rows
+    ]
+
+
+def refresh_application_visibility(application_ids):
+    """
+    Rebuild the ApplicationVisibility rows of every application in
+    `application_ids`.
+    """
+    application_ids = set(application_ids)
+    if not application_ids:
+        return 0
+    rows = _visibility_rows(application_ids)
+    with transaction.atomic():
+        ApplicationVisibility.objects.filter(application__in=application_ids
+                                            ).delete()
+        ApplicationVisibility.objects.bulk_create(
+            rows, batch_size=REBUILD_CHUNK_SIZE
+        )
+    return len(rows)
+
+
+def rebuild_application_visibility(chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Rebuild every ApplicationVisibility row, `chunk_size` applications
+    at a time. Returns the number of rows written.
+    """
+    application_ids = list(
+        Application.objects.order_by('id').values_list('id', flat=True)
+    )
+    total = 0
+    with transaction.atomic():
+        ApplicationVisibility.objects.exclude(application__in=application_ids
+                                             ).delete()
+        for index in range(0, len(application_ids), chunk_size):
+            total += refresh_application_visibility(
+                application_ids[index:index + chunk_size]
+            )
+    logger.info(
+        "Rebuilt %s visibility rows for %s applications" %
+        (total, len(application_ids))
+    )
+    return total
+
+
+def _refresh_application(sender, instance, **kwargs):
+    refresh_application_visibility([instance.id])
+
+
+def _refresh_version(sender, instance, **kwargs):
+    refresh_application_visibility([instance.application_id])
+
+
+def _refresh_machine(sender, instance, **kwargs):
+    if instance.application_version_id:
+        refresh_application_visibility(
+            ApplicationVersion.objects.filter(
+                id=instance.application_version_id
+            ).values_list('application_id', flat=True)
+        )
+
+
+def _refresh_version_membership(sender, instance, **kwargs):
+    refresh_application_visibility(
+        ApplicationVersion.objects.filter(
+            id=instance.image_version_id
+        ).values_list('application_id', flat=True)
+    )
+
+
+def _refresh_machine_membership(sender, instance, **kwargs):
+    refresh_application_visibility(
+        ProviderMachine.objects.filter(
+            id=instance.provider_machine_id
+        ).values_list('application_version__application_id', flat=True)
+    )
+
+
+post_save.connect(_refresh_application, sender=Application)
+post_save.connect(_refresh_version, sender=ApplicationVersion)
+post_save.connect(_refresh_machine, sender=ProviderMachine)
+post_save.connect(
+    _refresh_version_membership, sender=ApplicationVersionMembership
+)
+post_delete.connect(
+    _refresh_version_membership, sender=ApplicationVersionMembership
+)
+post_save.connect(_refresh_machine_membership, sender=ProviderMachineMembership)
+post_delete.connect(
+    _refresh_machine_membership, sender=ProviderMachineMembership
+)
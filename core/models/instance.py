@@ -22,11 +22,21 @@ from core.models.machine import (
     convert_esh_machine, get_or_create_provider_machine
 )
 from core.models.volume import convert_esh_volume
-from core.models.size import (convert_esh_size, Size)
+from core.models.size import (convert_esh_size, get_unknown_size, Size)
 from core.models.tag import Tag
 from core.models.managers import ActiveInstancesManager
 from service.mock import MockInstance
 
+# Pass to `select_related` to load the allocation source (and its snapshot)
+# of each instance in the same query as the instances.
+ALLOCATION_SOURCE_RELATED = \
+    'instanceallocationsourcesnapshot__allocation_source__snapshot'
+# Maintained by `InstanceStatusHistory.save` (see `set_last_history`).
+# Regular saves of an Instance never write them.
+LAST_HISTORY_FIELDS = (
+    'last_history', 'last_status', 'last_activity', 'last_size'
+)
+
 
 class Instance(models.Model):
     """
@@ -65,11 +75,42 @@ class Instance(models.Model):
     # FIXME  Problems when setting a default, missing auto_now_add
     start_date = models.DateTimeField()
     end_date = models.DateTimeField(null=True, blank=True)
+    # Denormalized from the newest InstanceStatusHistory
+    last_history = models.ForeignKey(
+        'InstanceStatusHistory',
+        models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_status = models.CharField(max_length=128, null=True, blank=True)
+    last_activity = models.CharField(max_length=36, null=True, blank=True)
+    last_size = models.ForeignKey(
+        Size, models.SET_NULL, null=True, blank=True, related_name='+'
+    )
 
     # Model Managers
     objects = models.Manager()    # The default manager.
     active_instances = ActiveInstancesManager()
 
+    def save(self, *args, **kwargs):
+        # Never overwrite the last_* fields with (possibly stale) values
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if
+                not field.primary_key and field.name not in LAST_HISTORY_FIELDS
+            ]
+        super(Instance, self).save(*args, **kwargs)
+
+    def set_last_history(self, history):
+        """
+        Update the (in memory) last_* fields to match `history`.
+        """
+        self.last_history = history
+        self.last_status = history.status.name
+        self.last_activity = history.activity
+        self.last_size = history.size
+
     @property
     def project_name(self):
         if not self.created_by_identity:
@@ -159,20 +200,14 @@ class Instance(models.Model):
         # except InstanceStatusHistory.DoesNotExist:
         # TODO: Profile current choice
         # FIXME: Move this call so that it happens inside InstanceStatusHistory to avoid circ.dep.
+        if self.last_history_id:
+            return self.last_history
         last_history = self.instancestatushistory_set.order_by('-start_date'
                                                               ).first()
         if last_history:
             return last_history
         else:
-            unknown_size, _ = Size.objects.get_or_create(
-                name='Unknown Size',
-                alias='N/A',
-                provider=self.provider,
-                cpu=-1,
-                mem=-1,
-                root=-1,
-                disk=-1
-            )
+            unknown_size = get_unknown_size(self.provider)
             last_history = self._build_first_history(
                 'Unknown', unknown_size, self.start_date, self.end_date, True
             )
@@ -249,7 +284,8 @@ class Instance(models.Model):
         )
 
         # 2. Get the last history (or Build a new one if no other exists)
-        has_history = self.instancestatushistory_set.all().count()
+        has_history = self.last_history_id or \
+            self.instancestatushistory_set.exists()
         if not has_history:
             last_history = InstanceStatusHistory.create_history(
                 status_name,
@@ -451,12 +487,14 @@ class Instance(models.Model):
             return self.esh.extra.get('fault', {})
         return {}
 
+    def _last_status_name(self):
+        if self.last_status is None:
+            return self.get_last_history().status.name
+        return self.last_status
+
     def api_status(self):
         # Used by the v2 serializer - db only. no 'esh'
-        last_history = self.get_last_history()
-        if not last_history:
-            return "Unknown"
-        status_name = last_history.status.name
+        status_name = self._last_status_name()
         #NOTE: This handles the two 'atmosphere created' special-case status types, networking/deploying.
         # If the last history is one of these states, return active
         if status_name in ["networking", "deploy_error", "deploying"]:
@@ -465,10 +503,7 @@ class Instance(models.Model):
 
     def api_activity(self):
         # Used by the v2 serializer - db only. no 'esh'
-        last_history = self.get_last_history()
-        if not last_history:
-            return ""
-        status_name = last_history.status.name
+        status_name = self._last_status_name()
         #FIXME: Using this, for now, in place of a better solution.descripted in core/models/instance_history.py:InstanceStatus
         if status_name not in ["networking", "deploy_error", "deploying"]:
             return ""
@@ -477,11 +512,7 @@ class Instance(models.Model):
     def esh_status(self):
         if self.esh and type(self.esh) != MockInstance:
             return self.esh.get_status()
-        last_history = self.get_last_history()
-        if last_history:
-            return last_history.status.name
-        else:
-            return "Unknown"
+        return self._last_status_name()
 
     def esh_activity(self):
         activity = None
@@ -492,16 +523,8 @@ class Instance(models.Model):
             except:
                 activity = None
             return activity
-        last_history = self.get_last_history()
-        if last_history:
-            try:
-                activity = " ".join(last_history.status.split(' - ')[1:]
-                                   ).strip()
-            except:
-                activity = None
-            return activity
-        else:
-            return "Unknown"
+        activity = " ".join(self._last_status_name().split(' - ')[1:]).strip()
+        return activity or None
 
     def get_provider(self):
         if not self.source:
@@ -509,14 +532,13 @@ class Instance(models.Model):
         return self.source.provider
 
     def get_size(self):
+        if self.last_size_id:
+            return self.last_size
         return self.get_last_history().size
 
     def esh_size(self):
         if not self.esh or not hasattr(self.esh, 'extra'):
-            last_history = self.get_last_history()
-            if last_history:
-                return last_history.size.alias
-            return "Unknown"
+            return self.get_size().alias
         extras = self.esh.extra
         if 'flavorId' in extras:
             return extras['flavorId']
@@ -581,9 +603,29 @@ class Instance(models.Model):
     @property
     def allocation_source(self):
         # FIXME: look up the current allocation source by "Scanning the event table" on this instance.
-        from core.models.allocation_source import InstanceAllocationSourceSnapshot as Snapshot
-        snapshot = Snapshot.objects.filter(instance=self).first()
-        return snapshot.allocation_source if snapshot else None
+        # NOTE: Uses the snapshot loaded by `select_related(ALLOCATION_SOURCE_RELATED)`, when available.
+        try:
+            return self.instanceallocationsourcesnapshot.allocation_source
+        except ObjectDoesNotExist:
+            return None
+
+    @staticmethod
+    def allocation_sources_for(provider_aliases, user=None):
+        """
+        Resolve provider aliases to their Instance and AllocationSource
+        (None if not set) in one joined query.
+
+        Returns a dict of provider_alias -> (Instance, AllocationSource)
+        """
+        instances = Instance.objects.filter(
+            provider_alias__in=list(provider_aliases)
+        ).select_related(ALLOCATION_SOURCE_RELATED)
+        if user:
+            instances = instances.filter(created_by=user)
+        return dict(
+            (instance.provider_alias, (instance, instance.allocation_source))
+            for instance in instances
+        )
 
     def change_allocation_source(self, allocation_source, user=None):
         """
@@ -621,6 +663,12 @@ class Instance(models.Model):
     class Meta:
         db_table = "instance"
         app_label = "core"
+        indexes = [
+            models.Index(
+                fields=['created_by', 'provider_alias'],
+                name='instance_owner_alias_idx'
+            ),
+        ]
 
 
 """
@@ -5,13 +5,20 @@ from uuid import uuid4
 from datetime import timedelta
 
 from django.db import models, transaction, DatabaseError
-from django.db.models import ObjectDoesNotExist
+from django.db.models import ObjectDoesNotExist, OuterRef, Q, Subquery
+from django.db.models.signals import post_delete, post_save
 from django.contrib.postgres.fields import JSONField
 
 from django.utils import timezone
 
 from threepio import logger
 
+from core.lookup_cache import LookupCache
+
+REFRESH_CHUNK_SIZE = 500
+# InstanceStatus, by name
+_instance_statuses = LookupCache('instance_status')
+
 
 class InstanceStatus(models.Model):
     """
@@ -58,6 +65,30 @@ class InstanceStatusHistory(models.Model):
     end_date = models.DateTimeField(null=True, blank=True)
     extra = JSONField(null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super(InstanceStatusHistory, self).save(*args, **kwargs)
+            self._update_instance_last_history()
+
+    def _update_instance_last_history(self):
+        """
+        Point the instance's last_* fields at this history, unless the
+        instance already has a newer one.
+        """
+        instance_field = self._meta.get_field('instance')
+        updated = instance_field.related_model.objects.filter(
+            Q(last_history__isnull=True) | Q(last_history=self) |
+            Q(last_history__start_date__lte=self.start_date),
+            id=self.instance_id
+        ).update(
+            last_history=self,
+            last_status=self.status.name,
+            last_activity=self.activity,
+            last_size=self.size_id
+        )
+        if updated and hasattr(self, instance_field.get_cache_name()):
+            self.instance.set_last_history(self)
+
     def previous(self):
         """
         Given that you are a node on a linked-list, traverse yourself backwards
@@ -210,7 +241,7 @@ class InstanceStatusHistory(models.Model):
         """
         Creates a new (Unsaved!) InstanceStatusHistory
         """
-        status, _ = InstanceStatus.objects.get_or_create(name=status_name)
+        status = get_instance_status(status_name)
         new_history = InstanceStatusHistory(
             instance=instance,
             size=size,
@@ -301,3 +332,65 @@ class InstanceStatusHistory(models.Model):
     class Meta:
         db_table = "instance_status_history"
         app_label = "core"
+
+
+def get_instance_status(status_name):
+    """
+    Return the InstanceStatus named `status_name`, creating it if needed.
+    """
+    return _instance_statuses.get(
+        status_name,
+        lambda: InstanceStatus.objects.get_or_create(name=status_name)[0]
+    )
+
+
+def preload_instance_statuses():
+    _instance_statuses.load(
+        (status.name, status)
+        for status in InstanceStatus.objects.order_by('-id')
+    )
+
+
+def _forget_instance_status(sender, instance, **kwargs):
+    _instance_statuses.discard(instance.pk)
+
+
+def refresh_last_histories(instance_ids):
+    """
+    Recompute the last_* fields of every instance in `instance_ids` from
+    its histories (in one UPDATE).
+    Used by bulk operations, which skip `InstanceStatusHistory.save`.
+    """
+    from core.models.instance import Instance
+    newest = InstanceStatusHistory.objects.filter(instance=OuterRef('pk')
+                                                 ).order_by('-start_date')
+    return Instance.objects.filter(id__in=instance_ids).update(
+        last_history=Subquery(newest.values('id')[:1]),
+        last_status=Subquery(newest.values('status__name')[:1]),
+        last_activity=Subquery(newest.values('activity')[:1]),
+        last_size=Subquery(newest.values('size_id')[:1])
+    )
+
+
+def rebuild_last_histories(chunk_size=REFRESH_CHUNK_SIZE):
+    """
+    Recompute the last_* fields of every instance, `chunk_size` instances
+    at a time. Returns the number of instances updated.
+    """
+    from core.models.instance import Instance
+    instance_ids = list(
+        Instance.objects.order_by('id').values_list('id', flat=True)
+    )
+    total = 0
+    for index in range(0, len(instance_ids), chunk_size):
+        total += refresh_last_histories(instance_ids[index:index + chunk_size])
+    return total
+
+
+def _refresh_deleted_last_history(sender, instance, **kwargs):
+    refresh_last_histories([instance.instance_id])
+
+
+post_save.connect(_forget_instance_status, sender=InstanceStatus)
+post_delete.connect(_forget_instance_status, sender=InstanceStatus)
+post_delete.connect(_refresh_deleted_last_history, sender=InstanceStatusHistory)
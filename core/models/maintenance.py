@@ -1,12 +1,29 @@
 import collections
+import threading
+import time
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
 
 from core.models.user import AtmosphereUser as User
 from core.models.provider import Provider
 
+# Seconds a process trusts its view of the maintenance windows before
+# re-reading the shared cache (to see records changed by other processes)
+DEFAULT_MAINTENANCE_CACHE_SECONDS = 30
+# The shared cache is invalidated on save/delete; this only bounds how long
+# a change made without signals (e.g. `QuerySet.update`) can go unnoticed.
+MAINTENANCE_SHARED_CACHE_TIMEOUT = 60 * 60
+MAINTENANCE_CACHE_KEY = 'core.maintenance_record.windows'
+_WINDOW_FIELDS = (
+    'id', 'start_date', 'end_date', 'title', 'message', 'provider_id',
+    'disable_login'
+)
+
 
 class MaintenanceRecord(models.Model):
     """
@@ -39,22 +56,27 @@ class MaintenanceRecord(models.Model):
             records = records.filter(Q(provider__isnull=True))
         return records
 
+    @classmethod
+    def cached_active(cls):
+        """
+        Return the active records that are not specific to a provider (like
+        `active()`), from memory -- see `MaintenanceWindows`.
+        """
+        return get_maintenance_windows().active(timezone.now())
+
     @classmethod
     def disable_login_access(cls, request):
-        disable_login = False
         if request and 'username' in request.session:
             username = request.session['username']
         else:
             #Username not in session - disable
             return True
+        if not any(record.disable_login for record in cls.cached_active()):
+            return False
         user = User.objects.get(username=username)
         if user.is_staff or user.is_superuser:
             return False
-        records = MaintenanceRecord.active()
-        for record in records:
-            if record.disable_login:
-                disable_login = True
-        return disable_login
+        return True
 
     def json(self):
         json = {
@@ -76,3 +98,111 @@ class MaintenanceRecord(models.Model):
     class Meta:
         db_table = "maintenance_record"
         app_label = "core"
+
+
+class MaintenanceWindows(object):
+    """
+    Every maintenance record (not specific to a provider) that has not
+    ended yet. The records active at a given time are computed once and
+    re-used until the next start or end date of any record.
+    """
+
+    def __init__(self, records):
+        self.records = tuple(records)
+        # (active records, next transition or None)
+        self._state = None
+
+    def active(self, now):
+        state = self._state
+        if state is None or (state[1] is not None and now >= state[1]):
+            state = self._state = self._compute(now)
+        return state[0]
+
+    def _compute(self, now):
+        active = tuple(
+            record for record in self.records if record.start_date <= now and
+            (record.end_date is None or record.end_date > now)
+        )
+        transitions = [
+            date for record in self.records
+            for date in (record.start_date, record.end_date)
+            if date is not None and date > now
+        ]
+        return (active, min(transitions) if transitions else None)
+
+
+_windows = None
+_windows_checked = 0
+_windows_lock = threading.Lock()
+
+
+def _maintenance_cache_seconds():
+    return getattr(
+        settings, 'MAINTENANCE_CACHE_SECONDS', DEFAULT_MAINTENANCE_CACHE_SECONDS
+    )
+
+
+def _remember_windows(rows):
+    global _windows, _windows_checked
+    windows = MaintenanceWindows(MaintenanceRecord(**row) for row in rows)
+    with _windows_lock:
+        _windows = windows
+        _windows_checked = time.time()
+    return windows
+
+
+def _query_window_rows():
+    return list(
+        MaintenanceRecord.objects.filter(
+            provider__isnull=True
+        ).filter(Q(end_date__isnull=True) |
+                 Q(end_date__gt=timezone.now())).values(*_WINDOW_FIELDS)
+    )
+
+
+def get_maintenance_windows():
+    """
+    Return the `MaintenanceWindows` of this process, re-read from the
+    shared cache every MAINTENANCE_CACHE_SECONDS and from the database
+    when the shared cache is empty. Rows read from the database are only
+    cached once the current transaction commits.
+    """
+    windows = _windows
+    if windows is not None and \
+            time.time() - _windows_checked < _maintenance_cache_seconds():
+        return windows
+    rows = cache.get(MAINTENANCE_CACHE_KEY)
+    if rows is not None:
+        return _remember_windows(rows)
+    rows = _query_window_rows()
+
+    def remember():
+        cache.set(MAINTENANCE_CACHE_KEY, rows, MAINTENANCE_SHARED_CACHE_TIMEOUT)
+        _remember_windows(rows)
+
+    transaction.on_commit(remember)
+    return MaintenanceWindows(MaintenanceRecord(**row) for row in rows)
+
+
+def preload_maintenance_windows():
+    rows = _query_window_rows()
+    cache.set(MAINTENANCE_CACHE_KEY, rows, MAINTENANCE_SHARED_CACHE_TIMEOUT)
+    _remember_windows(rows)
+
+
+def invalidate_maintenance_windows():
+    global _windows
+    cache.delete(MAINTENANCE_CACHE_KEY)
+    with _windows_lock:
+        _windows = None
+
+
+def _invalidate_maintenance_windows(sender, instance, **kwargs):
+    invalidate_maintenance_windows()
+    # Again once committed, in case another process re-cached the rows
+    # before this transaction was visible to it
+    transaction.on_commit(invalidate_maintenance_windows)
+
+
+post_save.connect(_invalidate_maintenance_windows, sender=MaintenanceRecord)
+post_delete.connect(_invalidate_maintenance_windows, sender=MaintenanceRecord)
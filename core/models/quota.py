@@ -179,11 +179,12 @@ class Quota(models.Model):
         app_label = 'core'
 
 
-def has_cpu_quota(driver, quota, new_size=0, raise_exc=True):
+def has_cpu_quota(driver, quota, new_size=0, raise_exc=True, instances=None):
     """
     True if the total number of CPU cores found on
     driver is less than or equal to Quota.cpu,
     otherwise False.
+    param - instances - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -192,8 +193,8 @@ def has_cpu_quota(driver, quota, new_size=0, raise_exc=True):
     if not quota.cpu or quota.cpu < 0:
         return True
     total_size = new_size
-    _pre_cache_sizes(driver)
-    instances = driver.list_instances()
+    if instances is None:
+        instances = list_quota_instances(driver)
     for inst in instances:
         try:
             total_size += inst.size._size.extra['cpu']
@@ -207,10 +208,11 @@ def has_cpu_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_mem_quota(driver, quota, new_size=0, raise_exc=True):
+def has_mem_quota(driver, quota, new_size=0, raise_exc=True, instances=None):
     """
     True if the total amount of RAM found on driver is
     less than or equal to Quota.mem, otherwise False.
+    param - instances - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -219,8 +221,8 @@ def has_mem_quota(driver, quota, new_size=0, raise_exc=True):
     if not quota.memory or quota.memory < 0:
         return True
     total_size = new_size / 1024.0
-    _pre_cache_sizes(driver)
-    instances = driver.list_instances()
+    if instances is None:
+        instances = list_quota_instances(driver)
     for inst in instances:
         try:
             total_size += inst.size._size.ram / 1024.0
@@ -238,10 +240,13 @@ def has_mem_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_instance_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_instance_count_quota(
+    driver, quota, new_size=0, raise_exc=True, instances=None
+):
     """
     True if the total number of instances found on driver are
     greater than or equal to Quota.instance otherwise False.
+    param - instances - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -249,8 +254,10 @@ def has_instance_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if instance count is null
     if not quota.instance_count or quota.instance_count < 0:
         return True
+    if instances is None:
+        instances = driver.list_instances()
     total_size = new_size
-    total_size += len(driver.list_instances())
+    total_size += len(instances)
     if total_size <= quota.instance_count:
         return True
     if raise_exc:
@@ -260,10 +267,13 @@ def has_instance_count_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_port_count_quota(identity, driver, quota, new_size=0, raise_exc=True):
+def has_port_count_quota(
+    identity, driver, quota, new_size=0, raise_exc=True, fixed_ips=None
+):
     """
     True if the total number of ports found on driver are
     less than or equal to Quota.port_count, otherwise False.
+    param - fixed_ips - if included, used instead of listing the ports
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -272,21 +282,15 @@ def has_port_count_quota(identity, driver, quota, new_size=0, raise_exc=True):
     if not quota.port_count or quota.port_count < 0:
         return True
     # Consider it true if we fail to connect here
-    try:
-        from service.instance import _to_network_driver
-        network_driver = _to_network_driver(identity)
-        port_list = network_driver.list_ports()
-    except Exception as exc:
-        logger.warn(
-            "Could not verify quota due to failed call to network_driver.list_ports() - %s"
-            % exc
-        )
-        return True
-    project_id = network_driver.get_tenant_id()
-    fixed_ips = [
-        port for port in port_list if 'compute:' in port['device_owner']
-        and port.get('project_id', project_id) == project_id
-    ]
+    if fixed_ips is None:
+        try:
+            fixed_ips = list_quota_fixed_ips(identity)
+        except Exception as exc:
+            logger.warn(
+                "Could not verify quota due to failed call to network_driver.list_ports() - %s"
+                % exc
+            )
+            return True
     total_size = new_size
     total_size += len(fixed_ips)
     if total_size <= quota.port_count:
@@ -298,10 +302,13 @@ def has_port_count_quota(identity, driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_floating_ip_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_floating_ip_count_quota(
+    driver, quota, new_size=0, raise_exc=True, floating_ips=None
+):
     """
     True if the total number of floating ips found on driver are
     less than or equal to Quota.floating_ip_count, otherwise False.
+    param - floating_ips - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -309,7 +316,8 @@ def has_floating_ip_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if floating_ip_count is null
     if not quota.floating_ip_count or quota.floating_ip_count < 0:
         return True
-    floating_ips = driver._connection.ex_list_floating_ips()
+    if floating_ips is None:
+        floating_ips = driver._connection.ex_list_floating_ips()
     total_size = new_size
     total_size += len(floating_ips)
     if total_size <= quota.floating_ip_count:
@@ -322,10 +330,11 @@ def has_floating_ip_count_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_storage_quota(driver, quota, new_size=0, raise_exc=True):
+def has_storage_quota(driver, quota, new_size=0, raise_exc=True, volumes=None):
     """
     True if the total volume size found on driver is
     less than or equal to Quota.storage, otherwise False.
+    param - volumes - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -333,9 +342,10 @@ def has_storage_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if storage is null
     if not quota.storage:
         return True
-    vols = driver.list_volumes()
+    if volumes is None:
+        volumes = driver.list_volumes()
     total_size = new_size
-    for vol in vols:
+    for vol in volumes:
         total_size += vol.size
     if total_size <= quota.storage:
         return True
@@ -346,10 +356,13 @@ def has_storage_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_snapshot_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_snapshot_count_quota(
+    driver, quota, new_size=0, raise_exc=True, snapshots=None
+):
     """
     True if the total number of volumes found on driver are
     greater than or equal to Quota.snapshot otherwise False.
+    param - snapshots - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -357,8 +370,10 @@ def has_snapshot_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if snapshot count is null
     if not quota.snapshot_count or quota.snapshot_count < 0:
         return True
+    if snapshots is None:
+        snapshots = driver._connection.ex_list_snapshots()
     total_size = new_size
-    total_size += len(driver._connection.ex_list_snapshots())
+    total_size += len(snapshots)
     if total_size <= quota.snapshot_count:
         return True
     if raise_exc:
@@ -368,10 +383,13 @@ def has_snapshot_count_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_storage_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_storage_count_quota(
+    driver, quota, new_size=0, raise_exc=True, volumes=None
+):
     """
     True if the total number of volumes found on driver are
     greater than or equal to Quota.storage otherwise False.
+    param - volumes - if included, used instead of listing the driver
     """
     # Always False if quota doesnt exist, new size is negative
     if not quota or new_size < 0:
@@ -379,8 +397,10 @@ def has_storage_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if storage count is null
     if not quota.storage_count:
         return True
+    if volumes is None:
+        volumes = driver.list_volumes()
     total_size = new_size
-    total_size += len(driver.list_volumes())
+    total_size += len(volumes)
     if total_size <= quota.storage_count:
         return True
     if raise_exc:
@@ -397,6 +417,30 @@ def _raise_quota_error(resource_name, current_count, new_count, limit_count):
     )
 
 
+def list_quota_instances(driver):
+    """
+    List the instances of driver, with sizes pre-cached
+    (so their CPU and RAM can be counted)
+    """
+    _pre_cache_sizes(driver)
+    return driver.list_instances()
+
+
+def list_quota_fixed_ips(identity):
+    """
+    List the (compute) ports of identity's project that count
+    toward Quota.port_count
+    """
+    from service.instance import _to_network_driver
+    network_driver = _to_network_driver(identity)
+    port_list = network_driver.list_ports()
+    project_id = network_driver.get_tenant_id()
+    return [
+        port for port in port_list if 'compute:' in port['device_owner']
+        and port.get('project_id', project_id) == project_id
+    ]
+
+
 def _pre_cache_sizes(driver):
     """
     Pre-caching sizes is required to get 'extra' data from size,
@@ -0,0 +1,278 @@
+"""
+Full-text search documents for images (Applications).
+
+Each Application has one ApplicationSearchDocument: a (GIN indexed)
+tsvector of its name, tags, description and (least relevant) its id,
+author, version change logs and machine identifiers/provider locations.
+Documents are rebuilt whenever an Application, ApplicationVersion,
+ProviderMachine or Tag is saved, and whenever an Application is tagged
+or untagged.
+
+`search_applications` matches every word of the search terms as a prefix
+(so results update as the user types) and ranks the matches. When the
+database is not PostgreSQL (or IMAGE_FULL_TEXT_SEARCH is False), it falls
+back to the previous `icontains` filters.
+"""
+import operator
+import re
+from collections import defaultdict
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField
+)
+from django.db import connection, models, transaction
+from django.db.models import F, Q, TextField, Value
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from core.models.application import Application
+from core.models.application_tag import ApplicationTag
+from core.models.application_version import ApplicationVersion
+from core.models.machine import ProviderMachine
+from core.models.tag import Tag
+
+# Simple (un-stemmed) parsing keeps names and identifiers searchable by prefix
+SEARCH_CONFIG = 'simple'
+SEARCH_WORD = re.compile(r'\w+', re.UNICODE)
+REBUILD_CHUNK_SIZE = 500
+# Used when full-text search is not available
+FALLBACK_SEARCH_FIELDS = (
+    'id', 'name', 'description', 'created_by__username', 'tags__name',
+    'tags__description', 'versions__change_log',
+    'versions__machines__instance_source__identifier',
+    'versions__machines__instance_source__provider__location'
+)
+
+
+class ApplicationSearchDocument(models.Model):
+    """
+    The full-text search document of an Application.
+    NOTE: Rows are derived data -- never edit them by hand.
+    """
+    application = models.OneToOneField(
+        Application, related_name='search_document', on_delete=models.CASCADE
+    )
+    document = SearchVectorField(null=True)
+
+    class Meta:
+        db_table = 'application_search_document'
+        app_label = 'core'
+        indexes = [
+            GinIndex(fields=['document'], name='app_search_document_gin'),
+        ]
+
+    def __unicode__(self):
+        return "Search document of %s" % self.application_id
+
+
+class PrefixSearchQuery(SearchQuery):
+    """
+    Match every word in `value` as a prefix ('ubu' matches 'ubuntu').
+    """
+
+    def as_sql(self, compiler, connection):
+        params = [
+            ' & '.join(
+                "%s:*" % word for word in SEARCH_WORD.findall(self.value)
+            )
+        ]
+        template = 'to_tsquery(%s)'
+        if self.config:
+            config_sql, config_params = compiler.compile(self.config)
+            template = 'to_tsquery({}::regconfig, %s)'.format(config_sql)
+            params = config_params + params
+        return template, params
+
+
+def full_text_search_enabled():
+    return connection.vendor == 'postgresql' and getattr(
+        settings, 'IMAGE_FULL_TEXT_SEARCH', True
+    )
+
+
+def _text(values):
+    return ' '.join(value for value in values if value)
+
+
+def _weighted(text, weight):
+    return SearchVector(
+        Value(text, output_field=TextField()),
+        config=SEARCH_CONFIG,
+        weight=weight
+    )
+
+
+def refresh_search_documents(application_ids):
+    """
+    Rebuild the search document of every application in `application_ids`.
+    """
+    application_ids = set(application_ids)
+    if not application_ids:
+        return 0
+    tags = defaultdict(list)
+    tag_descriptions = defaultdict(list)
+    application_tags = Application.tags.through.objects.filter(
+        application__in=application_ids
+    )
+    for application_id, name, description in application_tags.values_list(
+        'application_id', 'tag__name', 'tag__description'
+    ):
+        tags[application_id].append(name)
+        tag_descriptions[application_id].append(description)
+    details = defaultdict(list)
+    for application_id, change_log in ApplicationVersion.objects.filter(
+        application__in=application_ids
+    ).values_list('application_id', 'change_log'):
+        details[application_id].append(change_log)
+    for application_id, identifier, location in ProviderMachine.objects.filter(
+        application_version__application__in=application_ids
+    ).values_list(
+        'application_version__application_id', 'instance_source__identifier',
+        'instance_source__provider__location'
+    ):
+        details[application_id].extend([identifier, location])
+
+    applications = list(
+        Application.objects.filter(
+            id__in=application_ids
+        ).values_list('id', 'name', 'description', 'created_by__username')
+    )
+    with transaction.atomic():
+        existing = set(
+            ApplicationSearchDocument.objects.filter(
+                application__in=application_ids
+            ).values_list('application_id', flat=True)
+        )
+        ApplicationSearchDocument.objects.bulk_create(
+            [
+                ApplicationSearchDocument(application_id=application_id)
+                for application_id, _, _, _ in applications
+                if application_id not in existing
+            ]
+        )
+        for application_id, name, description, username in applications:
+            ApplicationSearchDocument.objects.filter(
+                application_id=application_id
+            ).update(
+                document=(
+                    _weighted(name, 'A') +
+                    _weighted(_text(tags[application_id]), 'B') + _weighted(
+                        _text([description] +
+                              tag_descriptions[application_id]), 'C'
+                    ) + _weighted(
+                        _text(
+                            [str(application_id), username] +
+                            details[application_id]
+                        ), 'D'
+                    )
+                )
+            )
+    return len(applications)
+
+
+def rebuild_search_documents(chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Rebuild every search document, `chunk_size` applications at a time.
+    """
+    application_ids = list(
+        Application.objects.order_by('id').values_list('id', flat=True)
+    )
+    total = 0
+    for index in range(0, len(application_ids), chunk_size):
+        total += refresh_search_documents(
+            application_ids[index:index + chunk_size]
+        )
+    return total
+
+
+def _fallback_search(queryset, search_terms, search_fields):
+    conditions = [
+        reduce(
+            operator.or_,
+            [Q(**{"%s__icontains" % field: term}) for field in search_fields]
+        ) for term in search_terms
+    ]
+    return queryset.filter(reduce(operator.and_, conditions)).distinct()
+
+
+def search_applications(
+    queryset,
+    search_terms,
+    prefix='',
+    rank=True,
+    fallback_fields=FALLBACK_SEARCH_FIELDS
+):
+    """
+    Filter `queryset` to the objects whose application matches every
+    word in `search_terms` (ordered by rank, if `rank`).
+    param - prefix - the path from the queryset's model to the Application,
+                     e.g. 'application_version__application__'
+    param - fallback_fields - fields (relative to `prefix`) searched with
+                              icontains when full-text search is unavailable
+    """
+    if isinstance(search_terms, basestring):
+        search_terms = [search_terms]
+    if not full_text_search_enabled():
+        return _fallback_search(
+            queryset, search_terms,
+            ["%s%s" % (prefix, field) for field in fallback_fields]
+        )
+    words = ' '.join(search_terms)
+    if not SEARCH_WORD.search(words):
+        return queryset.none()
+    search_query = PrefixSearchQuery(words, config=SEARCH_CONFIG)
+    document = "%ssearch_document__document" % prefix
+    queryset = queryset.filter(**{document: search_query})
+    if not rank:
+        return queryset
+    return queryset.annotate(search_rank=SearchRank(F(document), search_query)
+                            ).order_by('-search_rank')
+
+
+def _refresh_application(sender, instance, **kwargs):
+    refresh_search_documents([instance.id])
+
+
+def _refresh_version(sender, instance, **kwargs):
+    refresh_search_documents([instance.application_id])
+
+
+def _refresh_machine(sender, instance, **kwargs):
+    if instance.application_version_id:
+        refresh_search_documents(
+            ApplicationVersion.objects.filter(
+                id=instance.application_version_id
+            ).values_list('application_id', flat=True)
+        )
+
+
+def _refresh_tag(sender, instance, **kwargs):
+    refresh_search_documents(
+        Application.objects.filter(tags=instance).values_list('id', flat=True)
+    )
+
+
+def _refresh_application_tag(sender, instance, **kwargs):
+    refresh_search_documents([instance.application_id])
+
+
+def _refresh_application_tags(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_search_documents([instance.id])
+    elif pk_set:
+        refresh_search_documents(pk_set)
+
+
+post_save.connect(_refresh_application, sender=Application)
+post_save.connect(_refresh_version, sender=ApplicationVersion)
+post_save.connect(_refresh_machine, sender=ProviderMachine)
+post_save.connect(_refresh_tag, sender=Tag)
+post_save.connect(_refresh_application_tag, sender=ApplicationTag)
+post_delete.connect(_refresh_application_tag, sender=ApplicationTag)
+m2m_changed.connect(_refresh_application_tags, sender=Application.tags.through)
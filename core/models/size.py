@@ -1,9 +1,19 @@
 import uuid
 
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
+
+from core.lookup_cache import LookupCache
 from core.models.provider import Provider
 
+# The sentinel size of histories recorded without a known size
+UNKNOWN_SIZE = dict(
+    name='Unknown Size', alias='N/A', cpu=-1, mem=-1, root=-1, disk=-1
+)
+# Unknown sizes, by provider id
+_unknown_sizes = LookupCache('unknown_size')
+
 
 class Size(models.Model):
     """
@@ -86,19 +96,35 @@ def convert_esh_size(esh_size, provider_uuid):
     return core_size
 
 
+def apply_cloud_size(core_size, rtwo_size):
+    """
+    Copy the fields of a cloud(rtwo) size onto `core_size` (without saving).
+    Returns the names of the fields that changed.
+    """
+    values = {'name': rtwo_size.name}
+    # Don't update to -1,-1 or 0,0
+    if rtwo_size.cpu >= 1 and rtwo_size.ram >= 1:
+        values.update(
+            disk=rtwo_size.disk,
+            root=rtwo_size.ephemeral,
+            cpu=rtwo_size.cpu,
+            mem=rtwo_size.ram
+        )
+    changed = []
+    for field, value in values.items():
+        if getattr(core_size, field) != value:
+            setattr(core_size, field, value)
+            changed.append(field)
+    return changed
+
+
 def _update_from_cloud_size(core_size, rtwo_size):
     """
     Full scope replacement based on cloud(rtwo) size
     """
-    core_size.name = rtwo_size.name
-    # Don't update to -1,-1 or 0,0
-    if rtwo_size.cpu < 1 or rtwo_size.ram < 1:
-        return core_size
-    core_size.disk = rtwo_size.disk
-    core_size.root = rtwo_size.ephemeral
-    core_size.cpu = rtwo_size.cpu
-    core_size.mem = rtwo_size.ram
-    core_size.save()
+    changed = apply_cloud_size(core_size, rtwo_size)
+    if changed:
+        core_size.save(update_fields=changed)
     return core_size
 
 
@@ -127,3 +153,32 @@ def create_size(name, alias, cpu, mem, disk, root, provider_uuid):
         provider=provider
     )
     return size
+
+
+def get_unknown_size(provider):
+    """
+    Return the 'Unknown Size' of `provider`, creating it if needed.
+    """
+
+    def load():
+        unknown_size, _ = Size.objects.get_or_create(
+            provider=provider, **UNKNOWN_SIZE
+        )
+        return unknown_size
+
+    return _unknown_sizes.get(provider.id, load)
+
+
+def preload_unknown_sizes():
+    unknown_sizes = {}
+    for size in Size.objects.filter(**UNKNOWN_SIZE).order_by('-id'):
+        unknown_sizes[size.provider_id] = size
+    _unknown_sizes.load(unknown_sizes)
+
+
+def _forget_unknown_size(sender, instance, **kwargs):
+    _unknown_sizes.discard(instance.pk)
+
+
+post_save.connect(_forget_unknown_size, sender=Size)
+post_delete.connect(_forget_unknown_size, sender=Size)
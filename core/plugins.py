@@ -1,4 +1,6 @@
 import inspect
+import threading
+import time
 
 import enum
 
@@ -7,11 +9,147 @@ from django.core.exceptions import ImproperlyConfigured
 from django.conf import settings
 from threepio import logger
 
+# Seconds a plugin's answer (for one user, allocation source and provider)
+# is re-used. 0 disables the result cache.
+DEFAULT_PLUGIN_RESULT_CACHE_TTL = 0
+
 
 def load_plugin_class(plugin_path):
     return import_string(plugin_path)
 
 
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+class PluginRegistry(object):
+    """
+    Plugin classes, imported once per process, and a singleton instance
+    of each. The methods a manager calls are validated (with
+    `inspect.getcallargs`) the first time, instead of on every call.
+    """
+
+    def __init__(self):
+        self._classes = {}
+        self._instances = {}
+        self._checked = set()
+        self._lock = threading.RLock()
+
+    def plugin_class(self, plugin_path):
+        with self._lock:
+            if plugin_path not in self._classes:
+                self._classes[plugin_path] = load_plugin_class(plugin_path)
+            return self._classes[plugin_path]
+
+    def plugin(self, plugin_path):
+        with self._lock:
+            if plugin_path not in self._instances:
+                self._instances[plugin_path] = self.plugin_class(plugin_path)()
+            return self._instances[plugin_path]
+
+    def check(self, plugin_path, method_name, kwarg_names):
+        """
+        Log (once) if the plugin's `method_name` is missing or does not
+        accept `kwarg_names`.
+        """
+        key = (plugin_path, method_name, tuple(kwarg_names))
+        if key in self._checked:
+            return
+        try:
+            inspect.getcallargs(
+                getattr(self.plugin(plugin_path), method_name),
+                **dict.fromkeys(kwarg_names)
+            )
+        except AttributeError:
+            logger.info(
+                "Plugin %s missing method '%s'", plugin_path, method_name
+            )
+        except TypeError:
+            logger.info(
+                "Plugin %s method '%s' does not accept kwargs %s", plugin_path,
+                method_name, ", ".join(kwarg_names)
+            )
+        self._checked.add(key)
+
+    def clear(self):
+        with self._lock:
+            self._classes = {}
+            self._instances = {}
+            self._checked = set()
+
+
+class PluginResultCache(object):
+    """
+    Plugin answers by (plugin, method, user, allocation source, provider),
+    kept for PLUGIN_RESULT_CACHE_TTL seconds.
+
+    Entries are per process: `invalidate_plugin_results` (connected to the
+    models the answers depend on) only reaches the current process, other
+    processes see the change once their entries expire.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def get_or_call(self, key, call):
+        ttl = getattr(
+            settings, 'PLUGIN_RESULT_CACHE_TTL', DEFAULT_PLUGIN_RESULT_CACHE_TTL
+        )
+        if not ttl:
+            return call()
+        entry = self._results.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        result = call()
+        with self._lock:
+            self._results[key] = (time.time() + ttl, result)
+        return result
+
+    def invalidate(self, user=None, allocation_source=None, provider=None):
+        """
+        Forget the answers for `user`, `allocation_source` and/or
+        `provider` (every answer, if none is given).
+        """
+        ids = (_pk(user), _pk(allocation_source), _pk(provider))
+        with self._lock:
+            self._results = dict(
+                (key, entry) for key, entry in self._results.items() if not all(
+                    pk is None or pk == key_pk
+                    for pk, key_pk in zip(ids, key[2:])
+                )
+            )
+
+    def clear(self):
+        with self._lock:
+            self._results = {}
+
+
+plugin_registry = PluginRegistry()
+plugin_results = PluginResultCache()
+
+
+def invalidate_plugin_results(user=None, allocation_source=None, provider=None):
+    plugin_results.invalidate(user, allocation_source, provider)
+
+
+def preload_plugins():
+    """
+    Import and instantiate every configured plugin (e.g. when a process
+    starts) so the first request does not pay for it.
+    """
+    for manager in (
+        DefaultQuotaPluginManager, AllocationSourcePluginManager,
+        ValidationPluginManager, ExpirationPluginManager
+    ):
+        for plugin_path in manager.list_of_classes:
+            try:
+                plugin_registry.plugin(plugin_path)
+            except Exception:
+                # Raised again (to the caller) when the plugin is used
+                logger.exception("Could not load plugin %s", plugin_path)
+
+
 class PluginManager(object):
     plugin_required = False
     plugin_required_message = "A Plugin is required."
@@ -75,12 +213,42 @@ class PluginListManager(object):
         """
         plugin_class_list = []
         for plugin_path in list_of_classes:
-            fn = load_plugin_class(plugin_path)
+            fn = plugin_registry.plugin_class(plugin_path)
             plugin_class_list.append(fn)
         if cls.plugin_required and not plugin_class_list:
             raise ImproperlyConfigured(cls.plugin_required_message)
         return plugin_class_list
 
+    @classmethod
+    def get_plugins(cls, method_name, kwarg_names):
+        """
+        Return (plugin path, singleton plugin) for each plugin in
+        `list_of_classes`, after checking (once) that the plugin's
+        `method_name` accepts `kwarg_names`.
+        """
+        plugins = []
+        for plugin_path in cls.list_of_classes:
+            plugin_registry.check(plugin_path, method_name, kwarg_names)
+            plugins.append((plugin_path, plugin_registry.plugin(plugin_path)))
+        if cls.plugin_required and not plugins:
+            raise ImproperlyConfigured(cls.plugin_required_message)
+        return plugins
+
+    @classmethod
+    def call_plugin(cls, plugin_path, plugin, method_name, **kwargs):
+        """
+        Return `plugin.method_name(**kwargs)`, re-using a recent answer
+        for the same user, allocation source and provider (see
+        PLUGIN_RESULT_CACHE_TTL).
+        """
+        key = (
+            plugin_path, method_name, _pk(kwargs.get('user')),
+            _pk(kwargs.get('allocation_source')), _pk(kwargs.get('provider'))
+        )
+        return plugin_results.get_or_call(
+            key, lambda: getattr(plugin, method_name)(**kwargs)
+        )
+
 
 class DefaultQuotaPluginManager(PluginListManager):
     """
@@ -95,26 +263,15 @@ class DefaultQuotaPluginManager(PluginListManager):
         Load each Default Quota Plugin and call `plugin.get_default_quota(user, provider)`
         """
         _default_quota = None
-        for DefaultQuotaPlugin in cls.load_plugins(cls.list_of_classes):
-            plugin = DefaultQuotaPlugin()
-            try:
-                inspect.getcallargs(
-                    getattr(plugin, 'get_default_quota'),
-                    user=user,
-                    provider=provider
-                )
-            except AttributeError:
-                logger.info(
-                    "Validation plugin %s missing method 'get_default_quota'" %
-                    DefaultQuotaPlugin
-                )
-            except TypeError:
-                logger.info(
-                    "Validation plugin %s does not accept kwargs `user` & `provider`"
-                    % DefaultQuotaPlugin
-                )
-            _default_quota = plugin.get_default_quota(
-                user=user, provider=provider
+        for plugin_path, plugin in cls.get_plugins(
+            'get_default_quota', ['user', 'provider']
+        ):
+            _default_quota = cls.call_plugin(
+                plugin_path,
+                plugin,
+                'get_default_quota',
+                user=user,
+                provider=provider
             )
             if _default_quota:
                 return _default_quota
@@ -148,24 +305,9 @@ class AllocationSourcePluginManager(PluginListManager):
         :rtype: bool
         """
         _has_valid_allocation_sources = False
-        for AllocationSourcePlugin in cls.load_plugins(cls.list_of_classes):
-            plugin = AllocationSourcePlugin()
-            try:
-                inspect.getcallargs(
-                    getattr(plugin, 'ensure_user_allocation_source'),
-                    user=user,
-                    provider=provider
-                )
-            except AttributeError:
-                logger.info(
-                    "Allocation Source plugin %s missing method 'ensure_user_allocation_source'",
-                    AllocationSourcePlugin
-                )
-            except TypeError:
-                logger.info(
-                    "Allocation Source plugin %s does not accept kwargs `user` & `provider`",
-                    AllocationSourcePlugin
-                )
+        for _, plugin in cls.get_plugins(
+            'ensure_user_allocation_source', ['user', 'provider']
+        ):
             _has_valid_allocation_sources = plugin.ensure_user_allocation_source(
                 user=user, provider=provider
             )
@@ -191,26 +333,14 @@ class AllocationSourcePluginManager(PluginListManager):
         :rtype: EnforcementOverrideChoice
         """
         _enforcement_override_choice = EnforcementOverrideChoice.NO_OVERRIDE
-        for AllocationSourcePlugin in cls.load_plugins(cls.list_of_classes):
-            plugin = AllocationSourcePlugin()
-            try:
-                inspect.getcallargs(
-                    getattr(plugin, 'get_enforcement_override'),
-                    user=user,
-                    allocation_source=allocation_source,
-                    provider=provider
-                )
-            except AttributeError:
-                logger.info(
-                    "Allocation Source plugin %s missing method 'get_enforcement_override'",
-                    AllocationSourcePlugin
-                )
-            except TypeError:
-                logger.info(
-                    "Allocation Source plugin %s does not accept kwargs `user`, `allocation_source`, & `provider`",
-                    AllocationSourcePlugin
-                )
-            _enforcement_override_choice = plugin.get_enforcement_override(
+        for plugin_path, plugin in cls.get_plugins(
+            'get_enforcement_override',
+            ['user', 'allocation_source', 'provider']
+        ):
+            _enforcement_override_choice = cls.call_plugin(
+                plugin_path,
+                plugin,
+                'get_enforcement_override',
                 user=user,
                 allocation_source=allocation_source,
                 provider=provider
@@ -219,6 +349,57 @@ class AllocationSourcePluginManager(PluginListManager):
                 return _enforcement_override_choice
         return _enforcement_override_choice
 
+    @classmethod
+    def get_enforcement_overrides(cls, user_allocation_sources, provider=None):
+        """Bulk version of `get_enforcement_override`.
+
+        Plugins implementing `get_enforcement_overrides(user_allocation_sources, provider)` answer for every pair
+        at once, other plugins are asked once per pair. For each pair, the first value that is not
+        `EnforcementOverrideChoice.NO_OVERRIDE` wins.
+
+        :param user_allocation_sources: The (user, allocation source) pairs to check
+        :type user_allocation_sources: list of (core.models.AtmosphereUser, core.models.AllocationSource)
+        :param provider: The provider (optional, not used by any plugins yet)
+        :type provider: core.models.Provider
+        :return: The enforcement override behaviour, keyed by (user.id, allocation_source.id)
+        :rtype: dict
+        """
+        overrides = dict(
+            (
+                (user.id, allocation_source.id),
+                EnforcementOverrideChoice.NO_OVERRIDE
+            ) for user, allocation_source in user_allocation_sources
+        )
+        for _, plugin in cls.get_plugins(
+            'get_enforcement_override',
+            ['user', 'allocation_source', 'provider']
+        ):
+            undecided = [
+                (user, allocation_source)
+                for user, allocation_source in user_allocation_sources
+                if overrides[(user.id, allocation_source.id
+                             )] == EnforcementOverrideChoice.NO_OVERRIDE
+            ]
+            if not undecided:
+                break
+            if hasattr(plugin, 'get_enforcement_overrides'):
+                choices = plugin.get_enforcement_overrides(
+                    user_allocation_sources=undecided, provider=provider
+                )
+            else:
+                choices = dict(
+                    (
+                        (user.id, allocation_source.id),
+                        plugin.get_enforcement_override(
+                            user=user,
+                            allocation_source=allocation_source,
+                            provider=provider
+                        )
+                    ) for user, allocation_source in undecided
+                )
+            overrides.update(choices)
+        return overrides
+
 
 class AccountCreationPluginManager(PluginListManager):
     """
@@ -282,21 +463,10 @@ class ValidationPluginManager(PluginListManager):
         Load each ValidationPlugin and call `plugin.validate_user(user)`
         """
         _is_valid = False
-        for ValidationPlugin in cls.load_plugins(cls.list_of_classes):
-            plugin = ValidationPlugin()
-            try:
-                inspect.getcallargs(getattr(plugin, 'validate_user'), user=user)
-            except AttributeError:
-                logger.info(
-                    "Validation plugin %s missing method 'validate_user'" %
-                    ValidationPlugin
-                )
-            except TypeError:
-                logger.info(
-                    "Validation plugin %s does not accept kwarg `user`" %
-                    ValidationPlugin
-                )
-            _is_valid = plugin.validate_user(user=user)
+        for plugin_path, plugin in cls.get_plugins('validate_user', ['user']):
+            _is_valid = cls.call_plugin(
+                plugin_path, plugin, 'validate_user', user=user
+            )
             if _is_valid:
                 return True
         return _is_valid
@@ -318,27 +488,16 @@ class ExpirationPluginManager(PluginListManager):
         Load each ExpirationPlugin and call `plugin.is_expired(user)`
         """
         _is_expired = False
-        for ExpirationPlugin in cls.load_plugins(cls.list_of_classes):
-            plugin = ExpirationPlugin()
-            try:
-                inspect.getcallargs(getattr(plugin, 'is_expired'), user=user)
-            except AttributeError:
-                logger.info(
-                    "Expiration plugin %s does not have a 'is_expired' method" %
-                    ExpirationPlugin
-                )
-            except TypeError:
-                logger.info(
-                    "Expiration plugin %s does not accept kwarg `user`" %
-                    ExpirationPlugin
-                )
+        for plugin_path, plugin in cls.get_plugins('is_expired', ['user']):
             try:
                 # TODO: Set a reasonable timeout but don't let it hold this indefinitely
-                _is_expired = plugin.is_expired(user=user)
+                _is_expired = cls.call_plugin(
+                    plugin_path, plugin, 'is_expired', user=user
+                )
             except Exception as exc:
                 logger.info(
                     "Expiration plugin %s encountered an error: %s" %
-                    (ExpirationPlugin, exc)
+                    (plugin_path, exc)
                 )
                 _is_expired = True
 
@@ -0,0 +1,111 @@
+"""
+Shared, pooled redis connections.
+
+Every redis user (service.cache, core.metrics, the account driver cache)
+goes through `get_redis_connection`, so each worker keeps one bounded pool
+of sockets instead of opening a new connection per call.
+
+Optional settings:
+  REDIS_URL - where redis lives (default: 'redis://localhost:6379/0')
+  REDIS_MAX_CONNECTIONS - size of the per-process pool (default: 50)
+  REDIS_POOL_TIMEOUT - seconds to wait for a free connection (default: 5)
+  REDIS_SOCKET_TIMEOUT - seconds to wait on a redis command (default: 5)
+"""
+import threading
+
+import redis
+from django.conf import settings
+
+from threepio import logger
+
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+DEFAULT_MAX_CONNECTIONS = 50
+DEFAULT_POOL_TIMEOUT = 5
+DEFAULT_SOCKET_TIMEOUT = 5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Return the (lazily created) connection pool of this process.
+    NOTE: redis-py resets the pool in a child process after a fork.
+    """
+    global _pool
+    if _pool:
+        return _pool
+    with _pool_lock:
+        if not _pool:
+            _pool = redis.BlockingConnectionPool.from_url(
+                getattr(settings, 'REDIS_URL', DEFAULT_REDIS_URL),
+                max_connections=getattr(
+                    settings, 'REDIS_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS
+                ),
+                timeout=getattr(
+                    settings, 'REDIS_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT
+                ),
+                socket_timeout=getattr(
+                    settings, 'REDIS_SOCKET_TIMEOUT', DEFAULT_SOCKET_TIMEOUT
+                ),
+                socket_connect_timeout=getattr(
+                    settings, 'REDIS_SOCKET_TIMEOUT', DEFAULT_SOCKET_TIMEOUT
+                ),
+            )
+    return _pool
+
+
+def get_redis_connection():
+    """
+    Return a StrictRedis client backed by the shared connection pool.
+    Clients are cheap; connections are only checked out per command.
+    """
+    return redis.StrictRedis(connection_pool=get_connection_pool())
+
+
+def reset_connection_pool():
+    """
+    Disconnect and forget the current pool (e.g. after a settings change)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool:
+            _pool.disconnect()
+        _pool = None
+
+
+def redis_health_check():
+    """
+    Return True if redis answers a PING within REDIS_SOCKET_TIMEOUT
+    """
+    try:
+        return get_redis_connection().ping()
+    except redis.exceptions.RedisError:
+        logger.exception("Redis health check failed")
+        return False
+
+
+def get_many(keys):
+    """
+    GET every key in `keys` in a single round trip.
+    Returns a list of values (None for missing keys), in order.
+    """
+    if not keys:
+        return []
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for key in keys:
+        pipe.get(key)
+    return pipe.execute()
+
+
+def set_many(mapping, timeout=None):
+    """
+    SET every key/value in `mapping` (expiring after `timeout` seconds,
+    if provided) in a single round trip.
+    """
+    if not mapping:
+        return []
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for key, value in mapping.items():
+        pipe.set(key, value, ex=timeout)
+    return pipe.execute()
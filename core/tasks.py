@@ -7,7 +7,9 @@ from django.core.mail import EmailMessage
 from django.conf import settings
 from threepio import celery_logger, email_logger
 
+from core.models.event_table import dispatch_pending_events
 from core.models.status_type import get_status_type
+from service.run_stats import RunStats
 
 
 @task(name="send_email")
@@ -61,3 +63,16 @@ def set_request_as_failed(request):
     """
     request.status = get_status_type(status="failed")
     request.save()
+
+
+@task(name="dispatch_entity_events")
+def dispatch_entity_events(entity_id):
+    """
+    Run the listeners of the pending events of `entity_id`, in order
+    (see `core.models.event_table.dispatch_pending_events`).
+    """
+    stats = RunStats("dispatch_entity_events", entity_id=entity_id)
+    with stats:
+        dispatch_pending_events(entity_id, stats)
+    stats.log(celery_logger)
+    return stats.report()
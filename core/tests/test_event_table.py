@@ -5,6 +5,10 @@ from django.test import TestCase, override_settings
 from api.tests.factories import UserFactory
 from core.models import EventTable, AllocationSource
 from core.models import UserAllocationSource
+from core.models.event_table import (
+    _post_save_listeners, dispatch_pending_events, register_event_listener
+)
+from service.run_stats import RunStats
 
 
 class EventTableTest(TestCase):
@@ -47,3 +51,45 @@ class EventTableTest(TestCase):
                 'threshold': 10
             }
         )
+
+
+class EventDispatchTest(TestCase):
+    def setUp(self):
+        self.handled = []
+
+        def listen_for_test_event(sender, instance, created, **kwargs):
+            self.handled.append(instance.payload['order'])
+
+        register_event_listener('test_event', listen_for_test_event)
+        self.addCleanup(_post_save_listeners.pop, 'test_event')
+
+    def _create_events(self, count, entity_id='entity'):
+        return [
+            EventTable.create_event('test_event', {'order': order}, entity_id)
+            for order in range(count)
+        ]
+
+    def test_listeners_only_see_their_events(self):
+        EventTable.create_event('other_event', {'order': -1}, 'entity')
+        self._create_events(1)
+        self.assertEqual(self.handled, [0])
+
+    @override_settings(EVENT_DISPATCH_MODE='async')
+    def test_async_events_are_dispatched_once_in_order(self):
+        events = self._create_events(3)
+        self._create_events(1, entity_id='other-entity')
+        self.assertEqual(self.handled, [])
+        stats = RunStats('dispatch_entity_events')
+        with stats:
+            dispatched = dispatch_pending_events('entity', stats)
+        self.assertEqual(dispatched, events)
+        self.assertEqual(self.handled, [0, 1, 2])
+        self.assertIn('listen_for_test_event', stats.phases)
+        self.assertEqual(stats.counters['events_dispatched'], 3)
+        self.assertFalse(
+            EventTable.objects.filter(
+                entity_id='entity', dispatched_at__isnull=True
+            ).exists()
+        )
+        self.assertEqual(dispatch_pending_events('entity'), [])
+        self.assertEqual(self.handled, [0, 1, 2])
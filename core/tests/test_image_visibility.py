@@ -0,0 +1,117 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Q
+from django.test import TestCase
+
+from api.tests.factories import (
+    IdentityFactory, ImageFactory, ProviderFactory, ProviderMachineFactory,
+    UserFactory
+)
+from core import query
+from core.admin import end_date_machine, private_object
+from core.models import (
+    Application, ApplicationVisibility, ProviderMachine,
+    ProviderMachineMembership
+)
+from core.models.image_visibility import rebuild_application_visibility
+
+
+class ImageVisibilityTest(TestCase):
+    def setUp(self):
+        self.provider = ProviderFactory.create(public=True)
+        self.owner = UserFactory.create()
+        self.owner_identity = IdentityFactory.create_identity(
+            created_by=self.owner, provider=self.provider
+        )
+        self.user = UserFactory.create()
+        self.user_identity = IdentityFactory.create_identity(
+            created_by=self.user, provider=self.provider
+        )
+        self.public_image = self._create_image(private=False)
+        self.private_image = self._create_image(private=True)
+        self.shared_image = self._create_image(private=True)
+        ProviderMachineMembership.objects.create(
+            provider_machine=self.shared_image.versions.get().machines.get(),
+            group=self.user.memberships.get().group
+        )
+
+    def _create_image(self, private):
+        image = ImageFactory.create(
+            created_by=self.owner,
+            created_by_identity=self.owner_identity,
+            private=private
+        )
+        ProviderMachineFactory.create_provider_machine(
+            self.owner, self.owner_identity, application=image
+        )
+        return image
+
+    def _legacy_images_for_user(self, user):
+        return set(
+            Application.objects.filter(
+                query.created_by_user(user) | (
+                    query.only_current_apps() & query.in_users_providers(user) &
+                    (
+                        query.images_shared_with_user_by_ids(user) |
+                        Q(private=False)
+                    )
+                )
+            ).distinct()
+        )
+
+    def _assert_matches_legacy_query(self):
+        self.assertEqual(
+            set(Application.images_for_user(self.user)),
+            self._legacy_images_for_user(self.user)
+        )
+
+    def test_shared_and_public_images_are_visible(self):
+        self.assertEqual(
+            set(Application.images_for_user(self.user)),
+            {self.public_image, self.shared_image}
+        )
+        self.assertEqual(
+            set(Application.images_for_user(AnonymousUser())),
+            {self.public_image}
+        )
+        self._assert_matches_legacy_query()
+
+    def test_changes_are_applied_incrementally(self):
+        self.shared_image.end_date_all()
+        self.private_image.private = False
+        self.private_image.save()
+        ProviderMachineMembership.objects.filter(
+            provider_machine__application_version__application=self.shared_image
+        ).delete()
+        self.assertEqual(
+            set(Application.images_for_user(self.user)),
+            {self.public_image, self.private_image}
+        )
+        self._assert_matches_legacy_query()
+
+    def test_rebuild_matches_incremental_rows(self):
+        def rows():
+            return sorted(
+                ApplicationVisibility.objects.values_list(
+                    'application_id', 'provider_id', 'group_id'
+                )
+            )
+
+        incremental = rows()
+        ApplicationVisibility.objects.all().delete()
+        rebuild_application_visibility()
+        self.assertEqual(rows(), incremental)
+
+    def test_admin_actions_refresh_visibility(self):
+        private_object(
+            None, None, Application.objects.filter(id=self.public_image.id)
+        )
+        end_date_machine(
+            None, None,
+            ProviderMachine.objects.filter(
+                application_version__application=self.shared_image
+            )
+        )
+        self.assertEqual(set(Application.images_for_user(self.user)), set())
+        self.assertEqual(
+            set(Application.images_for_user(AnonymousUser())), set()
+        )
@@ -1,11 +1,22 @@
 import uuid
+from datetime import timedelta
 
 import unittest
 
 from dateutil.relativedelta import relativedelta
+from django.test import TestCase
+from django.utils import timezone
 from django.utils.timezone import datetime
 import pytz
 
+from api.tests.factories import (
+    AllocationSourceFactory, InstanceFactory, InstanceHistoryFactory,
+    InstanceStatusFactory, SizeFactory, UserFactory
+)
+from core.models import (
+    Instance, InstanceAllocationSourceSnapshot, InstanceStatusHistory
+)
+from core.models.instance_history import refresh_last_histories
 from core.tests.helpers import CoreStatusHistoryHelper, CoreInstanceHelper
 
 # Create an instance
@@ -89,3 +100,121 @@ class TestInstanceStatusHistory(CoreInstanceTestCase):
             next_start = next_start + self.history_swap_every
         self.instance_1.end_date_all(self.terminate_time)
         self.assertNoActiveHistory(self.instance_1)
+
+
+class TestAllocationSourcesFor(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.allocation_source = AllocationSourceFactory.create()
+        self.assigned = InstanceFactory.create(
+            provider_alias=str(uuid.uuid4()), created_by=self.user
+        )
+        InstanceAllocationSourceSnapshot.objects.create(
+            instance=self.assigned, allocation_source=self.allocation_source
+        )
+        self.unassigned = InstanceFactory.create(
+            provider_alias=str(uuid.uuid4()), created_by=self.user
+        )
+        self.aliases = [
+            self.assigned.provider_alias, self.unassigned.provider_alias,
+            'not-in-the-database'
+        ]
+
+    def test_resolves_instances_and_allocation_sources_in_one_query(self):
+        with self.assertNumQueries(1):
+            resolved = Instance.allocation_sources_for(
+                self.aliases, user=self.user
+            )
+        self.assertEqual(
+            resolved[self.assigned.provider_alias],
+            (self.assigned, self.allocation_source)
+        )
+        self.assertEqual(
+            resolved[self.unassigned.provider_alias], (self.unassigned, None)
+        )
+        self.assertNotIn('not-in-the-database', resolved)
+
+    def test_only_instances_created_by_the_user(self):
+        resolved = Instance.allocation_sources_for(
+            self.aliases, user=UserFactory.create()
+        )
+        self.assertEqual(resolved, {})
+
+
+class TestLastHistory(TestCase):
+    def setUp(self):
+        self.instance = InstanceFactory.create(
+            provider_alias=str(uuid.uuid4()),
+            created_by=UserFactory.create(),
+            start_date=timezone.now() - timedelta(hours=2)
+        )
+        self.size = SizeFactory.create()
+        self.first = InstanceHistoryFactory.create(
+            instance=self.instance,
+            status=InstanceStatusFactory.create(name='build'),
+            size=self.size,
+            start_date=self.instance.start_date
+        )
+
+    def _reloaded(self):
+        return Instance.objects.get(id=self.instance.id)
+
+    def _assert_last_history(self, instance, history):
+        self.assertEqual(instance.last_history_id, history.id)
+        self.assertEqual(instance.last_status, history.status.name)
+        self.assertEqual(instance.last_activity, history.activity)
+        self.assertEqual(instance.last_size_id, history.size_id)
+
+    def test_transaction_moves_the_last_history(self):
+        new_history = InstanceStatusHistory.transaction(
+            'active',
+            'networking',
+            self.instance,
+            self.size,
+            start_time=timezone.now()
+        )
+        self._assert_last_history(self.instance, new_history)
+        self._assert_last_history(self._reloaded(), new_history)
+        self.assertEqual(self.instance.esh_status(), 'active')
+        self.assertEqual(self.instance.api_activity(), '')
+
+    def test_saving_an_older_history_keeps_the_newest(self):
+        InstanceHistoryFactory.create(
+            instance=self.instance,
+            size=self.size,
+            start_date=self.instance.start_date - timedelta(hours=1)
+        )
+        self._assert_last_history(self._reloaded(), self.first)
+
+    def test_saving_the_instance_keeps_the_last_history(self):
+        stale = self._reloaded()
+        newer = InstanceHistoryFactory.create(
+            instance=self.instance, size=self.size
+        )
+        stale.name = 'renamed'
+        stale.save()
+        self._assert_last_history(self._reloaded(), newer)
+
+    def test_deleting_the_last_history_falls_back(self):
+        newer = InstanceHistoryFactory.create(
+            instance=self.instance, size=self.size
+        )
+        newer.delete()
+        self._assert_last_history(self._reloaded(), self.first)
+
+    def test_refresh_after_bulk_create(self):
+        newer = InstanceStatusHistory.create_history(
+            'suspended', self.instance, self.size, start_date=timezone.now()
+        )
+        InstanceStatusHistory.objects.bulk_create([newer])
+        self.assertEqual(refresh_last_histories([self.instance.id]), 1)
+        self.assertEqual(self._reloaded().last_status, 'suspended')
+
+    def test_reads_do_not_query_histories(self):
+        instance = Instance.objects.select_related('last_size').get(
+            id=self.instance.id
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(instance.api_status(), 'build')
+            self.assertEqual(instance.esh_status(), 'build')
+            self.assertEqual(instance.get_size(), self.size)
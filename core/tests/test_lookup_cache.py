@@ -0,0 +1,49 @@
+from django.test import TestCase
+
+from api.tests.factories import InstanceStatusFactory, ProviderFactory
+from core.models import InstanceStatus
+from core.models.instance_history import (
+    _instance_statuses, get_instance_status, preload_instance_statuses
+)
+from core.models.size import (
+    _unknown_sizes, get_unknown_size, preload_unknown_sizes
+)
+
+
+class LookupCacheTest(TestCase):
+    def setUp(self):
+        self.active = InstanceStatusFactory.create(name='active')
+        self.provider = ProviderFactory.create()
+
+    def tearDown(self):
+        # Cached rows would outlive the rolled back test transaction
+        _instance_statuses.clear()
+        _unknown_sizes.clear()
+
+    def test_preloaded_statuses_do_not_query(self):
+        preload_instance_statuses()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_instance_status('active'), self.active)
+
+    def test_uncommitted_rows_are_not_remembered(self):
+        status = get_instance_status('suspended')
+        self.assertEqual(status.name, 'suspended')
+        self.assertEqual(len(_instance_statuses), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_instance_status('suspended'), status)
+
+    def test_deleted_statuses_are_forgotten(self):
+        preload_instance_statuses()
+        self.active.delete()
+        replacement = get_instance_status('active')
+        self.assertNotEqual(replacement.pk, self.active.pk)
+        self.assertTrue(InstanceStatus.objects.filter(name='active').exists())
+
+    def test_unknown_size_is_cached_per_provider(self):
+        unknown_size = get_unknown_size(self.provider)
+        preload_unknown_sizes()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unknown_size(self.provider), unknown_size)
+        self.assertNotEqual(
+            get_unknown_size(ProviderFactory.create()), unknown_size
+        )
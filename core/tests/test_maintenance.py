@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import mock
+from django.test import TestCase
+from django.utils import timezone
+
+from api.tests.factories import UserFactory
+from core.models import MaintenanceRecord
+from core.models.maintenance import (
+    MaintenanceWindows, invalidate_maintenance_windows,
+    preload_maintenance_windows
+)
+
+
+class MaintenanceWindowsTest(TestCase):
+    def setUp(self):
+        invalidate_maintenance_windows()
+        self.now = timezone.now()
+
+    def tearDown(self):
+        # Cached records would outlive the rolled back test transaction
+        invalidate_maintenance_windows()
+
+    def _record(self, start, end=None, **kwargs):
+        return MaintenanceRecord.objects.create(
+            start_date=self.now + timedelta(hours=start),
+            end_date=self.now + timedelta(hours=end)
+            if end is not None else None,
+            title='Maintenance',
+            message='Down for maintenance',
+            **kwargs
+        )
+
+    def test_active_records_follow_their_dates(self):
+        ongoing = self._record(-1, 1)
+        upcoming = self._record(2)
+        windows = MaintenanceWindows([ongoing, upcoming])
+        self.assertEqual(windows.active(self.now), (ongoing, ))
+        self.assertEqual(
+            windows.active(self.now + timedelta(hours=1, minutes=30)), ()
+        )
+        self.assertEqual(
+            windows.active(self.now + timedelta(hours=3)), (upcoming, )
+        )
+
+    def test_preloaded_windows_do_not_query(self):
+        record = self._record(-1)
+        preload_maintenance_windows()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [r.id for r in MaintenanceRecord.cached_active()], [record.id]
+            )
+
+    def test_saving_a_record_invalidates_the_windows(self):
+        preload_maintenance_windows()
+        self.assertEqual(MaintenanceRecord.cached_active(), ())
+        record = self._record(-1)
+        self.assertEqual(
+            [r.id for r in MaintenanceRecord.cached_active()], [record.id]
+        )
+        record.delete()
+        self.assertEqual(MaintenanceRecord.cached_active(), ())
+
+    def test_login_is_only_checked_during_maintenance(self):
+        user = UserFactory.create(username='maintenance-user')
+        request = mock.Mock(session={'username': user.username})
+        preload_maintenance_windows()
+        with self.assertNumQueries(0):
+            self.assertFalse(MaintenanceRecord.disable_login_access(request))
+        self._record(-1)
+        self.assertTrue(MaintenanceRecord.disable_login_access(request))
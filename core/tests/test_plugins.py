@@ -0,0 +1,49 @@
+import mock
+from django.test import TestCase, override_settings
+
+from api.tests.factories import (
+    AllocationSourceFactory, UserAllocationSourceFactory, UserFactory
+)
+from core.plugins import (
+    ValidationPluginManager, load_plugin_class, plugin_registry, plugin_results
+)
+
+VALIDATION_PLUGIN = 'atmosphere.plugins.auth.validation.AlwaysAllow'
+
+
+@mock.patch.object(
+    ValidationPluginManager, 'list_of_classes', [VALIDATION_PLUGIN]
+)
+class PluginRegistryTest(TestCase):
+    def setUp(self):
+        plugin_registry.clear()
+        self.user = UserFactory.create()
+        self.validate_user = mock.patch(
+            'atmosphere.plugins.auth.validation.AlwaysAllow.validate_user',
+            return_value=True
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def tearDown(self):
+        plugin_registry.clear()
+        plugin_results.clear()
+
+    def test_plugins_are_loaded_once(self):
+        with mock.patch(
+            'core.plugins.load_plugin_class', wraps=load_plugin_class
+        ) as load_plugin:
+            self.assertTrue(ValidationPluginManager.is_valid(self.user))
+            self.assertTrue(ValidationPluginManager.is_valid(self.user))
+        self.assertEqual(load_plugin.call_count, 1)
+        self.assertEqual(self.validate_user.call_count, 2)
+
+    @override_settings(PLUGIN_RESULT_CACHE_TTL=60)
+    def test_results_are_cached_until_invalidated(self):
+        self.assertTrue(ValidationPluginManager.is_valid(self.user))
+        self.assertTrue(ValidationPluginManager.is_valid(self.user))
+        self.assertEqual(self.validate_user.call_count, 1)
+        UserAllocationSourceFactory.create(
+            user=self.user, allocation_source=AllocationSourceFactory.create()
+        )
+        self.assertTrue(ValidationPluginManager.is_valid(self.user))
+        self.assertEqual(self.validate_user.call_count, 2)
@@ -0,0 +1,128 @@
+import mock
+import redis
+from django.test import SimpleTestCase, override_settings
+
+from core import redis_pool
+from core.redis_pool import (
+    get_connection_pool, get_many, get_redis_connection, redis_health_check,
+    reset_connection_pool, set_many
+)
+
+
+class FakePipeline(object):
+    """
+    Queues commands like a redis pipeline, against a dict.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(('get', key))
+
+    def set(self, key, value, ex=None):
+        self.commands.append(('set', key, value, ex))
+
+    def execute(self):
+        results = []
+        for command in self.commands:
+            if command[0] == 'get':
+                results.append(self.values.get(command[1]))
+            else:
+                self.values[command[1]] = command[2]
+                results.append(True)
+        self.commands = []
+        return results
+
+
+class RedisPoolTest(SimpleTestCase):
+    def setUp(self):
+        reset_connection_pool()
+        self.addCleanup(reset_connection_pool)
+
+    @override_settings(
+        REDIS_URL='redis://redis.example.org:6380/2',
+        REDIS_MAX_CONNECTIONS=7,
+        REDIS_POOL_TIMEOUT=3,
+        REDIS_SOCKET_TIMEOUT=2
+    )
+    def test_pool_follows_settings(self):
+        pool = get_connection_pool()
+        self.assertIsInstance(pool, redis.BlockingConnectionPool)
+        self.assertEqual(pool.max_connections, 7)
+        self.assertEqual(pool.timeout, 3)
+        self.assertEqual(pool.connection_kwargs['host'], 'redis.example.org')
+        self.assertEqual(pool.connection_kwargs['port'], 6380)
+        self.assertEqual(pool.connection_kwargs['db'], 2)
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 2)
+        self.assertEqual(pool.connection_kwargs['socket_connect_timeout'], 2)
+
+    def test_pool_defaults(self):
+        pool = get_connection_pool()
+        self.assertEqual(
+            pool.max_connections, redis_pool.DEFAULT_MAX_CONNECTIONS
+        )
+        self.assertEqual(pool.timeout, redis_pool.DEFAULT_POOL_TIMEOUT)
+        self.assertEqual(
+            pool.connection_kwargs['socket_timeout'],
+            redis_pool.DEFAULT_SOCKET_TIMEOUT
+        )
+
+    def test_connections_share_the_pool(self):
+        self.assertIs(
+            get_redis_connection().connection_pool,
+            get_redis_connection().connection_pool
+        )
+        pool = get_connection_pool()
+        reset_connection_pool()
+        self.assertIsNot(get_connection_pool(), pool)
+
+
+class RedisCommandsTest(SimpleTestCase):
+    def setUp(self):
+        self.values = {'a': '1', 'c': '3'}
+        self.pipelines = []
+        connection = mock.Mock()
+        connection.pipeline.side_effect = self._pipeline
+        patcher = mock.patch(
+            'core.redis_pool.get_redis_connection', return_value=connection
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection = connection
+
+    def _pipeline(self, transaction=True):
+        self.assertFalse(transaction)
+        pipeline = FakePipeline(self.values)
+        self.pipelines.append(pipeline)
+        return pipeline
+
+    def test_get_many_keeps_key_order(self):
+        self.assertEqual(get_many(['c', 'b', 'a']), ['3', None, '1'])
+        self.assertEqual(len(self.pipelines), 1)
+
+    def test_set_many_sets_every_key_at_once(self):
+        set_many({'b': '2', 'd': '4'}, timeout=60)
+        self.assertEqual(len(self.pipelines), 1)
+        self.assertEqual(self.values['b'], '2')
+        self.assertEqual(self.values['d'], '4')
+
+    def test_set_many_passes_the_timeout(self):
+        pipeline = mock.Mock()
+        self.connection.pipeline.side_effect = None
+        self.connection.pipeline.return_value = pipeline
+        set_many({'b': '2'}, timeout=60)
+        pipeline.set.assert_called_once_with('b', '2', ex=60)
+        pipeline.execute.assert_called_once_with()
+
+    def test_empty_requests_skip_redis(self):
+        self.assertEqual(get_many([]), [])
+        self.assertEqual(set_many({}), [])
+        self.assertFalse(self.connection.pipeline.called)
+
+    def test_health_check_pings_redis(self):
+        self.connection.ping.return_value = True
+        self.assertTrue(redis_health_check())
+        self.connection.ping.side_effect = redis.exceptions.ConnectionError
+        self.assertFalse(redis_health_check())
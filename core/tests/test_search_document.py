@@ -0,0 +1,49 @@
+from django.test import TestCase, override_settings
+
+from api.tests.factories import ImageFactory, TagFactory, UserFactory
+from core.models import Application
+from core.models.search_document import search_applications
+
+
+class SearchApplicationsTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.ubuntu = ImageFactory.create(
+            created_by=self.user,
+            name='Ubuntu 16.04',
+            description='A plain image'
+        )
+        self.centos = ImageFactory.create(
+            created_by=self.user,
+            name='CentOS 7',
+            description='Comes with ubuntu-like tools'
+        )
+        self.tagged = ImageFactory.create(
+            created_by=self.user, name='Jupyter', description='Notebooks'
+        )
+        self.tagged.tags.add(TagFactory.create(name='genomics'))
+
+    def _search(self, *search_terms):
+        return list(
+            search_applications(Application.objects.all(), search_terms)
+        )
+
+    def test_words_match_as_ranked_prefixes(self):
+        self.assertEqual(self._search('ubu'), [self.ubuntu, self.centos])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self._search('ubu', '16'), [self.ubuntu])
+
+    def test_tags_are_searchable(self):
+        self.assertEqual(self._search('genom'), [self.tagged])
+
+    def test_document_follows_updates(self):
+        self.ubuntu.name = 'Debian 9'
+        self.ubuntu.save()
+        self.assertEqual(self._search('debian'), [self.ubuntu])
+
+    @override_settings(IMAGE_FULL_TEXT_SEARCH=False)
+    def test_fallback_matches_substrings(self):
+        self.assertEqual(
+            set(self._search('buntu')), set([self.ubuntu, self.centos])
+        )
@@ -8,8 +8,8 @@ from django.utils.timezone import datetime
 from threepio import celery_logger as logger
 
 from core.models import EventTable
-from core.models.allocation_source import AllocationSourceSnapshot, AllocationSource, UserAllocationSnapshot, \
-    total_usage
+from core.models.allocation_source import AllocationSourceSnapshot, AllocationSource, UserAllocationSource
+from service.allocation_logic import refresh_user_allocation_snapshots
 from cyverse_allocation.cyverse_rules_engine_setup import CyverseTestRenewalVariables, CyverseTestRenewalActions, \
     cyverse_rules, renewal_strategies
 
@@ -21,44 +21,52 @@ def update_snapshot_cyverse(start_date=None, end_date=None):
         microsecond=0
     ) if not end_date else end_date
 
-    for allocation_source in AllocationSource.objects.order_by('name'):
-        # calculate and save snapshots here
-        allocation_source_name = allocation_source.name
-        last_renewal_event = EventTable.objects.filter(
-            name='allocation_source_created_or_renewed',
-            payload__allocation_source_name__exact=str(allocation_source_name)
-        ).order_by('timestamp')
-
-        if not last_renewal_event:
+    allocation_sources = list(AllocationSource.objects.order_by('name'))
+    last_renewal_dates = {}
+    for payload, timestamp in EventTable.objects.filter(
+        name='allocation_source_created_or_renewed'
+    ).order_by('timestamp').values_list('payload', 'timestamp'):
+        last_renewal_dates[payload.get('allocation_source_name')
+                          ] = timestamp.replace(microsecond=0)
+
+    start_dates = {}
+    for allocation_source in allocation_sources:
+        if allocation_source.name not in last_renewal_dates:
             logger.info(
                 'Allocation Source %s Create/Renewal event missing',
-                allocation_source_name
+                allocation_source.name
             )
             continue
+        start_dates[allocation_source.name] = start_date or \
+            last_renewal_dates[allocation_source.name]
+    sources_by_id = dict(
+        (allocation_source.id, allocation_source)
+        for allocation_source in allocation_sources
+        if allocation_source.name in start_dates
+    )
+    users_by_source = dict(
+        (allocation_source, []) for allocation_source in sources_by_id.values()
+    )
+    for source_id, user_id, username in UserAllocationSource.objects.filter(
+        allocation_source__in=sources_by_id.keys()
+    ).values_list('allocation_source_id', 'user_id', 'user__username'):
+        users_by_source[sources_by_id[source_id]].append((user_id, username))
+
+    usage = refresh_user_allocation_snapshots(
+        users_by_source, start_dates, end_date
+    )
 
-        start_date = last_renewal_event.last().timestamp.replace(
-            microsecond=0
-        ) if not start_date else start_date
+    for allocation_source in allocation_sources:
+        # calculate and save snapshots here
+        allocation_source_name = allocation_source.name
+        if allocation_source_name not in start_dates:
+            continue
+        source_start_date = start_dates[allocation_source_name]
 
         total_compute_used = 0
         total_burn_rate = 0
-        for user in allocation_source.all_users:
-            compute_used, burn_rate = total_usage(
-                user.username,
-                start_date=start_date,
-                end_date=end_date,
-                allocation_source_name=allocation_source_name,
-                burn_rate=True
-            )
-
-            UserAllocationSnapshot.objects.update_or_create(
-                allocation_source=allocation_source,
-                user=user,
-                defaults={
-                    'compute_used': compute_used,
-                    'burn_rate': burn_rate
-                }
-            )
+        for _, username in users_by_source[allocation_source]:
+            compute_used, burn_rate = usage[(username, allocation_source_name)]
             total_compute_used += compute_used
             total_burn_rate += burn_rate
         AllocationSourceSnapshot.objects.update_or_create(
@@ -74,7 +82,7 @@ def update_snapshot_cyverse(start_date=None, end_date=None):
             defined_variables=CyverseTestRenewalVariables(
                 allocation_source,
                 current_time=end_date,
-                last_renewal_event_date=start_date
+                last_renewal_event_date=source_start_date
             ),
             defined_actions=CyverseTestRenewalActions(
                 allocation_source, current_time=end_date
@@ -77,7 +77,9 @@ def run_monitor_allocation_source(context):
     with mock.patch(
         'service.tasks.monitoring.allocation_source_overage_enforcement_for_user',
         autospec=True
-    ) as allocation_source_overage_enforcement_for_user:
+    ) as allocation_source_overage_enforcement_for_user, mock.patch(
+        'service.tasks.monitoring.celery_group'
+    ):
         with django.test.override_settings(
             ALLOCATION_OVERRIDES_NEVER_ENFORCE=never_enforce,
             ALLOCATION_OVERRIDES_ALWAYS_ENFORCE=always_enforce
@@ -13,7 +13,7 @@ class TASReportAdmin(admin.ModelAdmin):
     ]
     list_display = [
         "id", "username", "project_name", "compute_used", "start_date",
-        "end_date", "success"
+        "end_date", "success", "send_attempts"
     ]
     list_filter = ["success", "project_name"]
 
@@ -6,12 +6,15 @@ from dateutil.parser import parse
 
 from .exceptions import TASAPIException, NoTaccUserForXsedeException, NoAccountForUsernameException
 #FIXME: Next iteration, move this into the driver.
-from .tas_api import tacc_api_post, tacc_api_get
+from .tas_api import tacc_api_post, tacc_api_get, tas_api_map
 from core.models import EventTable
 from core.models.allocation_source import AllocationSource, UserAllocationSource
 
 from threepio import logger
 
+# Returned for a user whose TAS lookup raised an exception
+_LOOKUP_FAILED = object()
+
 
 class TASAPIDriver(object):
     tacc_api = None
@@ -104,8 +107,12 @@ class TASAPIDriver(object):
     def get_all_project_users(self):
         if not self.user_project_list:
             self.project_list = self._get_all_projects()
-            for project in sorted(self.project_list, key=lambda p: p['id']):
-                project_users = self.get_project_users(project['id'])
+            projects = sorted(self.project_list, key=lambda p: p['id'])
+            # Fetch the users of (up to) TACC_API_CONCURRENCY projects at once
+            all_project_users = tas_api_map(
+                lambda project: self.get_project_users(project['id']), projects
+            )
+            for project, project_users in zip(projects, all_project_users):
                 project['users'] = project_users
             self.user_project_list = self.project_list
         return self.user_project_list
@@ -393,30 +400,49 @@ def fill_allocation_sources():
 
 def collect_users_without_allocation(driver):
     """
-    Should be able to refactor this to make faster...
+    Return the users without a TACC username or without an allocation.
+    Users are looked up (up to TACC_API_CONCURRENCY at a time) concurrently.
     """
     from core.models import AtmosphereUser
-    missing = []
-    for user in AtmosphereUser.objects.order_by('username'):
+
+    def has_allocation(user):
         tacc_user = driver.get_tacc_username(user)
         if not tacc_user:
-            missing.append(user)
-            continue
-        user_allocations = driver.get_user_allocations(
-            tacc_user, raise_exception=False
+            return False
+        return bool(
+            driver.get_user_allocations(tacc_user, raise_exception=False)
         )
-        if not user_allocations:
-            missing.append(user)
-    return missing
+
+    users = list(AtmosphereUser.objects.order_by('username'))
+    return [
+        user for user, found in zip(users, tas_api_map(has_allocation, users))
+        if not found
+    ]
 
 
 def fill_user_allocation_sources():
     from core.models import AtmosphereUser
     driver = TASAPIDriver()
+    users = list(AtmosphereUser.objects.order_by('username'))
+
+    def find_allocations(user):
+        try:
+            return find_user_allocation_source_for(driver, user)
+        except Exception:
+            logger.exception(
+                "Error filling user allocation source for %s" % user
+            )
+            return _LOOKUP_FAILED
+
+    # Only the TAS lookups run concurrently; the DB is updated serially
+    all_allocations = tas_api_map(find_allocations, users)
     allocation_resources = {}
-    for user in AtmosphereUser.objects.order_by('username'):
+    for user, allocation_list in zip(users, all_allocations):
+        if allocation_list is _LOOKUP_FAILED:
+            allocation_resources[user.username] = []
+            continue
         try:
-            resources = fill_user_allocation_source_for(driver, user)
+            resources = save_user_allocation_sources(user, allocation_list)
         except Exception:
             logger.exception(
                 "Error filling user allocation source for %s" % user
@@ -427,9 +453,18 @@ def fill_user_allocation_sources():
 
 
 def fill_user_allocation_source_for(driver, user):
+    return save_user_allocation_sources(
+        user, find_user_allocation_source_for(driver, user)
+    )
+
+
+def save_user_allocation_sources(user, allocation_list):
+    """
+    Make `user`'s allocation sources match `allocation_list` (the API
+    allocations found by `find_user_allocation_source_for`).
+    """
     from core.models import AtmosphereUser
     assert isinstance(user, AtmosphereUser)
-    allocation_list = find_user_allocation_source_for(driver, user)
     if allocation_list is None:
         logger.info(
             "find_user_allocation_source_for %s is None, so stop and don't delete allocations"
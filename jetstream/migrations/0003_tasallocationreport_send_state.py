@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jetstream', '0002_admin-panel-dynamic-models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasallocationreport',
+            name='send_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tasallocationreport',
+            name='last_send_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
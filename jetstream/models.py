@@ -32,10 +32,40 @@ class TASAllocationReport(models.Model):
     # FIXME:  Save a response confirmation -instead of- success
     report_date = models.DateTimeField(blank=True, null=True)
     success = models.BooleanField(default=False)
+    # Retry state -- unsent reports are re-sent by every `send_reports`
+    send_attempts = models.IntegerField(default=0)
+    last_send_error = models.TextField(blank=True, default='')
 
     class Meta:
         app_label = 'jetstream'
 
+    def post(self, driver):
+        """
+        Send this report to TAS with `driver` (without saving it).
+        Returns None on success, or a description of the error.
+        """
+        try:
+            success = driver.report_project_allocation(
+                self.id, self.username, self.project_name,
+                float(self.compute_used), self.start_date, self.end_date,
+                self.queue_name, self.scheduler_id
+            )
+        except Exception as exc:
+            return "%s" % exc or exc.__class__.__name__
+        if not success:
+            return "TAS returned an empty response"
+        return None
+
+    def record_attempt(self, error=None):
+        """
+        Record the outcome of a `post` (without saving it).
+        """
+        self.send_attempts += 1
+        self.success = not error
+        self.last_send_error = error or ''
+        if self.success:
+            self.report_date = timezone.now()
+
     def send(self, use_beta=False):
         if not self.id:
             raise Exception(
@@ -53,17 +83,10 @@ class TASAllocationReport(models.Model):
                 )
             else:
                 driver = TASAPIDriver()
-            success = driver.report_project_allocation(
-                self.id, self.username, self.project_name,
-                float(self.compute_used), self.start_date, self.end_date,
-                self.queue_name, self.scheduler_id
-            )
-            self.success = True if success else False
-            if self.success:
-                self.report_date = timezone.now()
-            self.save()
         except:
             return
+        self.record_attempt(self.post(driver))
+        self.save()
 
     @property
     def cpu_count(self):
@@ -33,6 +33,26 @@ class JetstreamAllocationSourcePlugin(object):
         """
         return _get_enforcement_override(allocation_source)
 
+    def get_enforcement_overrides(self, user_allocation_sources, provider=None):
+        """Bulk version of `get_enforcement_override`, evaluated once per allocation source.
+
+        :param user_allocation_sources: The (user, allocation source) pairs to check
+        :type user_allocation_sources: list of (core.models.AtmosphereUser, core.models.AllocationSource)
+        :param provider: The provider (not used by this plugin)
+        :type provider: core.models.Provider
+        :return: The enforcement override behaviour, keyed by (user.id, allocation_source.id)
+        :rtype: dict
+        """
+        by_source = {}
+        overrides = {}
+        for user, allocation_source in user_allocation_sources:
+            if allocation_source.id not in by_source:
+                by_source[allocation_source.id
+                         ] = _get_enforcement_override(allocation_source)
+            overrides[(user.id,
+                       allocation_source.id)] = by_source[allocation_source.id]
+        return overrides
+
 
 def _get_enforcement_override(allocation_source):
     """Returns whether (and how) to override the enforcement for an allocation source.
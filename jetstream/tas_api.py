@@ -1,13 +1,119 @@
+"""
+HTTP access to the TAS (TACC Accounting System) API.
+
+Every request goes through one pooled `requests.Session` per process, so
+connections to TAS are kept alive and re-used. Connection failures and
+(for GETs) read timeouts are retried with an exponential backoff.
+`tas_api_map` fans lookups out over a bounded number of threads.
+"""
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
 import requests
-from requests.exceptions import ReadTimeout
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from requests.packages.urllib3.util.retry import Retry
 
 from django.conf import settings
+from django.db import connection
 from memoize import memoize
 
 from .exceptions import TASAPIException
 
 from threepio import logger
 
+# Simultaneous requests made to TAS by `tas_api_map`
+DEFAULT_TAS_API_CONCURRENCY = 8
+DEFAULT_TAS_API_RETRIES = 3
+# Seconds -- retries sleep backoff * (2 ** (retry - 1))
+DEFAULT_TAS_API_BACKOFF = 0.5
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def tas_api_concurrency():
+    return max(
+        1,
+        getattr(settings, 'TACC_API_CONCURRENCY', DEFAULT_TAS_API_CONCURRENCY)
+        or 1
+    )
+
+
+def _build_session():
+    retry = Retry(
+        total=getattr(settings, 'TACC_API_RETRIES', DEFAULT_TAS_API_RETRIES),
+        backoff_factor=getattr(
+            settings, 'TACC_API_BACKOFF', DEFAULT_TAS_API_BACKOFF
+        ),
+    # Never re-send a POST (a report) that TAS may have received
+        method_whitelist=frozenset(['GET'])
+    )
+    # One connection per concurrent lookup
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=tas_api_concurrency(),
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the pooled session of this process (a forked worker
+    never re-uses the connections of its parent).
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _build_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+def reset_session():
+    """
+    Close every pooled connection (the next request opens a new session).
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def tas_api_map(func, items, concurrency=None):
+    """
+    Return `[func(item) for item in items]`, calling `func` from at most
+    `concurrency` threads at a time. `func` should only talk to TAS --
+    the threads do not share the caller's database transaction.
+    """
+    items = list(items)
+    if concurrency is None:
+        concurrency = tas_api_concurrency()
+    concurrency = min(concurrency, len(items))
+    if concurrency <= 1:
+        return [func(item) for item in items]
+
+    def call(item):
+        try:
+            return func(item)
+        finally:
+            # Connections are per-thread; don't leave one open.
+            connection.close()
+
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+
 
 def tacc_api_post(url, post_data, username=None, password=None):
     if not username:
@@ -16,7 +122,7 @@ def tacc_api_post(url, post_data, username=None, password=None):
         password = settings.TACC_API_PASS
     logger.debug('url: %s', url)
     # logger.debug("REQ BODY: %s" % post_data)
-    resp = requests.post(url, post_data, auth=(username, password))
+    resp = get_session().post(url, post_data, auth=(username, password))
     logger.debug('resp.status_code: %s', resp.status_code)
     # logger.debug('resp.__dict__: %s', resp.__dict__)
     return resp
@@ -30,16 +136,21 @@ def tacc_api_get(url, username=None, password=None):
         password = settings.TACC_API_PASS
     logger.debug('url: %s', url)
     try:
-        resp = requests.get(
+        resp = get_session().get(
             url,
             auth=(username, password),
             timeout=settings.TACC_READ_API_TIMEOUT
         )
-    except ReadTimeout:
+    except Timeout:
         raise TASAPIException(
             "TAS API is taking too long to respond, we're timing out ({})".
             format(url)
         )
+    except ConnectionError as exc:
+        # Includes read timeouts that were still failing after the retries
+        raise TASAPIException(
+            "TAS API could not be reached ({}): {}".format(url, exc)
+        )
     logger.debug('resp.status_code: %s', resp.status_code)
     # logger.debug('resp.__dict__: %s', resp.__dict__)
     if resp.status_code != 200:
@@ -1,19 +1,21 @@
 from celery.decorators import task
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q, Max
+from django.db.models import F, Q, Max
 
 from core.models import EventTable, AtmosphereUser
 from core.models.allocation_source import (
-    UserAllocationSource, AllocationSourceSnapshot, AllocationSource,
-    UserAllocationSnapshot
+    UserAllocationSource, AllocationSourceSnapshot, AllocationSource
 )
-from core.models.allocation_source import total_usage
+from service.allocation_logic import (
+    NO_USAGE, calculate_usage, refresh_user_allocation_snapshots
+)
+from service.run_stats import RunStats
 from .allocation import (
     TASAPIDriver, fill_user_allocation_sources, select_valid_allocation
 )
-from .exceptions import TASPluginException
 from .models import TASAllocationReport
+from .tas_api import tas_api_map
 
 from threepio import logger
 
@@ -33,119 +35,179 @@ def create_reports():
     GO through the list of all users or all providers
     For each username, get an XSede API map to the 'TACC username'
     if 'TACC username' includes a jetstream resource, create a report
+
+    One TASAPIDriver (and its caches) is shared by every report, usage is
+    calculated in bulk for every report ending at the same time, and the
+    reports are saved with a single bulk_create.
     """
     logger.debug('create_reports - START')
-    user_allocation_list = UserAllocationSource.objects.all()
-    all_reports = []
-    end_date = timezone.now()
-    logger.debug('create_reports - end_date: %s', end_date)
-    max_report_end_date = TASAllocationReport.objects.all().aggregate(
-        Max('end_date')
-    )
+    stats = RunStats("create_reports")
+    with stats:
+        end_date = timezone.now()
+        logger.debug('create_reports - end_date: %s', end_date)
+        with stats.phase('load'):
+            report_requests = _report_requests(end_date)
+        stats.incr('report_requests', len(report_requests))
+        driver = TASAPIDriver()
+        with stats.phase('lookup_tas'):
+            tacc_usernames, project_names = _lookup_tas_names(
+                driver, report_requests
+            )
+        with stats.phase('plan'):
+            all_reports = _plan_reports(
+                report_requests, tacc_usernames, project_names
+            )
+        with stats.phase('usage'):
+            _fill_compute_used(all_reports)
+        with stats.phase('save'):
+            all_reports = TASAllocationReport.objects.bulk_create(all_reports)
+        for new_report in all_reports:
+            logger.info("Created New Report:%s" % new_report)
+        stats.incr('reports_created', len(all_reports))
+    stats.log(logger)
+    return all_reports
 
-    if not max_report_end_date:
-        last_report_date = end_date
-    else:
-        last_report_date = max_report_end_date['end_date__max']
-    logger.info('create_reports - last_report_date: %s', last_report_date)
 
-    for item in user_allocation_list:
-        allocation_name = item.allocation_source.name
-        logger.debug('create_reports - allocation_name: %s', allocation_name)
-        logger.debug('create_reports - item.user: %s', item.user)
-        project_report = _create_reports_for(
-            item.user, allocation_name, end_date
-        )
-        if project_report:
-            all_reports.append(project_report)
+def _report_requests(end_date):
+    """
+    Return a list of (user, allocation_name, end_date) to report: one for
+    every UserAllocationSource and one for every user removed from an
+    allocation source since the last report.
+    """
+    report_requests = [
+        (item.user, item.allocation_source.name, end_date)
+        for item in UserAllocationSource.objects.
+        select_related('user', 'allocation_source').order_by('id')
+    ]
+    last_report_date = TASAllocationReport.objects.all().aggregate(
+        Max('end_date')
+    )['end_date__max'] or end_date
+    logger.info('create_reports - last_report_date: %s', last_report_date)
 
     # Take care of Deleted Users
 
     # filter user_allocation_source_removed events which are created after the last report date
+    events = list(
+        EventTable.objects.filter(
+            name="user_allocation_source_deleted",
+            timestamp__gte=last_report_date
+        ).order_by('timestamp')
+    )
+    users = dict(
+        (user.username, user) for user in AtmosphereUser.objects.
+        filter(username__in=set(event.entity_id for event in events))
+    )
+    for event in events:
+        user = users.get(event.entity_id)
+        if not user:
+            logger.error(
+                "User %s of event %s does not exist" %
+                (event.entity_id, event.uuid)
+            )
+            continue
+        report_requests.append(
+            (user, event.payload['allocation_source_name'], event.timestamp)
+        )
+    return report_requests
 
-    for event in EventTable.objects.filter(
-        name="user_allocation_source_deleted", timestamp__gte=last_report_date
-    ).order_by('timestamp'):
 
-        user = AtmosphereUser.objects.get(username=event.entity_id)
-        allocation_name = event.payload['allocation_source_name']
-        end_date = event.timestamp
-        project_report = _create_reports_for(user, allocation_name, end_date)
-        if project_report:
-            all_reports.append(project_report)
-    return all_reports
+def _lookup_tas_names(driver, report_requests):
+    """
+    Return the TACC username of every user (looked up concurrently) and
+    the TACC project name of every allocation in `report_requests`.
+    """
+    users = dict((user.username, user)
+                 for user, _, _ in report_requests).values()
+    tacc_usernames = dict(
+        zip(
+            [user.username for user in users],
+            tas_api_map(driver.get_tacc_username, users)
+        )
+    )
+    project_names = dict(
+        (allocation_name, driver.get_allocation_project_name(allocation_name))
+        for allocation_name in set(name for _, name, _ in report_requests)
+    )
+    return tacc_usernames, project_names
 
 
-def _create_reports_for(user, allocation_name, end_date):
-    logger.debug(
-        '_create_reports_for - user: %s, allocation_name: %s, end_date: %s',
-        user, allocation_name, end_date
+def _plan_reports(report_requests, tacc_usernames, project_names):
+    """
+    Return the (unsaved) reports of `report_requests`, without their
+    compute_used. Each report starts where the last report of its user
+    and project ended (or when the user joined).
+    """
+    last_end_dates = dict(
+        ((project_name, user_id), last_end_date)
+        for project_name, user_id, last_end_date in TASAllocationReport.objects.
+        filter(project_name__in=set(project_names.values())).
+        values_list('project_name', 'user_id').annotate(Max('end_date'))
     )
-    driver = TASAPIDriver()
-    tacc_username = driver.get_tacc_username(user)
-    if not tacc_username:
-        logger.error(
-            "No TACC username for user: '{}' which came from allocation id: {}".
-            format(user, allocation_name)
-        )
-        return
-    project_name = driver.get_allocation_project_name(allocation_name)
-    try:
-        project_report = _create_tas_report_for(
-            user, tacc_username, project_name, end_date
-        )
-        return project_report
-    except TASPluginException:
-        logger.exception(
-            "Could not create the report because of the error below"
+    reports = []
+    for user, allocation_name, end_date in report_requests:
+        tacc_username = tacc_usernames.get(user.username)
+        if not tacc_username:
+            logger.error(
+                "No TACC username for user: '{}' which came from allocation id: {}"
+                .format(user, allocation_name)
+            )
+            continue
+        project_name = project_names.get(allocation_name)
+        if not project_name:
+            logger.error(
+                "Could not create the report for user %s: "
+                "OpenStack/TACC Project missing for allocation %s" %
+                (user, allocation_name)
+            )
+            continue
+        key = (project_name, user.id)
+        last_end_date = last_end_dates.get(key)
+        reports.append(
+            TASAllocationReport(
+                user=user,
+                username=tacc_username,
+                project_name=project_name,
+                start_date=last_end_date or user.date_joined,
+                end_date=end_date,
+                tacc_api=settings.TACC_API_URL
+            )
         )
-        return
+        last_end_dates[key] = max(last_end_date, end_date) \
+            if last_end_date else end_date
+    return reports
 
 
-def _create_tas_report_for(user, tacc_username, tacc_project_name, end_date):
+def _fill_compute_used(reports):
     """
-    Create a new report
+    Set the compute_used of every report, with one usage calculation for
+    all the reports that end at the same time.
     """
-    if not end_date:
-        raise TASPluginException("Explicit end date required")
-    if not user:
-        raise TASPluginException("User missing")
-    if not tacc_username:
-        raise TASPluginException("TACC Username missing")
-    if not tacc_project_name:
-        raise TASPluginException("OpenStack/TACC Project missing")
-
-    last_report = TASAllocationReport.objects.filter(
-        project_name=tacc_project_name, user=user
-    ).order_by('end_date').last()
-    if not last_report:
-        start_date = user.date_joined
-    else:
-        start_date = last_report.end_date
-
-    compute_used = total_usage(
-        user.username,
-        start_date,
-        allocation_source_name=tacc_project_name,
-        end_date=end_date
-    )
-
-    if compute_used < 0:
-        raise TASPluginException(
-            "Compute usage was not accurately calculated for user:%s" % user
+    batches = []
+    for report in reports:
+        key = (report.user.username, report.project_name)
+        # A user's reports of one project can't share a calculation
+        batch = next(
+            (
+                batch for batch in batches
+                if batch[0] == report.end_date and key not in batch[1]
+            ), None
         )
-
-    new_report = TASAllocationReport.objects.create(
-        user=user,
-        username=tacc_username,
-        project_name=tacc_project_name,
-        compute_used=compute_used,
-        start_date=start_date,
-        end_date=end_date,
-        tacc_api=settings.TACC_API_URL
-    )
-    logger.info("Created New Report:%s" % new_report)
-    return new_report
+        if not batch:
+            batch = (report.end_date, {})
+            batches.append(batch)
+        batch[1][key] = report
+    for end_date, reports_by_key in batches:
+        start_dates = dict(
+            (key, report.start_date) for key, report in reports_by_key.items()
+        )
+        usage = calculate_usage(
+            min(start_dates.values()),
+            end_date,
+            usernames=set(username for username, _ in reports_by_key),
+            start_dates=start_dates
+        )
+        for key, report in reports_by_key.items():
+            report.compute_used = usage.get(key, NO_USAGE).compute_used
 
 
 @task(name="report_allocations_to_tas")
@@ -158,24 +220,52 @@ def report_allocations_to_tas():
 
 
 def send_reports():
-    failed_reports = 0
-    reports_to_send = TASAllocationReport.objects.filter(
-        Q(compute_used__gt=0, success=False)
-    ).order_by('user__username', 'start_date')
-    count = reports_to_send.count()
-    logger.info('send_reports - count: %d', count)
-    for current_report_index, tas_report in enumerate(reports_to_send):
-        logger.debug(
-            'send_reports - current_report_index: %d', current_report_index
-        )
-        try:
-            tas_report.send()
-        except TASPluginException:
-            logger.exception(
-                "Could not send the report because of the error below"
+    """
+    Send every unsent report to TAS, (up to) TACC_API_CONCURRENCY at a time,
+    with one shared TASAPIDriver. Failed reports keep their retry state
+    (send_attempts, last_send_error) and are re-sent by the next run.
+    """
+    stats = RunStats("send_reports")
+    with stats:
+        with stats.phase('load'):
+            reports_to_send = list(
+                TASAllocationReport.objects.filter(
+                    Q(compute_used__gt=0, success=False)
+                ).order_by('user__username', 'start_date')
             )
-            failed_reports += 1
-            continue
+        count = len(reports_to_send)
+        logger.info('send_reports - count: %d', count)
+        driver = TASAPIDriver()
+        with stats.phase('send'):
+            errors = tas_api_map(
+                lambda tas_report: tas_report.post(driver), reports_to_send
+            )
+        with stats.phase('save'):
+            sent_ids = [
+                tas_report.id
+                for tas_report, error in zip(reports_to_send, errors)
+                if not error
+            ]
+            TASAllocationReport.objects.filter(id__in=sent_ids).update(
+                success=True,
+                report_date=timezone.now(),
+                send_attempts=F('send_attempts') + 1,
+                last_send_error=''
+            )
+            for tas_report, error in zip(reports_to_send, errors):
+                if not error:
+                    continue
+                logger.error(
+                    "Could not send the report %s: %s" % (tas_report.id, error)
+                )
+                tas_report.record_attempt(error)
+                tas_report.save(
+                    update_fields=['send_attempts', 'last_send_error']
+                )
+        failed_reports = count - len(sent_ids)
+        stats.incr('reports_sent', len(sent_ids))
+        stats.incr('reports_failed', failed_reports)
+    stats.log(logger)
     if failed_reports != 0:
         raise Exception(
             "%s/%s reports failed to send to TAS" % (failed_reports, count)
@@ -191,47 +281,56 @@ def update_snapshot(start_date=None, end_date=None):
     tas_api_obj = TASAPIDriver()
     allocation_source_usage_from_tas = tas_api_obj.get_all_projects()
 
-    for project in allocation_source_usage_from_tas:
-        total_burn_rate = 0
-        allocation_source_name = project['chargeCode']
-        try:
-            allocation_source = AllocationSource.objects.filter(
-                name=allocation_source_name
-            ).order_by('id').last()
-
-            if not allocation_source:
-                continue
-
-            created_or_updated_event = EventTable.objects.filter(
-                name='allocation_source_created_or_renewed',
-                payload__allocation_source_name=allocation_source.name
-            ).order_by('timestamp').last()
-
-            if created_or_updated_event:
-                # if renewed, change ignore old allocation usage
-                start_date = created_or_updated_event.payload['start_date']
-
-            for user in allocation_source.all_users:
-                compute_used, burn_rate = total_usage(
-                    user.username,
-                    start_date,
-                    allocation_source_name=allocation_source.name,
-                    end_date=end_date,
-                    burn_rate=True
-                )
-                total_burn_rate += burn_rate
-                UserAllocationSnapshot.objects.update_or_create(
-                    allocation_source_id=allocation_source.id,
-                    user_id=user.id,
-                    defaults={
-                        'compute_used': compute_used,
-                        'burn_rate': burn_rate
-                    }
-                )
+    allocation_sources = {}
+    for allocation_source in AllocationSource.objects.filter(
+        name__in=[
+            project.get('chargeCode')
+            for project in allocation_source_usage_from_tas
+        ]
+    ).order_by('id'):
+        allocation_sources[allocation_source.name] = allocation_source
+
+    # if renewed, ignore old allocation usage
+    start_dates = {}
+    for payload in EventTable.objects.filter(
+        name='allocation_source_created_or_renewed',
+        payload__allocation_source_name__in=allocation_sources.keys()
+    ).order_by('timestamp').values_list(
+        'payload', flat=True
+    ):
+        if payload.get('start_date'):
+            start_dates[payload['allocation_source_name']
+                       ] = payload['start_date']
+
+    users_by_source = dict(
+        (allocation_source, [])
+        for allocation_source in allocation_sources.values()
+    )
+    sources_by_id = dict(
+        (allocation_source.id, allocation_source)
+        for allocation_source in allocation_sources.values()
+    )
+    for source_id, user_id, username in UserAllocationSource.objects.filter(
+        allocation_source__in=allocation_sources.values()
+    ).values_list('allocation_source_id', 'user_id', 'user__username'):
+        users_by_source[sources_by_id[source_id]].append((user_id, username))
+
+    usage = refresh_user_allocation_snapshots(
+        users_by_source,
+        dict(
+            (name, start_dates.get(name, start_date))
+            for name in allocation_sources
+        ), end_date
+    )
 
-        except KeyError:
-            # This allocation source does not exist in our database yet. Create it? Skip for now.
+    for project in allocation_source_usage_from_tas:
+        allocation_source = allocation_sources.get(project.get('chargeCode'))
+        if not allocation_source:
             continue
+        total_burn_rate = sum(
+            usage[(username, allocation_source.name)].burn_rate
+            for _, username in users_by_source[allocation_source]
+        )
         valid_allocation = select_valid_allocation(project['allocations'])
         compute_used = valid_allocation['computeUsed'] if valid_allocation else 0
         AllocationSourceSnapshot.objects.update_or_create(
@@ -0,0 +1,205 @@
+"""
+A local TAS API stub, served over HTTP from a background thread.
+
+Unlike the `tacc_api_get` mocks in tas_api_mock_utils, requests go through
+the real (pooled) HTTP client, so tests can measure connection re-use,
+concurrency and retries. `latency` delays every response, like a remote
+TAS would. `hold_until_active` makes requests wait for each other, so
+concurrency can be checked without relying on timing.
+
+    with TASStubServer(latency=0.05) as server:
+        server.add_user('xsede-user', 'tacc-user', projects=['TG-1'])
+        with override_settings(TACC_API_URL=server.url):
+            ...
+"""
+import json
+import threading
+import time
+from datetime import timedelta
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from django.utils import timezone
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # e.g. a client that timed out on a stalled response hung up
+        pass
+
+
+class _TASRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive -- every response sets a Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.stub.handle_request(self, 'GET')
+
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        self.rfile.read(length)
+        self.server.stub.handle_request(self, 'POST')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TASStubServer(object):
+    def __init__(self, latency=0, resource_name='Jetstream'):
+        self.latency = latency
+        self.resource_name = resource_name
+        self.projects = []
+        self.xsede_to_tacc_username = {}
+        self.project_users = {}
+        # The number of times to stall (past the client timeout) by path
+        self.stalls = {}
+        self.stall_time = 0
+        self.requests = []
+        self.connections = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._active_changed = threading.Condition(self._lock)
+        self._hold_until = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self._server.server_address[1]
+
+    def __enter__(self):
+        self._server = _ThreadingHTTPServer(
+            ('127.0.0.1', 0), _TASRequestHandler
+        )
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        return False
+
+    def add_project(self, charge_code, status='Active'):
+        project_id = len(self.projects) + 1
+        now = timezone.now()
+        allocation = {
+            'id': project_id,
+            'project': charge_code,
+            'projectId': project_id,
+            'resource': self.resource_name,
+            'status': status,
+            'computeAllocated': 1000,
+            'start': (now - timedelta(days=30)).isoformat(),
+            'end': (now + timedelta(days=30)).isoformat(),
+        }
+        project = {
+            'id': project_id,
+            'chargeCode': charge_code,
+            'allocations': [allocation],
+        }
+        self.projects.append(project)
+        self.project_users[project_id] = []
+        return project
+
+    def add_user(self, xsede_username, tacc_username, projects=()):
+        self.xsede_to_tacc_username[xsede_username] = tacc_username
+        for project in self.projects:
+            if project['chargeCode'] in projects:
+                self.project_users[project['id']].append(tacc_username)
+
+    def hold_until_active(self, count, timeout=5):
+        """
+        Hold every request until `count` requests are in flight at once
+        (or `timeout` seconds have passed), then stop holding.
+        """
+        self._hold_until = count
+        self._hold_timeout = timeout
+
+    def _hold(self):
+        deadline = time.time() + self._hold_timeout
+        while self._hold_until and self.active < self._hold_until:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            self._active_changed.wait(remaining)
+        self._hold_until = 0
+        self._active_changed.notify_all()
+
+    def request_count(self, prefix=''):
+        return len(
+            [path for _, path in self.requests if path.startswith(prefix)]
+        )
+
+    def handle_request(self, handler, method):
+        with self._lock:
+            self.requests.append((method, handler.path))
+            self.connections.add(handler.client_address)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            stall = self.stalls.get(handler.path, 0) > 0
+            if stall:
+                self.stalls[handler.path] -= 1
+            if self._hold_until:
+                self._hold()
+        try:
+            time.sleep(self.stall_time if stall else self.latency)
+            if method == 'POST':
+                data = self._success(None)
+            else:
+                data = self._route(handler.path)
+            body = json.dumps(data)
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _success(self, result):
+        return {'status': 'success', 'message': None, 'result': result}
+
+    def _route(self, path):
+        parts = path.strip('/').split('/')[1:]
+        if parts[:2] == ['projects', 'resource']:
+            return self._success(self.projects)
+        if parts[:2] == ['allocations', 'resource']:
+            return self._success(
+                [project['allocations'][0] for project in self.projects]
+            )
+        if parts[:2] == ['users', 'xsede']:
+            tacc_username = self.xsede_to_tacc_username.get(parts[2])
+            if not tacc_username:
+                return {
+                    'status':
+                        'error',
+                    'message':
+                        'No user found for XSEDE username %s' % parts[2],
+                    'result':
+                        None
+                }
+            return self._success(tacc_username)
+        if parts[:2] == ['projects', 'username']:
+            return self._success(
+                [
+                    project for project in self.projects
+                    if parts[2] in self.project_users[project['id']]
+                ]
+            )
+        if parts[0] == 'projects' and parts[2:] == ['users']:
+            return self._success(
+                [
+                    {
+                        'username': username
+                    } for username in self.project_users[int(parts[1])]
+                ]
+            )
+        return {'status': 'error', 'message': 'Unknown path', 'result': None}
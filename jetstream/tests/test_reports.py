@@ -0,0 +1,81 @@
+import datetime
+
+import mock
+from django.test import TestCase, modify_settings
+from django.utils import timezone
+
+from api.tests.factories import (
+    AllocationSourceFactory, UserAllocationSourceFactory, UserFactory
+)
+from jetstream.models import TASAllocationReport
+from jetstream.tasks import create_reports, send_reports
+from service.allocation_logic import AllocationUsage
+
+
+@modify_settings(INSTALLED_APPS={
+    'append': 'jetstream',
+})
+class TASReportsTest(TestCase):
+    def setUp(self):
+        self.allocation_source = AllocationSourceFactory.create(name='TG-1')
+        self.user = UserFactory.create(username='reported-user')
+        self.unknown_user = UserFactory.create(username='unknown-user')
+        for user in (self.user, self.unknown_user):
+            UserAllocationSourceFactory.create(
+                user=user, allocation_source=self.allocation_source
+            )
+        patcher = mock.patch('jetstream.tasks.TASAPIDriver')
+        self.driver = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.driver.get_tacc_username.side_effect = lambda user: {
+            'reported-user': 'tacc-user'
+        }.get(user.username)
+        self.driver.get_allocation_project_name.side_effect = lambda name: name
+
+    def _report(self, **kwargs):
+        end_date = timezone.now() - datetime.timedelta(days=1)
+        defaults = dict(
+            user=self.user,
+            username='tacc-user',
+            project_name='TG-1',
+            compute_used=1,
+            start_date=end_date - datetime.timedelta(days=1),
+            end_date=end_date
+        )
+        defaults.update(kwargs)
+        return TASAllocationReport.objects.create(**defaults)
+
+    def test_reports_share_one_usage_calculation(self):
+        last_report = self._report(success=True)
+        with mock.patch('jetstream.tasks.calculate_usage') as calculate_usage:
+            calculate_usage.return_value = {
+                ('reported-user', 'TG-1'): AllocationUsage(5.0, 1)
+            }
+            reports = create_reports()
+        self.assertEqual(calculate_usage.call_count, 1)
+        self.assertEqual(len(reports), 1)
+        report = TASAllocationReport.objects.get(id=reports[0].id)
+        self.assertEqual(report.compute_used, 5)
+        self.assertEqual(report.start_date, last_report.end_date)
+        self.assertEqual(self.driver.get_tacc_username.call_count, 2)
+
+    def test_failed_reports_keep_their_retry_state(self):
+        sent = self._report()
+        failed = self._report(project_name='TG-2')
+
+        def report_project_allocation(report_id, *args):
+            if report_id == failed.id:
+                raise Exception("TAS is down")
+            return {'status': 'success'}
+
+        self.driver.report_project_allocation.side_effect = \
+            report_project_allocation
+        with self.assertRaises(Exception):
+            send_reports()
+        sent.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertTrue(sent.success)
+        self.assertEqual(sent.send_attempts, 1)
+        self.assertFalse(failed.success)
+        self.assertEqual(failed.send_attempts, 1)
+        self.assertEqual(failed.last_send_error, 'TAS is down')
@@ -0,0 +1,94 @@
+import memoize
+from django.test import TestCase, modify_settings, override_settings
+
+from api.tests.factories import UserFactory
+from jetstream.allocation import (
+    TASAPIDriver, collect_users_without_allocation
+)
+from jetstream.tas_api import reset_session, tacc_api_get
+from jetstream.tests.tas_api_stub_server import TASStubServer
+
+
+@modify_settings(INSTALLED_APPS={
+    'append': 'jetstream',
+})
+class TASAPIClientTest(TestCase):
+    """
+    Drive the TAS client against a local stub server (no mocks), see
+    jetstream/tests/tas_api_stub_server.py.
+    """
+
+    def setUp(self):
+        memoize.delete_memoized(tacc_api_get)
+        reset_session()
+
+    def tearDown(self):
+        memoize.delete_memoized(tacc_api_get)
+        reset_session()
+
+    def _driver(self):
+        driver = TASAPIDriver()
+        driver.clear_cache()
+        return driver
+
+    def _settings(self, server, concurrency=4, timeout=5):
+        return override_settings(
+            TACC_API_URL=server.url + '/api-test',
+            TACC_API_USER='tas-username',
+            TACC_API_PASS='tas-password',
+            TACC_READ_API_TIMEOUT=timeout,
+            TACC_API_CONCURRENCY=concurrency,
+            TACC_API_BACKOFF=0
+        )
+
+    def test_project_users_are_fetched_concurrently(self):
+        with TASStubServer(latency=0.05) as server:
+            for index in range(12):
+                server.add_project('TG-%s' % index)
+            server.add_user('xsede-user', 'tacc-user', projects=['TG-3'])
+            with self._settings(server, concurrency=4):
+                projects = self._driver().get_all_project_users()
+        self.assertEqual(
+            [project['chargeCode'] for project in projects if project['users']],
+            ['TG-3']
+        )
+        self.assertEqual(server.request_count('/api-test/v1/projects/'), 13)
+        self.assertGreater(server.max_active, 1)
+        self.assertLessEqual(server.max_active, 4)
+        # Keep-alive: (at most) one connection per concurrent request
+        self.assertLessEqual(len(server.connections), 4)
+
+    def test_read_timeouts_are_retried(self):
+        with TASStubServer() as server:
+            server.add_project('TG-1')
+            server.stall_time = 1
+            server.stalls['/api-test/v1/projects/resource/Jetstream'] = 1
+            with self._settings(server, timeout=0.2):
+                projects = self._driver().get_all_projects()
+        self.assertEqual(len(projects), 1)
+        self.assertEqual(server.request_count(), 2)
+
+    def test_user_sync_runs_concurrently(self):
+        users = [
+            UserFactory.create(username='xsede-user-%s' % index)
+            for index in range(16)
+        ]
+        for concurrency in (1, 8):
+            memoize.delete_memoized(tacc_api_get)
+            reset_session()
+            with TASStubServer() as server:
+                server.add_project('TG-1')
+                for user in users[::2]:
+                    server.add_user(
+                        user.username,
+                        user.username.replace('xsede', 'tacc'),
+                        projects=['TG-1']
+                    )
+                if concurrency > 1:
+                    server.hold_until_active(concurrency)
+                with self._settings(server, concurrency=concurrency):
+                    missing = collect_users_without_allocation(self._driver())
+            self.assertEqual(
+                [user for user in missing if user in users], users[1::2]
+            )
+            self.assertEqual(server.max_active, concurrency)
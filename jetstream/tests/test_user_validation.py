@@ -26,7 +26,9 @@ class TestOfflineUserValidation(TestCase):
         UserAllocationSourceFactory.create(user=self.user)
 
         # Simulate offline TAS api by throwing requests.exceptions.ReadTimeout
-        with mock.patch('jetstream.tas_api.requests.get') as mock_requests_get:
+        with mock.patch(
+            'jetstream.tas_api.requests.Session.get'
+        ) as mock_requests_get:
             mock_requests_get.side_effect = ReadTimeout(
                 "Unknown network failure"
             )
@@ -40,7 +42,9 @@ class TestOfflineUserValidation(TestCase):
         plugin = XsedeProjectRequired()
 
         # Simulate offline TAS api by throwing requests.exceptions.ReadTimeout
-        with mock.patch('jetstream.tas_api.requests.get') as mock_requests_get:
+        with mock.patch(
+            'jetstream.tas_api.requests.Session.get'
+        ) as mock_requests_get:
             mock_requests_get.side_effect = ReadTimeout(
                 "Unknown network failure"
             )
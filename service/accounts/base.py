@@ -2,10 +2,8 @@
 Methods to cache data.
 """
 import cPickle as pickle
-import redis
-# TODO: Make this look like a global (ALL_CAPS?)
-# NOTE: This variable represents the globally-shared connection
-redis_connection = None
+
+from core.redis_pool import get_redis_connection
 
 
 class BaseAccountDriver(object):
@@ -86,9 +84,8 @@ class CacheDriver():
         self.build_redis_connection()
 
     def build_redis_connection(self):
-        global redis_connection
-        if not redis_connection:
-            redis_connection = redis.StrictRedis()
+        # NOTE: Connections are shared through core.redis_pool
+        self.redis_connection = get_redis_connection()
 
     def cache_resource(
         self,
@@ -143,7 +140,7 @@ class CacheDriver():
         return resources
 
     def _get(self, name):
-        return redis_connection.get(name)
+        return self.redis_connection.get(name)
 
     def get_object(self, name):
         value = self._get(name)
@@ -152,7 +149,7 @@ class CacheDriver():
     def _set(self, name, value, timeout=None):
         if not timeout:
             timeout = self.timeout_sec
-        redis_connection.set(name, value, ex=timeout)
+        self.redis_connection.set(name, value, ex=timeout)
 
     def set_object(self, name, value, timeout=None):
         if not timeout:
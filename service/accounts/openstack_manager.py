@@ -2,8 +2,10 @@
 UserManager:
   Remote Openstack Admin controls..
 """
+import threading
 import time
 import string
+from collections import namedtuple
 from urlparse import urlparse
 import glanceclient
 from django.db.models import ObjectDoesNotExist
@@ -46,6 +48,14 @@ from service.exceptions import TimeoutError
 
 from atmosphere.settings import DEFAULT_PASSWORD_UPDATE, DEFAULT_RULES
 
+# Seconds a (pooled) account driver re-uses its project list
+DEFAULT_PROJECT_LIST_TTL = 5 * 60
+
+# A nova flavor, with the attributes of an rtwo size
+CloudSize = namedtuple(
+    'CloudSize', ['id', 'name', 'cpu', 'ram', 'disk', 'ephemeral']
+)
+
 
 def timeout_after(seconds):
     def real_timeout(func):
@@ -73,11 +83,11 @@ def timeout_after(seconds):
 
 
 class AccountDriver(BaseAccountDriver):
-    user_manager = None
-    image_manager = None
-    network_manager = None
     core_provider = None
     cloud_config = {}
+    project_list = []
+    project_index = {}
+    project_list_expires = 0
 
     @classmethod
     def generate_openrc(cls, identity, filename=None):
@@ -132,18 +142,19 @@ class AccountDriver(BaseAccountDriver):
         return export_data
 
     def add_owner_to_machine(self, cloud_machines, cloud_machines_dict):
+        glance_img_index = {
+            glance_img['id']: glance_img
+            for glance_img in cloud_machines_dict
+        }
         for warlock_image in cloud_machines:
-            glance_img_match = [
-                glance_img for glance_img in cloud_machines_dict
-                if glance_img['id'] == warlock_image.id
-            ]
-            if not glance_img_match:
+            glance_img = glance_img_index.get(warlock_image.id)
+            if glance_img is None:
                 logger.warn(
                     "Image list mismatch: %s exists in glance-v2 "
                     "and not in glance-v1.." % warlock_image.id
                 )
                 continue
-            warlock_image.owner = glance_img_match[0].get('owner', '')
+            warlock_image.owner = glance_img.get('owner', '')
 
     def clear_cache(self):
         self.admin_driver.provider.machineCls.invalidate_provider_cache(
@@ -204,19 +215,53 @@ class AccountDriver(BaseAccountDriver):
                 "Could not determine identity_version of %s" % ex_auth_version
             )
 
-        user_creds = self._build_user_creds(all_creds)
-        image_creds = self._build_image_creds(all_creds)
-        net_creds = self._build_network_creds(all_creds)
-        sdk_creds = self._build_sdk_creds(all_creds)
-
         # Initialize logging
         self._initialize_loggers()
-        # Initialize managers with respective credentials
-        self.user_manager = UserManager(**user_creds)
-        self.user_manager.keystone.username = user_creds.get('username')
-        self.image_manager = ImageManager(**image_creds)
-        self.network_manager = NetworkManager(**net_creds)
-        self.openstack_sdk = _connect_to_openstack_sdk(**sdk_creds)
+        # Managers are built (and authenticated) on first use
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def _get_client(self, name, build):
+        client = self._clients.get(name)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = build()
+        return client
+
+    def _new_user_manager(self):
+        user_creds = self._build_user_creds(self.credentials)
+        user_manager = UserManager(**user_creds)
+        user_manager.keystone.username = user_creds.get('username')
+        return user_manager
+
+    @property
+    def user_manager(self):
+        return self._get_client('user_manager', self._new_user_manager)
+
+    @property
+    def image_manager(self):
+        return self._get_client(
+            'image_manager',
+            lambda: ImageManager(**self._build_image_creds(self.credentials))
+        )
+
+    @property
+    def network_manager(self):
+        return self._get_client(
+            'network_manager', lambda: NetworkManager(
+                **self._build_network_creds(self.credentials)
+            )
+        )
+
+    @property
+    def openstack_sdk(self):
+        return self._get_client(
+            'openstack_sdk', lambda: _connect_to_openstack_sdk(
+                **self._build_sdk_creds(self.credentials)
+            )
+        )
 
     def _initialize_loggers(self):
         from keystoneauth1 import _utils
@@ -616,7 +661,7 @@ class AccountDriver(BaseAccountDriver):
         return keypair
 
     def get_image_members(self, image_id, status="approved"):
-        all_projects = {p.id: p for p in self.list_projects()}
+        all_projects = self.get_tenant_index()
         shared_with = self.image_manager.glance.image_members.list(image_id)
         projects = []
         try:
@@ -998,10 +1043,10 @@ class AccountDriver(BaseAccountDriver):
         * match_all (bool) - If True, instances must match ALL words in the list.
         * include_empty (bool) - If True, include ALL tenants in the map.
         """
-        all_projects = self.list_projects()
+        project_index = self.get_tenant_index()
         all_instances = self.list_all_instances()
         if include_empty:
-            project_map = {proj: [] for proj in all_projects}
+            project_map = {proj: [] for proj in project_index.values()}
         else:
             project_map = {}
         for instance in all_instances:
@@ -1009,7 +1054,7 @@ class AccountDriver(BaseAccountDriver):
                 # NOTE: will someday be 'projectId'
                 tenant_id = instance.extra['tenantId']
 
-                project = [p for p in all_projects if p.id == tenant_id][0]
+                project = project_index[tenant_id]
             except (ValueError, KeyError):
                 raise Exception(
                     "The implementaion for recovering a tenant id has changed. Update the code base above this line!"
@@ -1063,6 +1108,22 @@ class AccountDriver(BaseAccountDriver):
             if 'snapshot' in img.get('image_type', 'image').lower()
         ]
 
+    def list_all_sizes(self):
+        """
+        List every flavor in a single call -- including the private and
+        disabled flavors that the admin driver's `list_sizes` leaves out.
+        """
+        return [
+            CloudSize(
+                id=flavor.id,
+                name=flavor.name,
+                cpu=flavor.vcpus,
+                ram=flavor.ram,
+                disk=flavor.disk,
+                ephemeral=flavor._info.get('OS-FLV-EXT-DATA:ephemeral', 0)
+            ) for flavor in self.user_manager.nova.flavors.list(is_public=None)
+        ]
+
     def get_project_by_id(self, project_id):
         return self.user_manager.get_project_by_id(project_id)
 
@@ -1072,9 +1133,10 @@ class AccountDriver(BaseAccountDriver):
         return self.user_manager.get_project(project_name, **kwargs)
 
     def _make_tenant_id_map(self):
-        all_projects = self.list_projects()
-        tenant_id_map = {project.id: project.name for project in all_projects}
-        return tenant_id_map
+        return {
+            project_id: project.name
+            for project_id, project in self.get_tenant_index().items()
+        }
 
     def create_trust(
         self,
@@ -1145,21 +1207,40 @@ class AccountDriver(BaseAccountDriver):
     def clear_local_cache(self):
         logger.info("Clearing the cached project-list")
         self.project_list = []
+        self.project_index = {}
+        self.project_list_expires = 0
 
     def list_projects(self, force=False, **kwargs):
         """
         Cached to save time on repeat queries.. Otherwise its a pass-through to user_manager
+        NOTE: Account drivers are pooled per provider, so the cached copy is
+        shared by every task (until ACCOUNT_PROJECT_LIST_TTL seconds pass)
         """
         if self.identity_version > 2:
             kwargs = self._parse_domain_kwargs(kwargs, domain_override='domain')
-        if not getattr(self, 'project_list', None) or force:
+        if not self.project_list or force or \
+                self.project_list_expires < time.time():
             logger.info("Caching a copy of project list")
             self.project_list = self.user_manager.list_projects(**kwargs)
+            self.project_index = {
+                project.id: project
+                for project in self.project_list
+            }
+            self.project_list_expires = time.time() + getattr(
+                settings, 'ACCOUNT_PROJECT_LIST_TTL', DEFAULT_PROJECT_LIST_TTL
+            )
             return self.project_list
 
         logger.info("Returning cached copy of project list")
         return self.project_list
 
+    def get_tenant_index(self, force=False):
+        """
+        Every project, keyed by its id (built once per project list)
+        """
+        self.list_projects(force=force)
+        return self.project_index
+
     def list_roles(self, **kwargs):
         """
         Keystone already accepts 'domain_name' to restrict what roles to return
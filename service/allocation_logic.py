@@ -1,13 +1,26 @@
 import datetime
+from collections import defaultdict, namedtuple
 
 import pytz
 from dateutil.parser import parse
+from django.db.models import Case, Value, When
 from django.db.models.query import Q
+from django.utils import timezone
 from threepio import logger
 
 from core.models import EventTable
-from core.models.allocation_source import AllocationSource
+from core.models.allocation_source import (
+    AllocationSource, UserAllocationSnapshot
+)
 from core.models.instance import Instance
+from core.models.instance_history import InstanceStatusHistory
+
+ALLOCATION_CHANGED_EVENT = "instance_allocation_source_changed"
+
+AllocationUsage = namedtuple('AllocationUsage', ['compute_used', 'burn_rate'])
+NO_USAGE = AllocationUsage(0.0, 0)
+# UserAllocationSnapshots saved per UPDATE
+SNAPSHOT_UPDATE_CHUNK_SIZE = 500
 
 
 def create_report(
@@ -16,6 +29,21 @@ def create_report(
     user_id=None,
     allocation_source_name=None
 ):
+    report_start_date, report_end_date = parse_report_window(
+        report_start_date, report_end_date
+    )
+    data = generate_data(report_start_date, report_end_date, username=user_id)
+    if allocation_source_name:
+        output = []
+        for row in data:
+            if row['allocation_source'] == allocation_source_name:
+                output.append(row)
+        return output
+
+    return data
+
+
+def parse_report_window(report_start_date, report_end_date):
     if not report_start_date or not report_end_date:
         raise Exception(
             "Start date and end date missing for allocation calculation function"
@@ -31,15 +59,7 @@ def create_report(
         raise Exception(
             "Cannot parse start and end dates for allocation calculation function"
         )
-    data = generate_data(report_start_date, report_end_date, username=user_id)
-    if allocation_source_name:
-        output = []
-        for row in data:
-            if row['allocation_source'] == allocation_source_name:
-                output.append(row)
-        return output
-
-    return data
+    return report_start_date, report_end_date
 
 
 def generate_data(report_start_date, report_end_date, username=None):
@@ -351,3 +371,316 @@ def get_instance_burn_rate_from_row(row):
         if is_running_at_report_end:
             burn_rate = row['cpu']
     return burn_rate
+
+
+# Batch usage engine
+#
+# `create_report` answers "what did *this* user use?" and costs several
+# queries per instance (and per history row). The functions below answer
+# the same question for every user at once: the histories, instance owners,
+# sizes and allocation source changes of a window are loaded in a handful of
+# bulk queries, then each instance is swept once, in timestamp order.
+
+
+def load_usage_histories(window_start, window_end, usernames=None):
+    """
+    Return every InstanceStatusHistory overlapping the window as a tuple of
+    (instance_id, provider_alias, username, status, cpu, start_date, end_date)
+    ordered by instance, then start_date.
+    """
+    histories = InstanceStatusHistory.objects.filter(
+        ~Q(start_date__gte=window_end) &
+        ~Q(Q(end_date__isnull=False) & Q(end_date__lte=window_start))
+    )
+    if usernames is not None:
+        histories = histories.filter(
+            instance__created_by__username__in=usernames
+        )
+    return histories.order_by('instance_id', 'start_date').values_list(
+        'instance_id', 'instance__provider_alias',
+        'instance__created_by__username', 'status__name', 'size__cpu',
+        'start_date', 'end_date'
+    )
+
+
+def load_allocation_changes(provider_aliases, window_end, chunk_size=500):
+    """
+    Return a dict of provider_alias -> [(timestamp, username, payload), ...]
+    holding every 'instance_allocation_source_changed' event of those
+    instances (up to `window_end`), in timestamp order.
+    """
+    changes = defaultdict(list)
+    provider_aliases = list(provider_aliases)
+    for index in range(0, len(provider_aliases), chunk_size):
+        events = EventTable.objects.filter(
+            name=ALLOCATION_CHANGED_EVENT,
+            timestamp__lte=window_end,
+            payload__instance_id__in=provider_aliases[index:index + chunk_size]
+        )
+        for timestamp, entity_id, payload in events.order_by(
+            'timestamp'
+        ).values_list('timestamp', 'entity_id', 'payload'):
+            changes[payload['instance_id']].append(
+                (timestamp, entity_id, payload)
+            )
+    return changes
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime.datetime) else parse(value)
+
+
+def _allocation_source_names_by_uuid():
+    return dict(
+        (str(uuid), name)
+        for uuid, name in AllocationSource.objects.values_list('uuid', 'name')
+    )
+
+
+def _allocation_source_name_from_payload(payload, names_by_uuid):
+    if payload.get('allocation_source_name'):
+        return payload['allocation_source_name']
+    return names_by_uuid.get(payload.get('allocation_source_id'))
+
+
+def _changes_made_by(username, changes):
+    """
+    Only the instance owner's allocation source changes are honored
+    (the same rule `create_report` applies through its username filter).
+    """
+    return [
+        (timestamp, payload) for timestamp, entity_id, payload in changes
+        if entity_id == username or payload.get('username') == username
+    ]
+
+
+def calculate_usage(
+    start_date, end_date=None, usernames=None, start_dates=None
+):
+    """
+    Calculate compute_used (in hours) and burn_rate for every
+    (username, allocation source name) with usage in the window.
+
+    start_dates: optional dict of allocation source name (or
+                 (username, allocation source name)) -> start date, for
+                 sources whose window starts later than `start_date`
+                 (e.g. after a renewal).
+
+    Returns a dict of (username, allocation_source_name) -> AllocationUsage.
+    Pairs without usage are omitted; use `usage.get(key, NO_USAGE)`.
+    """
+    return dict(
+        (key, AllocationUsage(round(seconds / 3600.0, 2), burn_rate))
+        for key, (seconds, burn_rate) in calculate_usage_seconds(
+            start_date, end_date, usernames, start_dates
+        ).items()
+    )
+
+
+def calculate_usage_seconds(
+    start_date, end_date=None, usernames=None, start_dates=None
+):
+    """
+    Same as `calculate_usage`, but returns the exact (unrounded) usage as
+    a dict of (username, allocation_source_name) -> (cpu seconds, burn_rate)
+    """
+    start_date = _as_datetime(start_date)
+    end_date = _as_datetime(end_date or _get_current_date_utc())
+    start_dates = dict(
+        (key, _as_datetime(value)) for key, value in (start_dates or {}).items()
+    )
+    window_start = min([start_date] + start_dates.values())
+
+    def window_start_for(username, source_name):
+        return start_dates.get(
+            (username, source_name), start_dates.get(source_name, start_date)
+        )
+
+    histories_by_instance = defaultdict(list)
+    for row in load_usage_histories(window_start, end_date, usernames):
+        histories_by_instance[(row[0], row[1], row[2])].append(row[3:])
+    changes_by_alias = load_allocation_changes(
+        set(alias for _, alias, _ in histories_by_instance), end_date
+    )
+    names_by_uuid = _allocation_source_names_by_uuid()
+
+    still_running = _get_current_date_utc()
+    seconds_used = defaultdict(float)
+    burn_rates = defaultdict(int)
+
+    def charge(username, source_name, cpu, start, end):
+        if not source_name:
+            return
+        start = max(start, window_start_for(username, source_name))
+        end = min(end, end_date)
+        if end > start:
+            seconds_used[(username,
+                          source_name)] += (end - start).total_seconds() * cpu
+
+    for (_, alias, username), histories in histories_by_instance.items():
+        changes = [
+            (
+                timestamp,
+                _allocation_source_name_from_payload(payload, names_by_uuid)
+            ) for timestamp, payload in
+            _changes_made_by(username, changes_by_alias.get(alias, []))
+        ]
+        next_change = 0
+        source_name = None
+        for status, cpu, hist_start, hist_end in histories:
+            is_active = status == 'active'
+            segment_start = hist_start
+            segment_end = hist_end or still_running
+            # Changes made before this history started decide its source
+            while next_change < len(changes) and \
+                    changes[next_change][0] <= segment_start:
+                source_name = changes[next_change][1]
+                next_change += 1
+            # Changes made while it ran split it into segments
+            while next_change < len(changes) and \
+                    changes[next_change][0] < segment_end:
+                changed_at, new_source_name = changes[next_change]
+                if is_active:
+                    charge(
+                        username, source_name, cpu, segment_start, changed_at
+                    )
+                segment_start = changed_at
+                source_name = new_source_name
+                next_change += 1
+            if is_active:
+                charge(username, source_name, cpu, segment_start, segment_end)
+                if not hist_end and source_name:
+                    burn_rates[(username, source_name)] += 1
+
+    return dict(
+        (key, (seconds_used.get(key, 0.0), burn_rates.get(key, 0)))
+        for key in set(seconds_used) | set(burn_rates)
+    )
+
+
+def _can_resume(snapshot, usage_start_date, end_date):
+    """
+    A snapshot can be brought forward if it accounted for the same window
+    start (i.e. the allocation source was not renewed since) and its
+    watermark is not past the new end date.
+
+    The first refresh of each (UTC) day recomputes every snapshot from the
+    start date, to account for histories that were end-dated (or changed)
+    retroactively, before the watermark.
+    """
+    return bool(
+        snapshot and snapshot.usage_watermark
+        and snapshot.usage_seconds is not None
+        and snapshot.usage_start_date == usage_start_date
+        and usage_start_date <= snapshot.usage_watermark <= end_date
+        and snapshot.usage_watermark.astimezone(
+            pytz.utc
+        ).date() == end_date.astimezone(pytz.utc).date()
+    )
+
+
+def _update_user_allocation_snapshots(
+    values_by_id, chunk_size=SNAPSHOT_UPDATE_CHUNK_SIZE
+):
+    """
+    Save `values_by_id` (UserAllocationSnapshot id -> dict of field values,
+    the same fields for every snapshot) with one UPDATE per chunk.
+    """
+    snapshot_ids = list(values_by_id)
+    updated = timezone.now()
+    for index in range(0, len(snapshot_ids), chunk_size):
+        chunk = snapshot_ids[index:index + chunk_size]
+        values = {}
+        for field_name in values_by_id[chunk[0]]:
+            field = UserAllocationSnapshot._meta.get_field(field_name)
+            values[field_name] = Case(
+                *[
+                    When(
+                        id=snapshot_id,
+                        then=Value(
+                            values_by_id[snapshot_id][field_name],
+                            output_field=field
+                        )
+                    ) for snapshot_id in chunk
+                ],
+                output_field=field
+            )
+        UserAllocationSnapshot.objects.filter(id__in=chunk).update(
+            updated=updated, **values
+        )
+
+
+def refresh_user_allocation_snapshots(users_by_source, start_dates, end_date):
+    """
+    Bring the UserAllocationSnapshot of every (user, allocation source) up
+    to `end_date`, only accounting for the time since each snapshot's
+    watermark. Snapshots without a watermark, or whose allocation source
+    was renewed since, are recomputed from the start date (see
+    `_can_resume`).
+
+    users_by_source: dict of AllocationSource -> [(user_id, username), ...]
+    start_dates: dict of allocation source name -> start of its window
+
+    Returns a dict of (username, allocation_source_name) -> AllocationUsage.
+    """
+    end_date = _as_datetime(end_date)
+    snapshots = dict(
+        ((snapshot.allocation_source_id, snapshot.user_id), snapshot)
+        for snapshot in UserAllocationSnapshot.objects.
+        filter(allocation_source__in=users_by_source.keys())
+    )
+    # Pairs sharing a window start share a usage calculation, so a new
+    # (or renewed) pair does not drag every resumed pair back to its start
+    pairs_by_window_start = defaultdict(list)
+    for allocation_source, users in users_by_source.items():
+        usage_start_date = _as_datetime(start_dates[allocation_source.name])
+        for user_id, username in users:
+            snapshot = snapshots.get((allocation_source.id, user_id))
+            resume = _can_resume(snapshot, usage_start_date, end_date)
+            window_start = snapshot.usage_watermark if resume \
+                else usage_start_date
+            pairs_by_window_start[window_start].append(
+                (
+                    allocation_source, user_id, username, usage_start_date,
+                    snapshot, resume
+                )
+            )
+
+    results = {}
+    updates = {}
+    creates = []
+    for window_start, pairs in pairs_by_window_start.items():
+        usage = calculate_usage_seconds(
+            window_start, end_date, usernames=set(pair[2] for pair in pairs)
+        )
+        for (
+            allocation_source, user_id, username, usage_start_date, snapshot,
+            resume
+        ) in pairs:
+            key = (username, allocation_source.name)
+            seconds, burn_rate = usage.get(key, (0.0, 0))
+            if resume:
+                seconds += float(snapshot.usage_seconds)
+            results[key] = AllocationUsage(
+                round(seconds / 3600.0, 2), burn_rate
+            )
+            values = {
+                'compute_used': results[key].compute_used,
+                'burn_rate': burn_rate,
+                'usage_start_date': usage_start_date,
+                'usage_watermark': end_date,
+                'usage_seconds': seconds
+            }
+            if snapshot:
+                updates[snapshot.id] = values
+            else:
+                creates.append(
+                    UserAllocationSnapshot(
+                        allocation_source_id=allocation_source.id,
+                        user_id=user_id,
+                        **values
+                    )
+                )
+    _update_user_allocation_snapshots(updates)
+    UserAllocationSnapshot.objects.bulk_create(creates)
+    return results
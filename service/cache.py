@@ -1,12 +1,53 @@
+"""
+Two-tier cache for cloud drivers and cloud listings.
+
+Tier 1: A bounded, per-worker (in-process) LRU.
+Tier 2: Redis, shared by every worker.
+
+Cloud drivers are only kept in tier 1 (they can not be serialized), per
+thread, and keyed on a fingerprint of their credentials.
+Listings are kept in redis as zlib-compressed, binary (protocol 2) pickles
+of the scrubbed rtwo objects. Volume and machine listings are also kept in
+tier 1. Instance listings are not: they are invalidated after every
+instance action, and an invalidation can only reach the local tier of
+the worker that made it.
+
+On a miss, a redis lock ensures only one worker refreshes a key from the
+cloud; the others wait for the lock and read the refreshed value.
+
+Optional settings:
+  CLOUD_CACHE_TTLS - dict of resource ('driver', 'instances', 'volumes',
+                     'machines') to time-to-live, in seconds.
+  CLOUD_CACHE_LOCAL_SIZE - maximum number of entries in each local cache.
+  CLOUD_CACHE_LOCK_TIMEOUT - seconds to hold/wait for a refresh lock.
+"""
 import cPickle as pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
 import redis
+from redis.exceptions import LockError
+from django.conf import settings
 from threepio import logger
 
-from service.driver import get_esh_driver, get_admin_driver
-
-admin_drivers = {}
-drivers = {}
-connection = None
+from core.redis_pool import get_redis_connection
+from service.driver import (
+    account_driver_fingerprint, get_esh_driver, get_admin_driver,
+    identity_driver_fingerprint, invalidate_account_driver
+)
+
+DEFAULT_CACHE_TTLS = {
+    'driver': 5 * 60,
+    'instances': 30,
+    'volumes': 60,
+    'machines': 5 * 60,
+}
+DEFAULT_LOCAL_SIZE = 256
+DEFAULT_LOCK_TIMEOUT = 60
+# Listings only cached in redis (see above)
+SHARED_ONLY_RESOURCES = ('instances', )
 
 INSTANCES_KEY_PROVIDER = "instances.{0}"
 INSTANCES_KEY_IDENTITY = "instances.{0}.{1}"
@@ -14,60 +55,258 @@ VOLUMES_KEY_PROVIDER = "volumes.{0}"
 VOLUMES_KEY_IDENTITY = "volumes.{0}.{1}"
 MACHINES_KEY_PROVIDER = "machines.{0}"
 MACHINES_KEY_IDENTITY = "machines.{0}.{1}"
+REFRESH_LOCK_KEY = "lock.{0}"
+
+
+class LocalCache(object):
+    """
+    Bounded, in-process LRU cache with a per-entry expiry.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                return None
+            # Re-insert as the most recently used entry
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
+    def __len__(self):
+        return len(self._entries)
 
-def _get_cached_admin_driver(provider, force=True):
-    if not admin_drivers.get(provider) or force:
-        admin_drivers[provider] = get_admin_driver(provider)
-    return admin_drivers[provider]
 
+def _local_size():
+    return getattr(settings, 'CLOUD_CACHE_LOCAL_SIZE', DEFAULT_LOCAL_SIZE)
 
-def _get_cached_driver(provider=None, identity=None, force=True):
+
+# Drivers (their clients) are not thread-safe: each thread has its own
+_thread_drivers = threading.local()
+_driver_generations = defaultdict(int)
+_driver_generation_lock = threading.Lock()
+listings = LocalCache(_local_size())
+
+
+def _local_drivers():
+    drivers = getattr(_thread_drivers, 'drivers', None)
+    if drivers is None:
+        drivers = _thread_drivers.drivers = LocalCache(_local_size())
+    return drivers
+
+
+def _driver_key(provider=None, identity=None):
     if provider:
-        return _get_cached_admin_driver(provider, force)
-    if not drivers.get(identity) or force:
-        drivers[identity] = get_esh_driver(identity)
-    return drivers[identity]
+        return (
+            'provider', provider.id,
+            _driver_generations[('provider', provider.id)],
+            account_driver_fingerprint(provider)
+        )
+    return (
+        'identity', identity.id, _driver_generations[('identity', identity.id)],
+        identity_driver_fingerprint(identity)
+    )
+
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(int)
+
+
+def _record(resource, event):
+    with _stats_lock:
+        _stats["%s.%s" % (resource, event)] += 1
+
+
+def cache_stats():
+    """
+    Return the hit/miss/refresh counters of this worker, keyed as
+    '<resource>.<event>'. Events are one of:
+      local_hit, redis_hit, miss, refresh, lock_timeout, redis_error
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _ttl(resource):
+    ttls = getattr(settings, 'CLOUD_CACHE_TTLS', {})
+    return ttls.get(resource, DEFAULT_CACHE_TTLS.get(resource, 30))
+
+
+def _resource_for(key):
+    return key.split('.')[0]
+
+
+def _get_cached_driver(provider=None, identity=None, force=False):
+    drivers = _local_drivers()
+    key = _driver_key(provider, identity)
+    driver = None if force else drivers.get(key)
+    if driver:
+        _record('driver', 'local_hit')
+        return driver
+    _record('driver', 'miss')
+    if provider:
+        driver = get_admin_driver(provider)
+    else:
+        driver = get_esh_driver(identity)
+    if driver:
+        drivers.set(key, driver, _ttl('driver'))
+    return driver
 
 
 def redis_connection():
-    global connection
-    if not connection:
-        connection = redis.StrictRedis()
-    return connection
+    return get_redis_connection()
 
 
-def _invalidate(key):
-    r = redis_connection()
-    if key:
-        r.delete(key)
+def _dumps(data):
+    return zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
 
 
-def _get_cached(key, data_method, scrub_method, force=False):
+def _loads(payload):
     try:
-        r = redis_connection()
-        if force:
-            _invalidate(key)
-        data = r.get(key)
+        return pickle.loads(zlib.decompress(payload))
+    except (zlib.error, pickle.UnpicklingError, EOFError):
+        logger.warn("Discarding unreadable cache payload")
+        return None
+
+
+def _redis_unavailable(resource):
+    _record(resource, 'redis_error')
+    logger.error(
+        "EXTERNAL SERVICE redis-server IS NOT RUNNING! "
+        "Somebody should turn it on!"
+    )
+
+
+def _local_tier(resource):
+    return resource not in SHARED_ONLY_RESOURCES
+
+
+def _invalidate(key):
+    if not key:
+        return
+    listings.delete(key)
+    try:
+        redis_connection().delete(key)
     except redis.exceptions.ConnectionError:
-        logger.error(
-            "EXTERNAL SERVICE redis-server IS NOT RUNNING! "
-            "Somebody should turn it on!"
+        _redis_unavailable(_resource_for(key))
+
+
+def _read(key, resource, ttl):
+    """
+    Read `key` from the local tier, then redis.
+    Returns the cached listing, or None on a miss.
+    """
+    payload = listings.get(key) if _local_tier(resource) else None
+    if payload is not None:
+        data = _loads(payload)
+        if data is not None:
+            _record(resource, 'local_hit')
+            return data
+    try:
+        payload = redis_connection().get(key)
+    except redis.exceptions.ConnectionError:
+        _redis_unavailable(resource)
+        return None
+    if payload is None:
+        return None
+    data = _loads(payload)
+    if data is not None:
+        _record(resource, 'redis_hit')
+        if _local_tier(resource):
+            listings.set(key, payload, ttl)
+    return data
+
+
+def _refresh(key, resource, ttl, data_method, scrub_method, force=False):
+    """
+    Fetch `key` from the cloud while holding the (single-flight) refresh
+    lock. Workers that had to wait for the lock will re-use the value
+    written by the worker that held it.
+    """
+    lock_timeout = getattr(
+        settings, 'CLOUD_CACHE_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT
+    )
+    lock = None
+    try:
+        lock = redis_connection().lock(
+            REFRESH_LOCK_KEY.format(key),
+            timeout=lock_timeout,
+            blocking_timeout=lock_timeout
         )
-        data = None
-    if not data:
+        if not lock.acquire():
+            _record(resource, 'lock_timeout')
+            lock = None
+    except redis.exceptions.ConnectionError:
+        _redis_unavailable(resource)
+        lock = None
+    try:
+        if not force:
+            data = _read(key, resource, ttl)
+            if data is not None:
+                return data
         data = data_method()
         scrub_method(data)
+        _record(resource, 'refresh')
+        payload = _dumps(data)
+        if _local_tier(resource):
+            listings.set(key, payload, ttl)
+        try:
+            redis_connection().setex(key, ttl, payload)
+        except redis.exceptions.ConnectionError:
+            _redis_unavailable(resource)
         logger.debug(
-            "Updated redis({0}) using {1} and {2}".format(
+            "Updated cache({0}) using {1} and {2}".format(
                 key, data_method, scrub_method
             )
         )
-        r.set(key, pickle.dumps(data))
-        r.expire(key, 30)
         return data
-    logger.debug("Actual type {0}".format(type(data)))
-    return pickle.loads(data)
+    finally:
+        if lock:
+            try:
+                lock.release()
+            except (LockError, redis.exceptions.ConnectionError):
+                # The lock expired while the cloud was being queried.
+                pass
+
+
+def _get_cached(key, data_method, scrub_method, force=False):
+    resource = _resource_for(key)
+    ttl = _ttl(resource)
+    if force:
+        _invalidate(key)
+    else:
+        data = _read(key, resource, ttl)
+        if data is not None:
+            return data
+    _record(resource, 'miss')
+    return _refresh(key, resource, ttl, data_method, scrub_method, force)
 
 
 def _scrub(objects):
@@ -86,27 +325,47 @@ def _validate_parameters(provider, identity):
         raise Exception("Use either provider or identity but not both.")
 
 
-def get_cached_driver(provider=None, identity=None, force=True):
+def get_cached_driver(provider=None, identity=None, force=False):
+    """
+    Return a driver for `provider` (admin) or `identity`, re-using the
+    driver cached by this thread until the 'driver' TTL passes, its
+    credentials change or it is invalidated.
+    param - force - if True, always build (and cache) a new driver
+    """
     _validate_parameters(provider, identity)
     return _get_cached_driver(provider=provider, identity=identity, force=force)
 
 
+def invalidate_cached_driver(provider=None, identity=None):
+    """
+    Drop the cached drivers of `provider` or `identity`, in every thread of
+    this worker. Credential changes are picked up without it.
+    """
+    _validate_parameters(provider, identity)
+    key = ('provider', provider.id) if provider else ('identity', identity.id)
+    with _driver_generation_lock:
+        _driver_generations[key] += 1
+    if provider:
+        invalidate_account_driver(provider)
+
+
 def get_cached_instances(provider=None, identity=None, force=False):
     _validate_parameters(provider, identity)
-    cached_driver = _get_cached_driver(
-        provider=provider, identity=identity, force=force
-    )
-    cached_driver.list_sizes()
-    #NOTE: THIS IS A HACK -- The 'admin' user should be able to see "All the things" -- HOWEVER
-    # In the current implementation of liberty on jetstream, a call to 'list_all_tenants'
-    # Made by a user with a single tenant will produce *IDENTICAL* results to that same call made by admin.
-    # THIS IS CONSIDERED HARMFUL! So we have blocked all users except the admin accounts from making this call.
-    if identity and identity.created_by and identity.created_by.username in [
-        'atmoadmin', 'admin'
-    ]:
-        instances_method = cached_driver.list_all_instances
-    else:
-        instances_method = cached_driver.list_instances
+
+    def instances_method():
+        cached_driver = _get_cached_driver(
+            provider=provider, identity=identity, force=force
+        )
+        cached_driver.list_sizes()
+        #NOTE: THIS IS A HACK -- The 'admin' user should be able to see "All the things" -- HOWEVER
+        # In the current implementation of liberty on jetstream, a call to 'list_all_tenants'
+        # Made by a user with a single tenant will produce *IDENTICAL* results to that same call made by admin.
+        # THIS IS CONSIDERED HARMFUL! So we have blocked all users except the admin accounts from making this call.
+        if identity and identity.created_by and identity.created_by.username in [
+            'atmoadmin', 'admin'
+        ]:
+            return cached_driver.list_all_instances()
+        return cached_driver.list_instances()
 
     if provider:
         key = INSTANCES_KEY_PROVIDER.format(provider.id)
@@ -129,10 +388,13 @@ def invalidate_cached_instances(provider=None, identity=None):
 
 def get_cached_volumes(provider=None, identity=None, force=False):
     _validate_parameters(provider, identity)
-    cached_driver = _get_cached_driver(
-        provider=provider, identity=identity, force=force
-    )
-    volumes_method = cached_driver.list_all_volumes
+
+    def volumes_method():
+        cached_driver = _get_cached_driver(
+            provider=provider, identity=identity, force=force
+        )
+        return cached_driver.list_all_volumes()
+
     if provider:
         key = VOLUMES_KEY_PROVIDER.format(provider.id)
     else:
@@ -154,10 +416,13 @@ def invalidate_cached_volumes(provider=None, identity=None):
 
 def get_cached_machines(provider=None, identity=None, force=False):
     _validate_parameters(provider, identity)
-    cached_driver = _get_cached_driver(
-        provider=provider, identity=identity, force=force
-    )
-    machines_method = cached_driver.list_machines
+
+    def machines_method():
+        cached_driver = _get_cached_driver(
+            provider=provider, identity=identity, force=force
+        )
+        return cached_driver.list_machines()
+
     if provider:
         key = MACHINES_KEY_PROVIDER.format(provider.id)
     else:
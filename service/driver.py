@@ -1,9 +1,17 @@
+import threading
+import time
 import uuid
+from collections import defaultdict
+from hashlib import sha256
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 
 from core.exceptions import ProviderNotActive
 from core.models import AtmosphereUser as User
+from core.models.credential import Credential, ProviderCredential
 from core.models.identity import Identity as CoreIdentity
-from core.models.provider import Provider as CoreProvider
+from core.models.provider import AccountProvider, Provider as CoreProvider
 from core.models.size import convert_esh_size
 
 from threepio import logger
@@ -137,22 +145,172 @@ def get_admin_driver(provider):
         return None
 
 
-def get_account_driver(provider, raise_exception=False):
+# Pooled account drivers are re-built after this many seconds (before
+# the admin's keystone token expires)
+DEFAULT_ACCOUNT_DRIVER_TTL = 50 * 60
+# Seconds a credential fingerprint is re-used before the credentials are
+# read again. Changes saved in this process are seen immediately.
+DEFAULT_CREDENTIAL_FINGERPRINT_TTL = 60
+
+# Each thread keeps its own drivers (their clients are not thread-safe)
+_account_drivers = threading.local()
+_account_driver_lock = threading.Lock()
+_account_driver_generations = defaultdict(int)
+_account_driver_stats = defaultdict(float)
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+
+
+def _record_account_driver(event, seconds=None):
+    with _account_driver_lock:
+        _account_driver_stats[event] += 1
+        if seconds is not None:
+            _account_driver_stats['construction_seconds'] += seconds
+            _account_driver_stats['last_construction_seconds'] = seconds
+
+
+def account_driver_stats():
     """
-    Create an account driver for a given provider.
+    Return the account driver counters of this worker:
+      hit, miss, expired, constructions, construction_seconds,
+      last_construction_seconds
+    """
+    with _account_driver_lock:
+        return dict(_account_driver_stats)
+
+
+def reset_account_driver_stats():
+    with _account_driver_lock:
+        _account_driver_stats.clear()
+
+
+def _account_driver_fingerprint(provider):
+    """
+    A digest of every credential an account driver is built from,
+    so a pooled driver is replaced as soon as any of them change.
+    """
+    admin = provider.admin
+    admin_creds = admin.get_credentials() if admin else {}
+    return sha256(
+        repr(
+            (
+                sorted(provider.get_credentials().items()),
+                sorted(admin_creds.items()), provider.cloud_config
+            )
+        )
+    ).hexdigest()
+
+
+def _cached_fingerprint(key, compute):
+    now = time.time()
+    entry = _fingerprints.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    fingerprint = compute()
+    ttl = getattr(
+        settings, 'CREDENTIAL_FINGERPRINT_TTL',
+        DEFAULT_CREDENTIAL_FINGERPRINT_TTL
+    )
+    with _fingerprint_lock:
+        _fingerprints[key] = (now + ttl, fingerprint)
+    return fingerprint
+
+
+def account_driver_fingerprint(provider):
+    """
+    The (cached) `_account_driver_fingerprint` of `provider`.
+    """
+    return _cached_fingerprint(
+        ('provider', provider.uuid),
+        lambda: _account_driver_fingerprint(provider)
+    )
+
+
+def identity_driver_fingerprint(identity):
+    """
+    A (cached) digest of every credential an esh driver of `identity` is
+    built from.
+    """
+    return _cached_fingerprint(
+        ('identity', identity.uuid),
+        lambda: sha256(repr(sorted(identity.get_all_credentials().items()))).hexdigest()
+    )
+
+
+def forget_credential_fingerprints():
+    with _fingerprint_lock:
+        _fingerprints.clear()
+
+
+def _credentials_changed(sender, **kwargs):
+    # Credentials rarely change: forget every fingerprint
+    forget_credential_fingerprints()
+
+
+def invalidate_account_driver(provider):
+    """
+    Drop the pooled account drivers of `provider`, in every thread.
+    """
+    with _account_driver_lock:
+        _account_driver_generations[provider.uuid] += 1
+
+
+def _build_account_driver(provider):
+    type_name = provider.get_type_name().lower()
+    if 'openstack' in type_name:
+        from service.accounts.openstack_manager import AccountDriver as\
+            OSAccountDriver
+        return OSAccountDriver(provider)
+    elif 'eucalyptus' in type_name:
+        from service.accounts.eucalyptus import AccountDriver as\
+            EucaAccountDriver
+        return EucaAccountDriver(provider)
+
+
+def _get_pooled_account_driver(provider, force=False):
+    pool = getattr(_account_drivers, 'pool', None)
+    if pool is None:
+        pool = _account_drivers.pool = {}
+    fingerprint = account_driver_fingerprint(provider)
+    generation = _account_driver_generations[provider.uuid]
+    entry = pool.get(provider.uuid)
+    if entry and not force and entry[:2] == (fingerprint, generation):
+        if entry[2] > time.time():
+            _record_account_driver('hit')
+            return entry[3]
+        _record_account_driver('expired')
+    else:
+        _record_account_driver('miss')
+    pool.pop(provider.uuid, None)
+    started = time.time()
+    account_driver = _build_account_driver(provider)
+    elapsed = time.time() - started
+    _record_account_driver('constructions', elapsed)
+    logger.info(
+        "Built account driver for provider %s in %.3f seconds" %
+        (provider.location, elapsed)
+    )
+    if account_driver:
+        ttl = getattr(
+            settings, 'ACCOUNT_DRIVER_TTL', DEFAULT_ACCOUNT_DRIVER_TTL
+        )
+        pool[provider.uuid
+            ] = (fingerprint, generation, time.time() + ttl, account_driver)
+    return account_driver
+
+
+def get_account_driver(provider, raise_exception=False, force=False):
+    """
+    Return the account driver for a given provider.
+
+    Account drivers are pooled (per worker thread) and re-used until
+    ACCOUNT_DRIVER_TTL passes or the provider/admin credentials change.
+    param - force - if True, always build a new account driver
     """
     try:
         if type(provider) == uuid.UUID:
             provider = CoreProvider.objects.get(uuid=provider)
-        type_name = provider.get_type_name().lower()
-        if 'openstack' in type_name:
-            from service.accounts.openstack_manager import AccountDriver as\
-                OSAccountDriver
-            return OSAccountDriver(provider)
-        elif 'eucalyptus' in type_name:
-            from service.accounts.eucalyptus import AccountDriver as\
-                EucaAccountDriver
-            return EucaAccountDriver(provider)
+        return _get_pooled_account_driver(provider, force=force)
     except:
         if type(provider) == uuid.UUID:
             provider_str = "Provider with UUID %s" % provider
@@ -307,3 +465,12 @@ def get_occupancy(core_provider):
         convert_esh_size(size, core_provider.uuid) for size in esh_size_list
     ]
     return core_size_list
+
+
+post_save.connect(_credentials_changed, sender=Credential)
+post_delete.connect(_credentials_changed, sender=Credential)
+post_save.connect(_credentials_changed, sender=ProviderCredential)
+post_delete.connect(_credentials_changed, sender=ProviderCredential)
+post_save.connect(_credentials_changed, sender=AccountProvider)
+post_delete.connect(_credentials_changed, sender=AccountProvider)
+post_save.connect(_credentials_changed, sender=CoreProvider)
@@ -107,6 +107,27 @@ class OverAllocationError(ServiceException):
         return "%s" % (self.message, )
 
 
+class EnforcementError(ServiceException):
+    """
+    The over-allocation action failed on some instances.
+    `instances` holds the instances it was enforced on, `failures` the
+    (instance_id, error) of the others.
+    """
+
+    def __init__(self, action_name, instances, failures):
+        self.instances = instances
+        self.failures = failures
+        self.message = "Over-allocation action %s failed on %s: %s" % (
+            action_name, ", ".join(
+                "%s" % instance_id for instance_id, _ in failures
+            ), "; ".join(error for _, error in failures)
+        )
+        super(EnforcementError, self).__init__(self.message)
+
+    def __str__(self):
+        return "%s" % (self.message, )
+
+
 class OverQuotaError(ServiceException):
     def __init__(
         self,
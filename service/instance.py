@@ -643,17 +643,18 @@ def offload_instance(
     return offloaded
 
 
-def destroy_instance(user, core_identity_uuid, instance_alias):
+def destroy_instance(user, core_identity_uuid, instance_alias, esh_driver=None):
     """
     Use this function to destroy an instance (From the API, or the REPL)
+    esh_driver - optional, the driver of the identity to act with
     """
     # TODO: Test how this f(n) works when called multiple times
     success, esh_instance = _destroy_instance(
-        core_identity_uuid, instance_alias
+        core_identity_uuid, instance_alias, esh_driver=esh_driver
     )
     if not success and esh_instance:
         raise Exception("Instance could not be destroyed")
-    os_cleanup_networking(core_identity_uuid)
+    os_cleanup_networking(core_identity_uuid, driver=esh_driver)
     core_instance = find_instance(instance_alias)
     if not core_instance:
         raise Exception("Instance %s not found" % instance_alias)
@@ -661,13 +662,14 @@ def destroy_instance(user, core_identity_uuid, instance_alias):
     return core_instance
 
 
-def os_cleanup_networking(core_identity_uuid):
+def os_cleanup_networking(core_identity_uuid, driver=None):
     """
     NOTE: this relies on celery to 'kick these tasks off' as we return the destroyed instance back to the user.
     """
     from service.tasks.driver import clean_empty_ips
-    core_identity = CoreIdentity.objects.get(uuid=core_identity_uuid)
-    driver = get_cached_driver(identity=core_identity)
+    if not driver:
+        core_identity = CoreIdentity.objects.get(uuid=core_identity_uuid)
+        driver = get_cached_driver(identity=core_identity)
     if not isinstance(driver, OSDriver):
         return
     # Spawn off the last two tasks
@@ -708,14 +710,15 @@ def os_cleanup_networking(core_identity_uuid):
     return
 
 
-def _destroy_instance(identity_uuid, instance_alias):
+def _destroy_instance(identity_uuid, instance_alias, esh_driver=None):
     """
     Responsible for actually destroying the instance
     Return:
     Deleted, Instance
     """
-    identity = CoreIdentity.objects.get(uuid=identity_uuid)
-    esh_driver = get_cached_driver(identity=identity)
+    if not esh_driver:
+        identity = CoreIdentity.objects.get(uuid=identity_uuid)
+        esh_driver = get_cached_driver(identity=identity)
     # Bail if driver cant be created
     if not esh_driver:
         return (False, None)
@@ -782,10 +785,19 @@ def _pre_launch_validation(
     """
     Used BEFORE launching a volume/instance .. Raise exceptions here to be dealt with by the caller.
     """
+    from service.quota import get_quota_snapshot
     identity = CoreIdentity.objects.get(uuid=identity_uuid)
 
     # May raise OverQuotaError
-    check_quota(username, identity_uuid, size, include_networking=True)
+    check_quota(
+        username,
+        identity_uuid,
+        size,
+        include_networking=True,
+        quota_snapshot=get_quota_snapshot(
+            username, identity_uuid, driver=esh_driver
+        )
+    )
 
     # May raise OverAllocationError, AllocationBlacklistedError
     check_allocation(username, allocation_source)
@@ -1381,14 +1393,21 @@ def check_allocation(username, allocation_source):
         )
 
 
-def check_quota(username, identity_uuid, esh_size, include_networking=False):
+def check_quota(
+    username,
+    identity_uuid,
+    esh_size,
+    include_networking=False,
+    quota_snapshot=None
+):
     from service.quota import check_over_instance_quota
     try:
         check_over_instance_quota(
             username,
             identity_uuid,
             esh_size,
-            include_networking=include_networking
+            include_networking=include_networking,
+            quota_snapshot=quota_snapshot
         )
     except ValidationError as bad_quota:
         raise OverQuotaError(message=bad_quota.message)
@@ -1,19 +1,29 @@
-import random
+import threading
 import time
+from collections import namedtuple
 from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 from django.core.exceptions import ObjectDoesNotExist
-import pytz
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import F
 from django.utils import timezone
 from threepio import logger
 from core.models import AccountProvider
 from core.models.credential import Credential
 from core.models import InstanceStatusHistory
+from core.models.instance_history import refresh_last_histories
 from core.models.instance import Instance as CoreInstance
 from core.models.instance import (
     convert_esh_instance, _esh_instance_size_to_core
 )
+from core.models.instance_source import InstanceSource
+from core.models.size import Size, UNKNOWN_SIZE, apply_cloud_size
+from core.models.volume import Volume, convert_esh_volume
+from core.query import only_current_source
 from service.cache import get_cached_instances, get_cached_driver
+from service.driver import get_esh_driver
+from service.exceptions import EnforcementError
+from service.run_stats import RunStats
 from service.instance import suspend_instance, stop_instance, destroy_instance, shelve_instance, offload_instance
 from django.conf import settings
 from rtwo.exceptions import LibcloudInvalidCredsError
@@ -45,67 +55,36 @@ def _make_instance_owner_map(instances, users=None):
     return owner_map
 
 
-def _core_instances_for(identity, start_date=None):
-    if not start_date:
-        # Can't use 'None' as a query value
-        start_date = timezone.datetime(1970, 1, 1).replace(tzinfo=pytz.utc)
-    return CoreInstance.objects.filter(
-        Q(instancestatushistory__end_date=None) |
-        Q(instancestatushistory__end_date__gt=start_date) | Q(end_date=None) |
-        Q(end_date__gt=start_date),
-    # NOTE: May need to remove this created_by line
-    # down-the-road as we share user/tenants.
-        created_by=identity.created_by,
-        created_by_identity=identity
-    ).distinct()
-
-
 def _select_identities(provider, users=None):
     if users:
         return provider.identity_set.filter(created_by__username__in=users)
     return provider.identity_set.all()
 
 
-def _convert_tenant_id_to_names(instances, tenants):
-    for i in instances:
-        for tenant in tenants:
-            if type(tenant) == dict:
-                if tenant['id'] == i.owner:
-                    i.owner = tenant['name']
-            else:
-                if tenant.id == i.owner:
-                    i.owner = tenant.name
-    return instances
+def _tenant_name(tenant):
+    if type(tenant) == dict:
+        return tenant['name']
+    return tenant.name
 
 
-def _get_identity_from_tenant_name(provider, username):
-    # FIXME: This needs to be `username, tenant_name` because the `project_name` no longer has to match the `username`
-    try:
-        # NOTE: I could see this being a problem when 'user1' and 'user2' use
-        # TODO: Ideally we would be able to extract some more information
-        #      when we move away from explicit user-groups.
-        credential = Credential.objects.get(
-            Q(key='ex_project_name'),
-            value=username,
-            identity__provider=provider
-        )
-        identity = credential.identity
-        return identity
-    except Credential.MultipleObjectsReturned:
-        logger.warn(
-            "%s has >1 Credentials on Provider %s" % (username, provider)
-        )
-        credential = Credential.objects.filter(
-            key='ex_project_name', value=username, identity__provider=provider
-        )[0]
-        identity = credential.identity
-        return identity
-    except Credential.DoesNotExist:
-        return None
+def _convert_tenant_id_to_names(instances, tenant_index):
+    """
+    Replace each instance.owner (a tenant id) with the tenant name,
+    using `tenant_index` (tenant id -> tenant)
+    """
+    for i in instances:
+        tenant = tenant_index.get(i.owner)
+        if tenant is None:
+            continue
+        i.owner = _tenant_name(tenant)
+    return instances
 
 
-def _execute_provider_action(identity, user, instance, action_name):
-    driver = get_cached_driver(identity=identity)
+def _execute_provider_action(
+    identity, user, instance, action_name, driver=None
+):
+    if not driver:
+        driver = get_cached_driver(identity=identity)
 
     # NOTE: This if statement is a HACK! It will be removed when IP management is enabled in an upcoming version. -SG
     reclaim_ip = True if identity.provider.location != 'iPlant Cloud - Tucson' else False
@@ -151,7 +130,9 @@ def _execute_provider_action(identity, user, instance, action_name):
                 reclaim_ip
             )
         elif action_name == 'Terminate':
-            destroy_instance(user, identity.uuid, instance.id)
+            destroy_instance(
+                user, identity.uuid, instance.id, esh_driver=driver
+            )
         else:
             raise Exception("Encountered Unknown Action Named %s" % action_name)
     except ObjectDoesNotExist:
@@ -162,72 +143,10 @@ def _execute_provider_action(identity, user, instance, action_name):
         return
 
 
-def _cleanup_missing_instances(
-    identity, core_running_instances, start_date=None
-):
-    """
-    Cleans up the DB InstanceStatusHistory when you know what instances are
-    active...
-
-    core_running_instances - Reference list of KNOWN active instances
-    """
-    instances = []
-
-    if not identity:
-        return instances
-
-    core_instances = _core_instances_for(identity, start_date)
-    fixed_instances = []
-    for inst in core_instances:
-        if not core_running_instances or inst not in core_running_instances:
-            inst.end_date_all()
-            fixed_instances.append(inst)
-        else:
-            # Instance IS in the list of running instances.. Further cleaning
-            # can be done at this level.
-            non_end_dated_history = inst.instancestatushistory_set.filter(
-                end_date=None
-            )
-            count = len(non_end_dated_history)
-            if count > 1:
-                history_names = [
-                    ish.status.name for ish in non_end_dated_history
-                ]
-                # Note: We have the 'wrong' instance, we want the one that
-                # includes the ESH driver
-                core_running_inst = [
-                    i for i in core_running_instances if i == inst
-                ][0]
-                new_history = _resolve_history_conflict(
-                    identity, core_running_inst, non_end_dated_history
-                )
-                fixed_instances.append(inst)
-                logger.warn(
-                    "Instance %s contained %s "
-                    "NON END DATED history:%s. "
-                    " New History: %s" %
-                    (inst.provider_alias, count, history_names, new_history)
-                )
-            # Gather the updated values..
-            instances.append(inst)
-    # Return the updated list
-    if fixed_instances:
-        logger.warn(
-            "Cleaned up %s instances for %s" %
-            (len(fixed_instances), identity.created_by.username)
-        )
-    return instances
-
-
-def _resolve_history_conflict(
-    identity, core_running_instance, bad_history, reset_time=None
-):
+def _build_resolved_history(identity, core_running_instance, reset_time):
     """
-    NOTE 1: This is a 'band-aid' fix until we are 100% that Transaction will
-            not create conflicting un-end-dated objects.
-
-    NOTE 2: It is EXPECTED that this instance has the 'esh' attribute
-            Failure to add the 'esh' attribute will generate a ValueError!
+    Build (but do not save) the history that replaces a set of
+    conflicting, non-end-dated histories for a running instance.
     """
     if not getattr(core_running_instance, 'esh'):
         raise ValueError("Esh is missing from %s" % core_running_instance)
@@ -241,15 +160,418 @@ def _resolve_history_conflict(
     new_size = _esh_instance_size_to_core(
         esh_driver, esh_instance, identity.provider.uuid
     )
-    if not reset_time:
-        reset_time = timezone.now()
-    for history in bad_history:
-        history.end_date = reset_time
-        history.save()
-    new_history = InstanceStatusHistory.create_history(
+    return InstanceStatusHistory.create_history(
         new_status, core_running_instance, new_size, reset_time
     )
-    return new_history
+
+
+def identities_by_project_name(provider):
+    """
+    Every identity on `provider`, keyed by its 'ex_project_name'
+    """
+    credentials = Credential.objects.filter(
+        key='ex_project_name', identity__provider=provider
+    ).select_related('identity', 'identity__created_by',
+                     'identity__provider').order_by('id')
+    identity_map = {}
+    for credential in credentials:
+        if credential.value in identity_map:
+            logger.warn(
+                "%s has >1 Credentials on Provider %s" %
+                (credential.value, provider)
+            )
+            continue
+        identity_map[credential.value] = credential.identity
+    return identity_map
+
+
+def _chunked(items, chunk_size):
+    items = list(items)
+    for idx in range(0, len(items), chunk_size):
+        yield items[idx:idx + chunk_size]
+
+
+class InstanceReconciler(object):
+    """
+    Reconcile the instances recorded in the DB for a provider against
+    the instances listed by the cloud.
+
+    Rather than walking each identity (and each instance) separately,
+    the DB side is loaded once into indexes:
+      - identities, keyed by 'ex_project_name'
+      - non-end-dated instances, keyed by id
+      - non-end-dated histories, keyed by instance id
+    The indexes are diffed against the converted cloud instances and all
+    end-dates are applied with bulk UPDATEs.
+    """
+    chunk_size = 500
+
+    def __init__(self, provider, stats=None):
+        self.provider = provider
+        self.stats = stats or RunStats("reconcile_instances", provider=provider)
+
+    def identities_by_project_name(self):
+        return identities_by_project_name(self.provider)
+
+    def convert_running_instances(self, instance_map, identity_map):
+        """
+        Convert the cloud instances of every known tenant.
+        Returns a dict of {core_instance.id: (core_instance, identity)} and
+        the set of identity ids that could NOT be converted (and therefore
+        must not be cleaned up in this run).
+        """
+        running = {}
+        failed_identity_ids = set()
+        for tenant_name in sorted(instance_map.keys()):
+            esh_instances = instance_map[tenant_name]
+            identity = identity_map.get(tenant_name)
+            if not identity or not esh_instances:
+                continue
+            try:
+                driver = get_cached_driver(identity=identity)
+                for esh_instance in esh_instances:
+                    core_instance = convert_esh_instance(
+                        driver, esh_instance, self.provider.uuid, identity.uuid,
+                        identity.created_by
+                    )
+                    running[core_instance.id] = (core_instance, identity)
+            except Exception:
+                logger.exception(
+                    "Could not convert running instances for %s" % tenant_name
+                )
+                failed_identity_ids.add(identity.id)
+                self.stats.incr('failed_tenants')
+        self.stats.incr('running_instances', len(running))
+        return running, failed_identity_ids
+
+    def open_instance_ids(self, identity_ids):
+        """
+        Ids of all non-end-dated instances owned by `identity_ids`
+        """
+        open_instances = CoreInstance.objects.filter(
+            created_by_identity__provider=self.provider,
+            created_by=F('created_by_identity__created_by'),
+            end_date__isnull=True
+        ).values_list('id', 'created_by_identity_id')
+        return {
+            instance_id
+            for instance_id, identity_id in open_instances
+            if identity_id in identity_ids
+        }
+
+    def open_histories(self, identity_ids):
+        """
+        All non-end-dated histories of instances owned by `identity_ids`,
+        keyed by instance id.
+        """
+        histories = InstanceStatusHistory.objects.filter(
+            instance__created_by_identity__provider=self.provider,
+            instance__created_by=F('instance__created_by_identity__created_by'),
+            end_date__isnull=True
+        ).select_related('status', 'instance')
+        history_map = {}
+        for history in histories:
+            if history.instance.created_by_identity_id not in identity_ids:
+                continue
+            history_map.setdefault(history.instance_id, []).append(history)
+        return history_map
+
+    def end_date_missing(self, missing_ids, end_date):
+        for chunk in _chunked(missing_ids, self.chunk_size):
+            self.stats.incr(
+                'histories_end_dated',
+                InstanceStatusHistory.objects.filter(
+                    instance__in=chunk, end_date__isnull=True
+                ).update(end_date=end_date)
+            )
+            self.stats.incr(
+                'instances_end_dated',
+                CoreInstance.objects.filter(
+                    id__in=chunk, end_date__isnull=True
+                ).update(end_date=end_date)
+            )
+
+    def resolve_conflicts(self, conflicts, reset_time):
+        """
+        conflicts - list of ((core_instance, identity), [open histories])
+        """
+        stale_ids = []
+        new_histories = []
+        for (core_instance, identity), bad_history in conflicts:
+            try:
+                new_history = _build_resolved_history(
+                    identity, core_instance, reset_time
+                )
+            except Exception:
+                logger.exception(
+                    "Could not resolve history conflict for %s" %
+                    core_instance.provider_alias
+                )
+                continue
+            logger.warn(
+                "Instance %s contained %s "
+                "NON END DATED history:%s. "
+                " New History: %s" % (
+                    core_instance.provider_alias, len(bad_history),
+                    [ish.status.name for ish in bad_history], new_history
+                )
+            )
+            stale_ids.extend(ish.id for ish in bad_history)
+            new_histories.append(new_history)
+        for chunk in _chunked(stale_ids, self.chunk_size):
+            InstanceStatusHistory.objects.filter(id__in=chunk
+                                                ).update(end_date=reset_time)
+        InstanceStatusHistory.objects.bulk_create(new_histories)
+        # bulk_create skips InstanceStatusHistory.save
+        for chunk in _chunked(
+            [history.instance_id for history in new_histories], self.chunk_size
+        ):
+            refresh_last_histories(chunk)
+        self.stats.incr('history_conflicts', len(new_histories))
+        return new_histories
+
+    def reconcile(self, instance_map):
+        """
+        instance_map - {tenant_name: [esh_instance, ...]} as returned by
+        `_get_instance_owner_map`
+        """
+        with self.stats.phase('load_identities'):
+            identity_map = self.identities_by_project_name()
+            reconciled_identities = {
+                identity_map[tenant_name]
+                for tenant_name in instance_map.keys()
+                if tenant_name in identity_map
+            }
+        self.stats.incr('tenants', len(instance_map))
+        self.stats.incr('identities', len(reconciled_identities))
+
+        with self.stats.phase('convert'):
+            running, failed_identity_ids = self.convert_running_instances(
+                instance_map, identity_map
+            )
+        identity_ids = {
+            identity.id
+            for identity in reconciled_identities
+            if identity.id not in failed_identity_ids
+        }
+
+        with self.stats.phase('load_db'):
+            open_instance_ids = self.open_instance_ids(identity_ids)
+            history_map = self.open_histories(identity_ids)
+
+        now_time = timezone.now()
+        with self.stats.phase('apply'):
+            missing_ids = (open_instance_ids |
+                           set(history_map.keys())) - set(running.keys())
+            self.end_date_missing(missing_ids, now_time)
+            conflicts = [
+                (running[instance_id], histories)
+                for instance_id, histories in history_map.items()
+                if instance_id in running and len(histories) > 1
+            ]
+            if conflicts:
+                self.resolve_conflicts(conflicts, now_time)
+        if missing_ids:
+            logger.warn(
+                "Cleaned up %s instances on %s" %
+                (len(missing_ids), self.provider)
+            )
+        return running
+
+
+class VolumeReconciler(object):
+    """
+    Reconcile the volumes recorded in the DB for a provider against
+    the volumes listed by the cloud.
+
+    The DB side is loaded once into indexes (volumes by identifier,
+    identities by 'ex_project_name') and the projects are listed once,
+    so a volume we have not seen before costs no Keystone call or
+    Identity query. Volumes the cloud no longer lists are end-dated
+    with bulk UPDATEs.
+    """
+    chunk_size = 500
+
+    def __init__(self, provider, account_driver, stats=None):
+        self.provider = provider
+        self.account_driver = account_driver
+        self.stats = stats or RunStats("reconcile_volumes", provider=provider)
+
+    def volumes_by_identifier(self):
+        volumes = Volume.objects.filter(
+            instance_source__provider=self.provider
+        ).select_related('instance_source')
+        return {volume.instance_source.identifier: volume for volume in volumes}
+
+    def create_volume(self, cloud_volume, identity_map, tenant_index):
+        """
+        Create the volume of the identity that owns `cloud_volume`'s
+        project (None if there is no such identity).
+        """
+        tenant_id = cloud_volume.extra['object']['os-vol-tenant-attr:tenant_id']
+        tenant = tenant_index.get(tenant_id)
+        if tenant is None:
+            logger.warn(
+                "Warning: tenant_id %s found on volume %s, "
+                "but did not exist from the account driver "
+                "perspective.", tenant_id, cloud_volume
+            )
+            tenant_name = tenant_id
+        else:
+            tenant_name = _tenant_name(tenant)
+        identity = identity_map.get(tenant_name) if tenant else None
+        if not identity:
+            logger.info(
+                "Skipping Volume %s - No Identity for: Provider:%s + Project Name:%s"
+                % (cloud_volume.id, self.provider, tenant_name)
+            )
+            return None
+        return convert_esh_volume(
+            cloud_volume, self.provider.uuid, identity.uuid, identity.created_by
+        )
+
+    def end_date_missing(self, seen_source_ids, end_date):
+        current_source_ids = Volume.objects.filter(
+            only_current_source(), instance_source__provider=self.provider
+        ).values_list(
+            'instance_source_id', flat=True
+        )
+        missing_ids = set(current_source_ids) - seen_source_ids
+        for chunk in _chunked(missing_ids, self.chunk_size):
+            self.stats.incr(
+                'volumes_end_dated',
+                InstanceSource.objects.filter(
+                    id__in=chunk, end_date__isnull=True
+                ).update(end_date=end_date)
+            )
+
+    def reconcile(self, cloud_volumes):
+        """
+        Returns the volumes (with `esh` set) listed by the cloud.
+        """
+        with self.stats.phase('load_db'):
+            known_volumes = self.volumes_by_identifier()
+            identity_map = identities_by_project_name(self.provider)
+        with self.stats.phase('list_projects'):
+            tenant_index = self.account_driver.get_tenant_index()
+        self.stats.incr('cloud_volumes', len(cloud_volumes))
+
+        seen_volumes = []
+        with self.stats.phase('convert'):
+            for cloud_volume in cloud_volumes:
+                volume = known_volumes.get(cloud_volume.id)
+                if volume:
+                    volume.esh = cloud_volume
+                    volume._update_history()
+                else:
+                    volume = self.create_volume(
+                        cloud_volume, identity_map, tenant_index
+                    )
+                    self.stats.incr(
+                        'volumes_created' if volume else 'volumes_skipped'
+                    )
+                if volume:
+                    seen_volumes.append(volume)
+        with self.stats.phase('end_date'):
+            self.end_date_missing(
+                {volume.instance_source_id
+                 for volume in seen_volumes}, timezone.now()
+            )
+        return seen_volumes
+
+
+class SizeReconciler(object):
+    """
+    Reconcile the sizes recorded in the DB for a provider against
+    the flavors listed by the cloud.
+
+    Every listed flavor is upserted in one transaction (changed sizes
+    are saved, new sizes bulk created) and the sizes whose alias is no
+    longer listed are end-dated with bulk UPDATEs. 'Unknown Size' rows
+    of private or disabled flavors (which are not listed) are resolved
+    from a single listing of every flavor.
+    """
+    chunk_size = 500
+
+    def __init__(self, provider, account_driver, stats=None):
+        self.provider = provider
+        self.account_driver = account_driver
+        self.stats = stats or RunStats("reconcile_sizes", provider=provider)
+
+    def sizes_by_alias(self):
+        sizes = {}
+        for size in Size.objects.filter(provider=self.provider):
+            sizes.setdefault(size.alias, []).append(size)
+        return sizes
+
+    def list_hidden_sizes(self, aliases):
+        """
+        The flavors (by alias) in `aliases` that are missing from the
+        provider's flavor listing.
+        """
+        if not aliases:
+            return {}
+        return {
+            cloud_size.id: cloud_size
+            for cloud_size in self.account_driver.list_all_sizes()
+            if cloud_size.id in aliases
+        }
+
+    def create_size(self, cloud_size):
+        return Size(
+            alias=cloud_size.id,
+            provider=self.provider,
+            name=cloud_size.name,
+            disk=cloud_size.disk,
+            root=cloud_size.ephemeral,
+            cpu=cloud_size.cpu,
+            mem=cloud_size.ram
+        )
+
+    def end_date_missing(self, known_sizes, seen_aliases, end_date):
+        missing_ids = [
+            size.id for alias in set(known_sizes) - seen_aliases
+            for size in known_sizes[alias]
+            if not size.end_date or size.end_date > end_date
+        ]
+        for chunk in _chunked(missing_ids, self.chunk_size):
+            self.stats.incr(
+                'sizes_end_dated',
+                Size.objects.filter(id__in=chunk).update(end_date=end_date)
+            )
+
+    def reconcile(self, cloud_sizes):
+        with self.stats.phase('load_db'):
+            known_sizes = self.sizes_by_alias()
+        listed_sizes = {cloud_size.id: cloud_size for cloud_size in cloud_sizes}
+        self.stats.incr('cloud_sizes', len(listed_sizes))
+        unknown_aliases = set(
+            size.alias for sizes in known_sizes.values()
+            for size in sizes if UNKNOWN_SIZE['name'] in size.name
+            and size.alias != UNKNOWN_SIZE['alias']
+        )
+        with self.stats.phase('list_hidden'):
+            hidden_sizes = self.list_hidden_sizes(
+                unknown_aliases - set(listed_sizes)
+            )
+
+        now_time = timezone.now()
+        with self.stats.phase('upsert'), transaction.atomic():
+            new_sizes = []
+            upserts = listed_sizes.items() + hidden_sizes.items()
+            for alias, cloud_size in upserts:
+                if alias not in known_sizes:
+                    new_sizes.append(self.create_size(cloud_size))
+                    continue
+                for size in known_sizes[alias]:
+                    changed = apply_cloud_size(size, cloud_size)
+                    if changed:
+                        size.save(update_fields=changed)
+                        self.stats.incr('sizes_updated')
+            Size.objects.bulk_create(new_sizes)
+            self.stats.incr('sizes_created', len(new_sizes))
+            self.end_date_missing(known_sizes, set(listed_sizes), now_time)
+        self.stats.incr('hidden_sizes', len(hidden_sizes))
 
 
 def _get_instance_owner_map(provider, users=None):
@@ -273,10 +595,13 @@ def _get_instance_owner_map(provider, users=None):
     all_instances = get_cached_instances(
         provider=provider, identity=account_identity, force=True
     )
-    #all_tenants = admin_driver._connection._keystone_list_tenants()
-    all_tenants = accounts.list_projects()
-    # Convert instance.owner from tenant-id to tenant-name all at once
-    all_instances = _convert_tenant_id_to_names(all_instances, all_tenants)
+    # Convert instance.owner from tenant-id to tenant-name all at once.
+    # NOTE: The project list is refreshed every run: a project missing from
+    # a stale copy would leave its identity with no instances, and
+    # the reconciler would end-date all of them.
+    all_instances = _convert_tenant_id_to_names(
+        all_instances, accounts.get_tenant_index(force=True)
+    )
     # Make a mapping of owner-to-instance
     instance_map = _make_instance_owner_map(all_instances, users=users)
     logger.info("Instance owner map created")
@@ -314,18 +639,19 @@ def get_delta(allocation, time_period, end_date=None):
 
 
 def filter_allocation_source_instances(allocation_source, user, esh_instances):
+    core_instances = CoreInstance.allocation_sources_for(
+        [inst.id for inst in esh_instances], user=user
+    )
     as_instances = []
     for inst in esh_instances:
-        core_instance = CoreInstance.objects.filter(
-            created_by=user, provider_alias=inst.id
-        ).first()
+        core_instance, instance_allocation_source = core_instances.get(
+            inst.id, (None, None)
+        )
         if not core_instance:
             logger.debug(
                 "Skipping Instance %s -- not included in DB." % inst.id
             )
             continue
-        assert isinstance(core_instance, CoreInstance)
-        instance_allocation_source = core_instance.allocation_source
         if not instance_allocation_source:
             logger.debug(
                 "Skipping Instance %s -- no allocation source set." % inst.id
@@ -369,18 +695,159 @@ def allocation_source_overage_enforcement_for(
     filtered_instances = filter_allocation_source_instances(
         allocation_source, user, esh_instances
     )
-    # TODO: Parallelize this operation so you don't wait for larger instances
-    # to finish 'wait_for' task below..
-    instances = []
-    for instance in filtered_instances:
-        core_instance = execute_provider_action(
+    results = enforce_allocation_on_instances(
+        user, driver, identity, filtered_instances, action
+    )
+    instances = [
+        result.core_instance for result in results if result.core_instance
+    ]
+    failures = [
+        (result.instance_id, result.error)
+        for result in results if result.outcome == 'failed'
+    ]
+    if failures:
+        raise EnforcementError(action.name, instances, failures)
+    return instances
+
+
+EnforcementResult = namedtuple(
+    'EnforcementResult',
+    ['instance_id', 'outcome', 'core_instance', 'latency', 'error']
+)
+
+DEFAULT_ENFORCEMENT_CONCURRENCY = 8
+DEFAULT_ENFORCEMENT_POLL_TIMEOUT = 120
+ENFORCEMENT_POLL_INITIAL_DELAY = 1
+ENFORCEMENT_POLL_MAX_DELAY = 15
+
+
+def _enforcement_concurrency(provider):
+    """
+    settings.ENFORCEMENT_CONCURRENCY is a dict of provider uuid (or
+    'default') -> the number of instances acted upon at the same time.
+    """
+    caps = getattr(settings, 'ENFORCEMENT_CONCURRENCY', {})
+    return max(
+        1,
+        caps.get(
+            str(provider.uuid),
+            caps.get('default', DEFAULT_ENFORCEMENT_CONCURRENCY)
+        )
+    )
+
+
+def enforce_allocation_on_instances(user, driver, identity, instances, action):
+    """
+    Execute the over-allocation `action` on every instance, at most
+    `_enforcement_concurrency(provider)` at a time. Each worker thread uses
+    its own driver (and database connection).
+
+    Returns an EnforcementResult per instance, in the original order.
+    Outcomes are 'enforced', 'skipped' (no longer active) or 'failed'.
+    """
+    provider = identity.provider
+    concurrency = min(_enforcement_concurrency(provider), len(instances))
+    if concurrency <= 1:
+        return [
+            _enforce_on_instance(user, driver, identity, instance, action)
+            for instance in instances
+        ]
+
+    thread_state = threading.local()
+
+    def enforce(instance):
+        try:
+            if not hasattr(thread_state, 'driver'):
+                thread_state.driver = get_esh_driver(identity)
+            return _enforce_on_instance(
+                user, thread_state.driver, identity, instance, action
+            )
+        finally:
+            # Connections are per-thread; don't leave this one open.
+            connection.close()
+
+    started = time.time()
+    pool = ThreadPool(concurrency)
+    try:
+        results = pool.map(enforce, instances)
+    finally:
+        pool.close()
+        pool.join()
+    logger.info(
+        "Over-allocation action %s on %s instances of %s (%s at a time) "
+        "took %.2fs: %s enforced, %s skipped, %s failed" % (
+            action.name, len(instances), user, concurrency, time.time() -
+            started, len([r for r in results if r.outcome == 'enforced']),
+            len([r for r in results if r.outcome == 'skipped']),
+            len([r for r in results if r.outcome == 'failed'])
+        )
+    )
+    return results
+
+
+def _enforce_on_instance(user, driver, identity, instance, action):
+    started = time.time()
+    try:
+        outcome, core_instance = _apply_provider_action(
             user, driver, identity, instance, action
         )
-        instances.append(core_instance)
-    return instances
+        error = None
+    except Exception as exc:
+        logger.exception(
+            "Over-allocation action %s failed on instance %s" %
+            (action.name, instance.id)
+        )
+        core_instance = None
+        outcome = 'failed'
+        error = "%s" % exc
+    latency = time.time() - started
+    logger.debug(
+        "Over-allocation action %s on instance %s: %s in %.2fs" %
+        (action.name, instance.id, outcome, latency)
+    )
+    return EnforcementResult(
+        instance.id, outcome, core_instance, latency, error
+    )
+
+
+def _is_settled(driver, esh_instance):
+    return not esh_instance.extra.get('task') and \
+        not driver._is_active_instance(esh_instance)
+
+
+def _wait_for_settled_instance(driver, instance_id):
+    """
+    Poll the cloud, backing off exponentially, until the instance has
+    left the 'active' state and has no task in progress (or until
+    settings.ENFORCEMENT_POLL_TIMEOUT seconds have passed).
+    Returns the last copy of the instance fetched from the cloud.
+    """
+    deadline = time.time() + getattr(
+        settings, 'ENFORCEMENT_POLL_TIMEOUT', DEFAULT_ENFORCEMENT_POLL_TIMEOUT
+    )
+    delay = ENFORCEMENT_POLL_INITIAL_DELAY
+    while True:
+        time.sleep(delay)
+        esh_instance = driver.get_instance(instance_id)
+        if not esh_instance or _is_settled(driver, esh_instance) \
+                or time.time() + delay >= deadline:
+            return esh_instance
+        delay = min(delay * 2, ENFORCEMENT_POLL_MAX_DELAY)
 
 
 def execute_provider_action(user, driver, identity, instance, action):
+    _, core_instance = _apply_provider_action(
+        user, driver, identity, instance, action
+    )
+    return core_instance
+
+
+def _apply_provider_action(user, driver, identity, instance, action):
+    """
+    Returns (outcome, core_instance): the outcome is 'enforced' when the
+    action was executed (a terminated instance has no core_instance) and
+    'skipped' when the instance was no longer active.
+    """
     logger.debug(
         'execute_provider_action - user: %s, driver: %s, identity: %s, instance: %s, action: %s',
         user, driver, identity, instance, action
@@ -391,20 +858,15 @@ def execute_provider_action(user, driver, identity, instance, action):
             # NOTE: identity.created_by COULD BE the Admin User, indicating that this action/InstanceHistory was
             #       executed by the administrator.. Future Release Idea.
             _execute_provider_action(
-                identity, identity.created_by, instance, action.name
+                identity, identity.created_by, instance, action.name, driver
             )
-            # NOTE: Intentionally added to allow time for
-            #      the Cloud to begin 'suspend' operation
-            #      before querying for the instance again.
-            # TODO: Instead: Add "wait_for" change from active to any
-            # terminal, non-active state?
-            wait_time = random.uniform(2, 6)
-            time.sleep(wait_time)
-            updated_esh = driver.get_instance(instance.id)
+            updated_esh = _wait_for_settled_instance(driver, instance.id)
+            if not updated_esh:
+                return 'enforced', None
             core_instance = convert_esh_instance(
                 driver, updated_esh, identity.provider.uuid, identity.uuid, user
             )
-            return core_instance
+            return 'enforced', core_instance
         else:
             logger.debug(
                 '_is_active_instance is False, so not calling _execute_provider_action for instance %s',
@@ -418,3 +880,4 @@ def execute_provider_action(user, driver, identity, instance, action):
         if 'in vm_state' not in e.message:
             logger.exception('execute_provider_action failed')
             raise
+    return 'skipped', None
@@ -1,29 +1,197 @@
+import threading
+
 from threepio import logger
 
 from django.core.exceptions import ValidationError
+from django.db import connection
 
 from core.models import IdentityMembership, Identity
 from core.models.quota import (
     has_floating_ip_count_quota, has_port_count_quota, has_instance_count_quota,
     has_cpu_quota, has_mem_quota, has_storage_quota, has_storage_count_quota,
-    has_snapshot_count_quota
+    has_snapshot_count_quota, list_quota_instances, list_quota_fixed_ips
 )
 from service.cache import get_cached_driver
 from service.driver import get_account_driver
 
+# The Quota fields that require each cloud listing
+QUOTA_LISTINGS = {
+    'instances': ('cpu', 'memory', 'instance_count'),
+    'floating_ips': ('floating_ip_count', ),
+    'fixed_ips': ('port_count', ),
+    'volumes': ('storage', 'storage_count'),
+    'snapshots': ('snapshot_count', ),
+}
+INSTANCE_LISTINGS = ('instances', 'floating_ips', 'fixed_ips')
+STORAGE_LISTINGS = ('volumes', 'snapshots')
+
+
+class QuotaSnapshot(object):
+    """
+    The cloud resources of one identity, as seen by a single quota check.
+
+    Every cloud listing is fetched at most once (and only if the quota
+    limits it), then shared by every quota dimension that counts it.
+    The compute/volume listings share the (non thread-safe) connection of
+    `driver` and are listed in turn, while the ports are listed through
+    the network driver at the same time.
+    """
+
+    def __init__(self, identity, driver=None):
+        self.identity = identity
+        self.quota = identity.quota
+        self.driver = driver or get_cached_driver(identity=identity)
+        self.listings = {}
+        # Listings that could not be fetched (and are not enforced)
+        self.unavailable = set()
+
+    def _list_instances(self):
+        return list_quota_instances(self.driver)
+
+    def _list_floating_ips(self):
+        return self.driver._connection.ex_list_floating_ips()
+
+    def _list_volumes(self):
+        return self.driver.list_volumes()
+
+    def _list_snapshots(self):
+        return self.driver._connection.ex_list_snapshots()
+
+    def _list_fixed_ips(self):
+        try:
+            return list_quota_fixed_ips(self.identity)
+        except Exception as exc:
+            logger.warn(
+                "Could not verify quota due to failed call to network_driver.list_ports() - %s"
+                % exc
+            )
+            self.unavailable.add('fixed_ips')
+            return None
+
+    def is_limited(self, name):
+        return bool(self.quota) and any(
+            getattr(self.quota, field) for field in QUOTA_LISTINGS[name]
+        )
+
+    def _fetch_in_thread(self, name):
+        try:
+            self.listing(name)
+        finally:
+            # Release the database connection opened by this thread
+            connection.close()
+
+    def listing(self, name):
+        """
+        Return the listing `name`, fetching it on first use.
+        """
+        if name not in self.listings:
+            self.listings[name] = getattr(self, '_list_%s' % name)()
+        return self.listings[name]
+
+    def prefetch(self, names):
+        """
+        Fetch every listing in `names` that the quota limits.
+        """
+        names = [
+            name for name in names
+            if name not in self.listings and self.is_limited(name)
+        ]
+        network_thread = None
+        if 'fixed_ips' in names:
+            names.remove('fixed_ips')
+            network_thread = threading.Thread(
+                target=self._fetch_in_thread, args=('fixed_ips', )
+            )
+            network_thread.start()
+        try:
+            for name in names:
+                self.listing(name)
+        finally:
+            if network_thread:
+                network_thread.join()
+
+    def check_instance_quota(self, esh_size=None, include_networking=False):
+        """
+        Raise ValidationError if launching an instance of `esh_size`
+        (with a floating IP, if `include_networking`) would exceed the quota.
+        """
+        new_port = new_floating_ip = new_instance = new_cpu = new_ram = 0
+        if esh_size:
+            new_cpu += esh_size.cpu
+            new_ram += esh_size.ram
+            new_instance += 1
+            new_port += 1
+        if include_networking:
+            new_floating_ip += 1
+        self.prefetch(INSTANCE_LISTINGS)
+        driver, quota = self.driver, self.quota
+        instances = self.listings.get('instances')
+        has_cpu_quota(driver, quota, new_cpu, instances=instances)
+        has_mem_quota(driver, quota, new_ram, instances=instances)
+        has_instance_count_quota(
+            driver, quota, new_instance, instances=instances
+        )
+        has_floating_ip_count_quota(
+            driver,
+            quota,
+            new_floating_ip,
+            floating_ips=self.listings.get('floating_ips')
+        )
+        if 'fixed_ips' not in self.unavailable:
+            has_port_count_quota(
+                self.identity,
+                driver,
+                quota,
+                new_port,
+                fixed_ips=self.listings.get('fixed_ips')
+            )
+
+    def check_storage_quota(self, new_disk=0, new_volume=0, new_snapshot=0):
+        """
+        Raise ValidationError if `new_disk` GB more storage, `new_volume`
+        more volumes or `new_snapshot` more snapshots would exceed the quota.
+        """
+        self.prefetch(STORAGE_LISTINGS)
+        driver, quota = self.driver, self.quota
+        volumes = self.listings.get('volumes')
+        has_storage_quota(driver, quota, new_disk, volumes=volumes)
+        has_storage_count_quota(driver, quota, new_volume, volumes=volumes)
+        has_snapshot_count_quota(
+            driver,
+            quota,
+            new_snapshot,
+            snapshots=self.listings.get('snapshots')
+        )
+
+
+def get_quota_snapshot(username, identity_uuid, driver=None):
+    """
+    Return a QuotaSnapshot of the identity `identity_uuid`
+    (as a member of it, `username`)
+    """
+    memberships_available = IdentityMembership.objects.filter(
+        identity__uuid=identity_uuid,
+        member__memberships__user__username=username
+    )
+    if memberships_available:
+        membership = memberships_available.first()
+    return QuotaSnapshot(membership.identity, driver=driver)
+
 
 def check_over_instance_quota(
     username,
     identity_uuid,
     esh_size=None,
     include_networking=False,
-    raise_exc=True
+    raise_exc=True,
+    quota_snapshot=None
 ):
     """
     Checks quota based on current limits (and an instance of size, if passed).
     param - esh_size - if included, update the CPU and Memory totals & increase instance_count
     param - launch_networking - if True, increase floating_ip_count
     param - raise_exc - if True, raise ValidationError, otherwise return False
+    param - quota_snapshot - if included, re-use its cloud listings
 
     return True if passing
     return False if ValidationError occurs and raise_exc=False
@@ -31,30 +199,13 @@ def check_over_instance_quota(
 
     return or raise exc
     """
-    memberships_available = IdentityMembership.objects.filter(
-        identity__uuid=identity_uuid,
-        member__memberships__user__username=username
-    )
-    if memberships_available:
-        membership = memberships_available.first()
-    identity = membership.identity
-    quota = identity.quota
-    driver = get_cached_driver(identity=identity)
-    new_port = new_floating_ip = new_instance = new_cpu = new_ram = 0
-    if esh_size:
-        new_cpu += esh_size.cpu
-        new_ram += esh_size.ram
-        new_instance += 1
-        new_port += 1
-    if include_networking:
-        new_floating_ip += 1
+    if not quota_snapshot:
+        quota_snapshot = get_quota_snapshot(username, identity_uuid)
     # Will throw ValidationError if false.
     try:
-        has_cpu_quota(driver, quota, new_cpu)
-        has_mem_quota(driver, quota, new_ram)
-        has_instance_count_quota(driver, quota, new_instance)
-        has_floating_ip_count_quota(driver, quota, new_floating_ip)
-        has_port_count_quota(identity, driver, quota, new_port)
+        quota_snapshot.check_instance_quota(
+            esh_size, include_networking=include_networking
+        )
         return True
     except ValidationError:
         if raise_exc:
@@ -67,27 +218,22 @@ def check_over_storage_quota(
     identity_uuid,
     new_snapshot_size=0,
     new_volume_size=0,
-    raise_exc=True
+    raise_exc=True,
+    quota_snapshot=None
 ):
     """
     Checks quota based on current limits.
     param - new_snapshot_size - if included and non-zero, increase snapshot_count
     param - new_volume_size - if included and non-zero, add to storage total & increase storage_count
     param - raise_exc - if True, raise ValidationError, otherwise return False
+    param - quota_snapshot - if included, re-use its cloud listings
 
     return True if passing
     return False if ValidationError occurs and raise_exc=False
     By default, allow ValidationError to raise.
     """
-    memberships_available = IdentityMembership.objects.filter(
-        identity__uuid=identity_uuid,
-        member__memberships__user__username=username
-    )
-    if memberships_available:
-        membership = memberships_available.first()
-    identity = membership.identity
-    quota = identity.quota
-    driver = get_cached_driver(identity=identity)
+    if not quota_snapshot:
+        quota_snapshot = get_quota_snapshot(username, identity_uuid)
 
     # FIXME: I don't believe that 'snapshot' size and 'volume' size share
     # the same quota, so for now we ignore 'snapshot-size',
@@ -98,9 +244,7 @@ def check_over_storage_quota(
     new_volume = 1 if new_volume_size > 0 else 0
     # Will throw ValidationError if false.
     try:
-        has_storage_quota(driver, quota, new_disk)
-        has_storage_count_quota(driver, quota, new_volume)
-        has_snapshot_count_quota(driver, quota, new_snapshot)
+        quota_snapshot.check_storage_quota(new_disk, new_volume, new_snapshot)
         return True
     except ValidationError:
         if raise_exc:
@@ -0,0 +1,141 @@
+"""
+Lightweight per-run statistics for periodic (monitoring) tasks.
+
+Usage:
+    stats = RunStats("monitor_instances_for", provider=provider)
+    with stats:
+        with stats.phase("convert"):
+            ...
+        stats.incr("instances_end_dated", 12)
+    stats.log(celery_logger)
+    return stats.report()
+
+Queries are only counted when settings.DEBUG (or RUN_STATS_COUNT_QUERIES)
+is True: counting relies on the debug cursor, which records the SQL of
+every query.
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+
+class _QueryCountLog(object):
+    """
+    Stand-in for `connection.queries_log` that counts every query executed
+    while it is installed. Entries are forwarded to the log it replaced, so
+    DEBUG logging (and nested counters) keep working.
+    """
+
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+        self.count = 0
+
+    def append(self, entry):
+        self.count += 1
+        self.wrapped.append(entry)
+
+    def clear(self):
+        self.wrapped.clear()
+
+    def __iter__(self):
+        return iter(self.wrapped)
+
+    def __len__(self):
+        return len(self.wrapped)
+
+
+def _count_queries():
+    return settings.DEBUG or getattr(settings, 'RUN_STATS_COUNT_QUERIES', False)
+
+
+class RunStats(object):
+    """
+    Collects counters (rows touched), per-phase wall time and the number of
+    database queries (None, unless counted) issued during a single task run.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.counters = OrderedDict()
+        self.phases = OrderedDict()
+        self.wall_time = None
+        self._started = None
+        self._query_log = None
+        self._previous_log = None
+        self._previous_force_debug = None
+
+    def __enter__(self):
+        self._started = time.time()
+        if not _count_queries():
+            return self
+        self._previous_log = connection.queries_log
+        self._previous_force_debug = connection.force_debug_cursor
+        self._query_log = _QueryCountLog(self._previous_log)
+        connection.queries_log = self._query_log
+        connection.force_debug_cursor = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._query_log is not None:
+            connection.queries_log = self._previous_log
+            connection.force_debug_cursor = self._previous_force_debug
+        self.wall_time = time.time() - self._started
+        return False
+
+    @property
+    def queries(self):
+        if self._query_log is None:
+            return None
+        return self._query_log.count
+
+    def incr(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+        return self.counters[counter]
+
+    @contextmanager
+    def phase(self, phase_name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.phases[phase_name] = self.phases.get(
+                phase_name, 0
+            ) + (time.time() - started)
+
+    def report(self):
+        """
+        Return a (picklable) dict describing this run.
+        """
+        report = OrderedDict()
+        report['name'] = self.name
+        for key, value in self.labels.items():
+            report[key] = "%s" % value
+        report['wall_time'] = round(self.wall_time or 0, 3)
+        report['queries'] = self.queries
+        report['phases'] = OrderedDict(
+            (phase_name, round(elapsed, 3))
+            for phase_name, elapsed in self.phases.items()
+        )
+        report.update(self.counters)
+        return dict(report)
+
+    def log(self, logger):
+        counters = ", ".join(
+            "%s=%s" % (key, value) for key, value in self.counters.items()
+        )
+        phases = ", ".join(
+            "%s=%.3fs" % (key, value) for key, value in self.phases.items()
+        )
+        queries = "" if self.queries is None else \
+            " with %s queries" % self.queries
+        logger.info(
+            "%s %s completed in %.3fs%s. Counts: [%s] Phases: [%s]" % (
+                self.name, ", ".join(
+                    "%s=%s" % (k, v) for k, v in self.labels.items()
+                ), self.wall_time or 0, queries, counters, phases
+            )
+        )
@@ -1,27 +1,30 @@
 from datetime import timedelta
 
 from django.conf import settings
-from django.db.models import Q, Count
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from celery import group as celery_group
 from celery.decorators import task
 
 from core.plugins import MachineValidationPluginManager, AllocationSourcePluginManager, EnforcementOverrideChoice
 from core.query import (
-    contains_credential, only_current, only_current_source, source_in_range,
-    inactive_versions
+    only_current, only_current_source, source_in_range, inactive_versions
 )
 from core.models.group import Group
-from core.models.size import Size, convert_esh_size
-from core.models.volume import Volume, convert_esh_volume
-from core.models.instance import convert_esh_instance
 from core.models.provider import Provider
 from core.models.machine import convert_glance_image, ProviderMachine, ProviderMachineMembership
 from core.models.machine_request import MachineRequest
 from core.models.application import Application, ApplicationMembership
-from core.models.allocation_source import AllocationSource
-from core.models.application_version import ApplicationVersion
+from core.models.image_visibility import refresh_application_visibility
+from core.models.allocation_source import (
+    UserAllocationSource, find_over_allocation
+)
+from core.models.application_version import (
+    ApplicationVersion, ApplicationVersionMembership
+)
+from core.models.instance_source import InstanceSource
 from core.models import Credential
 
 from service.machine import (
@@ -29,15 +32,13 @@ from service.machine import (
     remove_membership
 )
 from service.monitoring import (
-    _cleanup_missing_instances, _get_instance_owner_map,
-    _get_identity_from_tenant_name, allocation_source_overage_enforcement_for
+    InstanceReconciler, SizeReconciler, VolumeReconciler,
+    _get_instance_owner_map, allocation_source_overage_enforcement_for
 )
 from service.driver import get_account_driver
-from service.cache import get_cached_driver
-from service.exceptions import TimeoutError
-from rtwo.models.size import OSSize
+from service.exceptions import EnforcementError, TimeoutError
+from service.run_stats import RunStats
 from rtwo.exceptions import GlanceConflict, GlanceForbidden
-from libcloud.common.exceptions import BaseHTTPError
 
 from threepio import celery_logger
 
@@ -78,8 +79,10 @@ def tenant_id_to_name_map(account_driver):
     Get a list of projects
     OUTPUT: A dictionary with keys of ID and values of name
     """
-    all_projects = account_driver.list_projects()
-    return {tenant.id: tenant.name for tenant in all_projects}
+    return {
+        tenant_id: tenant.name
+        for tenant_id, tenant in account_driver.get_tenant_index().items()
+    }
 
 
 @task(name="prune_machines")
@@ -115,61 +118,79 @@ def prune_machines_for(
     celery_logger.info(
         "Starting prune_machines for Provider %s @ %s" % (provider, now)
     )
+    stats = RunStats("prune_machines_for", provider=provider)
+    with stats:
+        with stats.phase('list_cloud'):
+            if provider.is_active():
+                account_driver = get_account_driver(provider)
+                db_machines = ProviderMachine.objects.filter(
+                    only_current_source(), instance_source__provider=provider
+                )
+                cloud_machines = account_driver.list_all_images()
+            else:
+                # like 'only_current..' w/o active_provider
+                db_machines = ProviderMachine.objects.filter(
+                    source_in_range(), instance_source__provider=provider
+                )
+                cloud_machines = []
 
-    if provider.is_active():
-        account_driver = get_account_driver(provider)
-        db_machines = ProviderMachine.objects.filter(
-            only_current_source(), instance_source__provider=provider
-        )
-        cloud_machines = account_driver.list_all_images()
-    else:
-        db_machines = ProviderMachine.objects.filter(
-            source_in_range(),    # like 'only_current..' w/o active_provider
-            instance_source__provider=provider
-        )
-        cloud_machines = []
-
-    machine_validator = MachineValidationPluginManager.get_validator(
-        account_driver
-    )
-    cloud_machines = [
-        cloud_machine for cloud_machine in cloud_machines
-        if not validate or machine_validator.machine_is_valid(cloud_machine)
-    ]
-
-    # Don't do anything if cloud machines == [None,[]]
-    if not cloud_machines and not forced_removal:
-        return
-
-    # Loop 1 - End-date All machines in the DB that
-    # can NOT be found in the cloud.
-    mach_count = _end_date_missing_database_machines(
-        db_machines, cloud_machines, now=now, dry_run=dry_run
-    )
-
-    # Loop 2 and 3 - Capture all (still-active) versions without machines,
-    # and all applications without versions.
-    # These are 'outliers' and mainly here for safety-check purposes.
-    ver_count = _remove_versions_without_machines(now=now)
-    app_count = _remove_applications_without_versions(now=now)
-
-    # Loop 4 - All 'Application' DB objects require
-    # >=1 Version with >=1 ProviderMachine (ACTIVE!)
-    # Apps that don't meet this criteria should be end-dated.
-    app_count += _update_improperly_enddated_applications(now)
+            machine_validator = MachineValidationPluginManager.get_validator(
+                account_driver
+            )
+            cloud_machines = [
+                cloud_machine
+                for cloud_machine in cloud_machines if not validate
+                or machine_validator.machine_is_valid(cloud_machine)
+            ]
+        stats.incr('cloud_machines', len(cloud_machines))
+
+        # Don't do anything if cloud machines == [None,[]]
+        if not cloud_machines and not forced_removal:
+            return
 
-    # Clear out application, provider machine, and version memberships
-    # if the result is >128.
-    # Additionally, remove all users who are not in the machine request (if one exists).
-    _clean_memberships(db_machines, account_driver)
+        # Loop 1 - End-date All machines in the DB that
+        # can NOT be found in the cloud.
+        with stats.phase('end_date_machines'):
+            (mach_count, ver_count,
+             app_count) = _end_date_missing_database_machines(
+                 db_machines, cloud_machines, now=now, dry_run=dry_run
+             )
+
+        # Loop 2 and 3 - Capture all (still-active) versions without machines,
+        # and all applications without versions.
+        # These are 'outliers' and mainly here for safety-check purposes.
+        with stats.phase('end_date_outliers'):
+            ver_count += _remove_versions_without_machines(now=now)
+            app_count += _remove_applications_without_versions(now=now)
+
+            # Loop 4 - All 'Application' DB objects require
+            # >=1 Version with >=1 ProviderMachine (ACTIVE!)
+            # Apps that don't meet this criteria should be end-dated.
+            app_count += _update_improperly_enddated_applications(now)
+
+        # Clear out application, provider machine, and version memberships
+        # if the result is >128.
+        # Additionally, remove all users who are not in the machine request (if one exists).
+        with stats.phase('clean_memberships'):
+            stats.incr(
+                'memberships_cleaned',
+                _clean_memberships(
+                    db_machines, account_driver, dry_run=dry_run
+                )
+            )
+        stats.incr('machines_pruned', mach_count)
+        stats.incr('versions_pruned', ver_count)
+        stats.incr('applications_pruned', app_count)
 
     celery_logger.info(
         "prune_machines completed for Provider %s : "
         "%s Applications, %s versions and %s machines pruned." %
         (provider, app_count, ver_count, mach_count)
     )
+    stats.log(celery_logger)
     if print_logs:
         _exit_stdout_logging(console_handler)
+    return stats.report()
 
 
 @task(name="monitor_machines")
@@ -673,60 +694,79 @@ def monitor_allocation_sources(usernames=()):
     Monitor allocation sources, if a snapshot shows that all compute has been used, then enforce as necessary
     """
     celery_logger.debug('monitor_allocation_sources - usernames: %s', usernames)
-    allocation_sources = AllocationSource.objects.all()
-    for allocation_source in allocation_sources.order_by('name'):
-        celery_logger.debug(
-            'monitor_allocation_sources - allocation_source: %s',
-            allocation_source
-        )
-        for user in allocation_source.all_users.order_by('username'):
-            celery_logger.debug('monitor_allocation_sources - user: %s', user)
-            if usernames and user.username not in usernames:
-                celery_logger.info(
-                    "Skipping User %s - not in the list" % user.username
+    stats = RunStats("monitor_allocation_sources")
+    with stats:
+        with stats.phase("evaluate"):
+            user_allocation_sources = UserAllocationSource.objects.all()
+            if usernames:
+                user_allocation_sources = user_allocation_sources.filter(
+                    user__username__in=usernames
                 )
-                continue
-            over_allocation = allocation_source.is_over_allocation(user)
-            celery_logger.debug(
-                'monitor_allocation_sources - user: %s, over_allocation: %s',
-                user, over_allocation
+            over_allocation = find_over_allocation(user_allocation_sources)
+            pairs = [
+                (
+                    user_allocation_source.user,
+                    user_allocation_source.allocation_source
+                ) for user_allocation_source in user_allocation_sources.
+                select_related('user', 'allocation_source').
+                order_by('allocation_source__name', 'user__username')
+            ]
+            stats.incr("evaluated", len(pairs))
+        with stats.phase("overrides"):
+            overrides = AllocationSourcePluginManager.get_enforcement_overrides(
+                pairs
             )
+        enforce = []
+        for user, allocation_source in pairs:
+            key = (user.id, allocation_source.id)
+            if _should_enforce(
+                allocation_source, user, over_allocation[key], overrides[key]
+            ):
+                enforce.append(
+                    allocation_source_overage_enforcement_for_user.signature(
+                        args=(allocation_source, user)
+                    )
+                )
+        stats.incr("enforced", len(enforce))
+        if enforce:
+            with stats.phase("dispatch"):
+                celery_group(enforce).apply_async()
+    stats.log(celery_logger)
+    return stats.report()
 
-            enforcement_override_choice = AllocationSourcePluginManager.get_enforcement_override(
-                user, allocation_source
-            )
-            celery_logger.debug(
-                'monitor_allocation_sources - enforcement_override_choice: %s',
-                enforcement_override_choice
-            )
 
-            if over_allocation and enforcement_override_choice == EnforcementOverrideChoice.NEVER_ENFORCE:
-                celery_logger.debug(
-                    'Allocation source is over allocation, but %s + user %s has an override of %s, '
-                    'therefore not enforcing', allocation_source, user,
-                    enforcement_override_choice
-                )
-                continue
+def _should_enforce(
+    allocation_source, user, over_allocation, enforcement_override_choice
+):
+    celery_logger.debug(
+        'monitor_allocation_sources - user: %s, allocation_source: %s, over_allocation: %s, '
+        'enforcement_override_choice: %s', user, allocation_source,
+        over_allocation, enforcement_override_choice
+    )
+    if over_allocation and enforcement_override_choice == EnforcementOverrideChoice.NEVER_ENFORCE:
+        celery_logger.debug(
+            'Allocation source is over allocation, but %s + user %s has an override of %s, '
+            'therefore not enforcing', allocation_source, user,
+            enforcement_override_choice
+        )
+        return False
 
-            if not over_allocation and enforcement_override_choice == EnforcementOverrideChoice.ALWAYS_ENFORCE:
-                celery_logger.debug(
-                    'Allocation source is not over allocation, but %s + user %s has an override of %s, '
-                    'therefore enforcing', allocation_source, user,
-                    enforcement_override_choice
-                )
-                # Note: The enforcing happens in the next `if` statement.
-            if over_allocation or enforcement_override_choice == EnforcementOverrideChoice.ALWAYS_ENFORCE:
-                assert enforcement_override_choice in (
-                    EnforcementOverrideChoice.NO_OVERRIDE,
-                    EnforcementOverrideChoice.ALWAYS_ENFORCE
-                )
-                celery_logger.debug(
-                    'monitor_allocation_sources - Going to enforce on user: %s',
-                    user
-                )
-                allocation_source_overage_enforcement_for_user.apply_async(
-                    args=(allocation_source, user)
-                )
+    if not over_allocation and enforcement_override_choice == EnforcementOverrideChoice.ALWAYS_ENFORCE:
+        celery_logger.debug(
+            'Allocation source is not over allocation, but %s + user %s has an override of %s, '
+            'therefore enforcing', allocation_source, user,
+            enforcement_override_choice
+        )
+    if over_allocation or enforcement_override_choice == EnforcementOverrideChoice.ALWAYS_ENFORCE:
+        assert enforcement_override_choice in (
+            EnforcementOverrideChoice.NO_OVERRIDE,
+            EnforcementOverrideChoice.ALWAYS_ENFORCE
+        )
+        celery_logger.debug(
+            'monitor_allocation_sources - Going to enforce on user: %s', user
+        )
+        return True
+    return False
 
 
 @task(name="allocation_source_overage_enforcement_for_user")
@@ -746,6 +786,12 @@ def allocation_source_overage_enforcement_for_user(allocation_source, user):
                 allocation_source, user, identity
             )
             user_instances.extend(affected_instances)
+        except EnforcementError as exc:
+            user_instances.extend(exc.instances)
+            celery_logger.error(
+                'allocation_source_overage_enforcement_for allocation_source: %s, user: %s, and identity: %s - %s',
+                allocation_source, user, identity, exc
+            )
         except Exception:
             celery_logger.exception(
                 'allocation_source_overage_enforcement_for allocation_source: %s, user: %s, and identity: %s',
@@ -769,43 +815,25 @@ def monitor_instances_for(
     # For now, lets just ignore everything that isn't openstack.
     if 'openstack' not in provider.type.name.lower():
         return
-    instance_map = _get_instance_owner_map(provider, users=users)
 
     if print_logs:
         console_handler = _init_stdout_logging()
-    seen_instances = []
     # DEVNOTE: Potential slowdown running multiple functions
     # Break this out when instance-caching is enabled
     if not settings.ENFORCING:
         celery_logger.debug('Settings dictate allocations are NOT enforced')
-    for tenant_name in sorted(instance_map.keys()):
-        running_instances = instance_map[tenant_name]
-        identity = _get_identity_from_tenant_name(provider, tenant_name)
-        if identity and running_instances:
-            try:
-                driver = get_cached_driver(identity=identity)
-                core_running_instances = [
-                    convert_esh_instance(
-                        driver, inst, identity.provider.uuid, identity.uuid,
-                        identity.created_by
-                    ) for inst in running_instances
-                ]
-                seen_instances.extend(core_running_instances)
-            except Exception:
-                celery_logger.exception(
-                    "Could not convert running instances for %s" % tenant_name
-                )
-                continue
-        else:
-            # No running instances.
-            core_running_instances = []
+    stats = RunStats("monitor_instances_for", provider=provider)
+    with stats:
+        with stats.phase('list_cloud'):
+            instance_map = _get_instance_owner_map(provider, users=users)
         # Using the 'known' list of running instances, cleanup the DB
-        _cleanup_missing_instances(identity, core_running_instances)
+        InstanceReconciler(provider, stats=stats).reconcile(instance_map)
+    stats.log(celery_logger)
     if print_logs:
         _exit_stdout_logging(console_handler)
-    # return seen_instances  NOTE: this has been commented out to avoid PicklingError!
-    # TODO: Uncomment the above, Determine what _we can return_ and return that instead....
-    return
+    # NOTE: Only the run statistics are returned, returning the
+    # (esh-enabled) instances would raise a PicklingError.
+    return stats.report()
 
 
 @task(name="monitor_volumes")
@@ -820,74 +848,28 @@ def monitor_volumes():
 @task(name="monitor_volumes_for")
 def monitor_volumes_for(provider_id, print_logs=False):
     """
-    Run the set of tasks related to monitoring sizes for a provider.
-    Optionally, provide a list of usernames to monitor
+    Run the set of tasks related to monitoring volumes for a provider.
     While debugging, print_logs=True can be very helpful.
-    start_date and end_date allow you to search a 'non-standard' window of time.
+    Returns the statistics of the run.
     """
-    from service.driver import get_account_driver
-    from core.models import Identity
     if print_logs:
         console_handler = _init_stdout_logging()
 
     provider = Provider.objects.get(id=provider_id)
-    account_driver = get_account_driver(provider)
-    # Non-End dated volumes on this provider
-    db_volumes = Volume.objects.filter(
-        only_current_source(), instance_source__provider=provider
-    )
-    all_volumes = account_driver.admin_driver.list_all_volumes(timeout=30)
-    seen_volumes = []
-    for cloud_volume in all_volumes:
-        try:
-            core_volume = convert_esh_volume(
-                cloud_volume, provider_uuid=provider.uuid
+    stats = RunStats("monitor_volumes_for", provider=provider)
+    with stats:
+        account_driver = get_account_driver(provider)
+        with stats.phase('list_cloud'):
+            cloud_volumes = account_driver.admin_driver.list_all_volumes(
+                timeout=30
             )
-            seen_volumes.append(core_volume)
-        except ObjectDoesNotExist:
-            tenant_id = cloud_volume.extra['object'][
-                'os-vol-tenant-attr:tenant_id']
-            tenant = account_driver.get_project_by_id(tenant_id)
-            tenant_name = tenant.name if tenant else tenant_id
-            try:
-                if not tenant:
-                    celery_logger.warn(
-                        "Warning: tenant_id %s found on volume %s, "
-                        "but did not exist from the account driver "
-                        "perspective.", tenant_id, cloud_volume
-                    )
-                    raise ObjectDoesNotExist()
-                identity = Identity.objects.filter(
-                    contains_credential('ex_project_name', tenant_name),
-                    provider=provider
-                ).first()
-                if not identity:
-                    raise ObjectDoesNotExist()
-                core_volume = convert_esh_volume(
-                    cloud_volume, provider.uuid, identity.uuid,
-                    identity.created_by
-                )
-            except ObjectDoesNotExist:
-                celery_logger.info(
-                    "Skipping Volume %s - No Identity for: Provider:%s + Project Name:%s"
-                    % (cloud_volume.id, provider, tenant_name)
-                )
-            pass
-
-    now_time = timezone.now()
-    needs_end_date = [
-        volume for volume in db_volumes if volume not in seen_volumes
-    ]
-    for volume in needs_end_date:
-        celery_logger.debug("End dating inactive volume: %s" % volume)
-        volume.end_date = now_time
-        volume.save()
-
+        VolumeReconciler(
+            provider, account_driver, stats=stats
+        ).reconcile(cloud_volumes)
+    stats.log(celery_logger)
     if print_logs:
         _exit_stdout_logging(console_handler)
-    for vol in seen_volumes:
-        vol.esh = None
-    return [vol.instance_source.identifier for vol in seen_volumes]
+    return stats.report()
 
 
 @task(name="monitor_sizes")
@@ -903,119 +885,200 @@ def monitor_sizes():
 def monitor_sizes_for(provider_id, print_logs=False):
     """
     Run the set of tasks related to monitoring sizes for a provider.
-    Optionally, provide a list of usernames to monitor
     While debugging, print_logs=True can be very helpful.
-    start_date and end_date allow you to search a 'non-standard' window of time.
+    Returns the statistics of the run.
     """
-    from service.driver import get_admin_driver
-
     if print_logs:
         console_handler = _init_stdout_logging()
 
     provider = Provider.objects.get(id=provider_id)
-    admin_driver = get_admin_driver(provider)
-    # Non-End dated sizes on this provider
-    db_sizes = Size.objects.filter(only_current(), provider=provider)
-    all_sizes = admin_driver.list_sizes()
-    seen_sizes = []
-    for cloud_size in all_sizes:
-        core_size = convert_esh_size(cloud_size, provider.uuid)
-        seen_sizes.append(core_size)
-
-    now_time = timezone.now()
-    needs_end_date = [size for size in db_sizes if size not in seen_sizes]
-    for size in needs_end_date:
-        celery_logger.debug("End dating inactive size: %s" % size)
-        size.end_date = now_time
-        size.save()
-
-    # Find home for 'Unknown Size'
-    unknown_sizes = Size.objects.filter(
-        provider=provider, name__contains='Unknown Size'
-    )
-    for size in unknown_sizes:
-        # Lookup sizes may not show up in 'list_sizes'
-        if size.alias == 'N/A':
-            continue    # This is a sentinal value added for a separate purpose.
-        try:
-            libcloud_size = admin_driver.get_size(
-                size.alias, forced_lookup=True
-            )
-        except BaseHTTPError as error:
-            if error.code == 404:
-                # The size may have been truly deleted
-                continue
-        if not libcloud_size:
-            continue
-        cloud_size = OSSize(libcloud_size)
-        core_size = convert_esh_size(cloud_size, provider.uuid)
-
+    stats = RunStats("monitor_sizes_for", provider=provider)
+    with stats:
+        account_driver = get_account_driver(provider)
+        with stats.phase('list_cloud'):
+            cloud_sizes = account_driver.admin_driver.list_sizes()
+        SizeReconciler(
+            provider, account_driver, stats=stats
+        ).reconcile(cloud_sizes)
+    stats.log(celery_logger)
     if print_logs:
         _exit_stdout_logging(console_handler)
-    for size in seen_sizes:
-        size.esh = None
-    return seen_sizes
+    return stats.report()
+
 
+MAX_SHARED_MEMBERS = 128
 
-def _clean_memberships(db_machines, acct_driver=None):
+
+def _membership_count(membership_model, lookup, machine_ref):
+    """
+    Correlated COUNT(*) of `membership_model` rows for each ProviderMachine,
+    matching `membership_model.<lookup>` against `ProviderMachine.<machine_ref>`
+    """
+    counts = membership_model.objects.filter(**{
+        lookup: OuterRef(machine_ref)
+    }).order_by().values(lookup).annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _clean_memberships(db_machines, acct_driver=None, dry_run=False):
     """
     For each db_machine, check the # of shared access.
     If the # is >128, this application was made in error
     and should be 'cleaned' so it can be re-built in the next
     run of 'monitor_machines'
+
+    All three membership counts (machine, version, application) are
+    annotated onto `db_machines` in a single query, so only the
+    'oversized' machines are ever loaded.
     """
-    for db_machine in db_machines:
-        members_qs = db_machine.members.all()
-        group_key = 'group__name'
-        if members_qs.count() < 128:
-            members_qs = db_machine.application_version.membership.all()
-        if members_qs.count() < 128:
-            members_qs = db_machine.application.applicationmembership_set.all()
-            group_key = 'group_ptr__name'
-        if members_qs.count() < 128:
-            continue
-        for member in members_qs.order_by(group_key):
-            image_version = db_machine.application_version
-            remove_membership(image_version, member.group, acct_driver)
+    oversized_machines = db_machines.annotate(
+        machine_members=_membership_count(
+            ProviderMachineMembership, 'provider_machine', 'pk'
+        ),
+        version_members=_membership_count(
+            ApplicationVersionMembership, 'image_version', 'application_version'
+        ),
+        application_members=_membership_count(
+            ApplicationMembership, 'application',
+            'application_version__application'
+        ),
+    ).filter(
+        Q(machine_members__gte=MAX_SHARED_MEMBERS) |
+        Q(version_members__gte=MAX_SHARED_MEMBERS) |
+        Q(application_members__gte=MAX_SHARED_MEMBERS)
+    ).select_related('application_version')
+    removed = 0
+    for db_machine in oversized_machines:
+        image_version = db_machine.application_version
+        if db_machine.machine_members >= MAX_SHARED_MEMBERS:
+            members_qs = ProviderMachineMembership.objects.filter(
+                provider_machine=db_machine
+            )
+        elif db_machine.version_members >= MAX_SHARED_MEMBERS:
+            members_qs = ApplicationVersionMembership.objects.filter(
+                image_version=image_version
+            )
+        else:
+            members_qs = ApplicationMembership.objects.filter(
+                application=image_version.application_id
+            )
+        for member in members_qs.select_related('group'
+                                               ).order_by('group__name'):
+            celery_logger.info(
+                "Removing %s from oversized membership of %s" %
+                (member.group, image_version)
+            )
+            removed += 1
+            if not dry_run:
+                remove_membership(image_version, member.group, acct_driver)
+    return removed
 
 
 def _end_date_missing_database_machines(
     db_machines, cloud_machines, now=None, dry_run=False
 ):
+    """
+    End date every DB ProviderMachine that is missing from the cloud.
+    If all PMs of a version are end-dated, End date the ApplicationVersion
+    if all Versions of an application are end-dated, End date the Application
+
+    Returns the number of (machines, versions, applications) end-dated.
+    """
     if not now:
         now = timezone.now()
-    mach_count = 0
-    cloud_machine_ids = [mach.id for mach in cloud_machines]
-    for machine in db_machines:
-        cloud_match = [
-            mach for mach in cloud_machine_ids if mach == machine.identifier
-        ]
-        if not cloud_match:
-            remove_machine(machine, now, dry_run=dry_run)
-            mach_count += 1
-    return mach_count
+    cloud_machine_ids = {mach.id for mach in cloud_machines}
+    missing_machines = {}
+    for (machine_id, source_id, identifier,
+         version_id) in db_machines.values_list(
+             'id', 'instance_source_id', 'instance_source__identifier',
+             'application_version_id'
+         ):
+        if identifier in cloud_machine_ids:
+            continue
+        celery_logger.info("End dating machine: %s" % identifier)
+        missing_machines[machine_id] = (source_id, version_id)
+    if not missing_machines:
+        return (0, 0, 0)
+    if not dry_run:
+        InstanceSource.objects.filter(
+            id__in=[source_id for source_id, _ in missing_machines.values()]
+        ).update(end_date=now)
+
+    # Versions with another current machine are left alone.
+    version_ids = {
+        version_id
+        for _, version_id in missing_machines.values() if version_id
+    }
+    versions_in_use = set(
+        ProviderMachine.objects.filter(
+            Q(instance_source__end_date__isnull=True) |
+            Q(instance_source__end_date__gt=now),
+            application_version__in=version_ids,
+        ).exclude(id__in=missing_machines.keys()
+                 ).values_list('application_version_id', flat=True)
+    )
+    ended_versions = version_ids - versions_in_use
+    ended_versions_qs = ApplicationVersion.objects.filter(
+        only_current(now), id__in=ended_versions
+    )
+
+    # Applications with another current version are left alone.
+    application_ids = set(
+        ApplicationVersion.objects.filter(
+            id__in=ended_versions
+        ).values_list('application_id', flat=True)
+    )
+    applications_in_use = set(
+        ApplicationVersion.objects.filter(
+            only_current(now), application__in=application_ids
+        ).exclude(id__in=ended_versions
+                 ).values_list('application_id', flat=True)
+    )
+    ended_applications_qs = Application.objects.filter(
+        only_current(now), id__in=application_ids - applications_in_use
+    )
+    celery_logger.info(
+        "End dating versions: %s" %
+        list(ended_versions_qs.values_list('id', flat=True))
+    )
+    celery_logger.info(
+        "End dating applications: %s" %
+        list(ended_applications_qs.values_list('id', flat=True))
+    )
+    if dry_run:
+        return (
+            len(missing_machines), ended_versions_qs.count(),
+            ended_applications_qs.count()
+        )
+    counts = (
+        len(missing_machines), ended_versions_qs.update(end_date=now),
+        ended_applications_qs.update(end_date=now)
+    )
+    # Bulk updates skip the signals that maintain ApplicationVisibility
+    refresh_application_visibility(
+        ApplicationVersion.objects.filter(
+            id__in=version_ids
+        ).values_list('application_id', flat=True)
+    )
+    return counts
 
 
 def _remove_versions_without_machines(now=None):
     if not now:
         now = timezone.now()
-    ver_count = 0
     versions_without_machines = ApplicationVersion.objects.filter(
         machines__isnull=True, end_date__isnull=True
     )
-    ver_count = _perform_end_date(versions_without_machines, now)
-    return ver_count
+    return versions_without_machines.update(end_date=now)
 
 
 def _remove_applications_without_versions(now=None):
     if not now:
         now = timezone.now()
-    app_count = 0
     apps_without_versions = Application.objects.filter(
         versions__isnull=True, end_date__isnull=True
     )
-    app_count = _perform_end_date(apps_without_versions, now)
-    return app_count
+    return apps_without_versions.update(end_date=now)
 
 
 def _update_improperly_enddated_applications(now=None):
@@ -1029,16 +1092,29 @@ def _update_improperly_enddated_applications(now=None):
     # AND application has already been end-dated.
         end_date__isnull=False
     )
-    app_count = _perform_end_date(improperly_enddated_apps, now)
-    return app_count
+    app_ids = set(improperly_enddated_apps.values_list('id', flat=True))
+    if not app_ids:
+        return 0
+    return _perform_end_date(app_ids, now)
 
 
-def _perform_end_date(queryset, end_dated_at):
-    count = 0
-    for model in queryset:
-        model.end_date_all(end_dated_at)
-        count += 1
-    return count
+def _perform_end_date(application_ids, end_dated_at):
+    """
+    Bulk equivalent of `Application.end_date_all` for every application in
+    `application_ids` (machines, then versions, then applications).
+    """
+    InstanceSource.objects.filter(
+        providermachine__application_version__application__in=application_ids,
+        end_date__isnull=True
+    ).update(end_date=end_dated_at)
+    ApplicationVersion.objects.filter(
+        application__in=application_ids, end_date__isnull=True
+    ).update(end_date=end_dated_at)
+    Application.objects.filter(
+        id__in=application_ids, end_date__isnull=True
+    ).update(end_date=end_dated_at)
+    refresh_application_visibility(application_ids)
+    return len(application_ids)
 
 
 def _share_image(
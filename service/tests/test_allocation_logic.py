@@ -0,0 +1,286 @@
+import uuid
+from datetime import timedelta
+
+import mock
+from django.test import TestCase
+from django.utils import timezone
+
+from api.tests.factories import (
+    UserFactory, InstanceFactory, InstanceHistoryFactory, InstanceStatusFactory,
+    SizeFactory, AllocationSourceFactory
+)
+from core.models import (
+    EventTable, InstanceStatusHistory, UserAllocationSnapshot
+)
+from service.allocation_logic import (
+    calculate_usage, create_report, load_usage_histories,
+    refresh_user_allocation_snapshots, NO_USAGE
+)
+from service.allocation_vectorized import create_vectorized_report
+
+
+class AllocationUsageTestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(username='test-username')
+        self.active = InstanceStatusFactory.create(name='active')
+        self.size = SizeFactory.create(cpu=2)
+        self.source_a = AllocationSourceFactory.create(name='source-a')
+        self.source_b = AllocationSourceFactory.create(name='source-b')
+        self.launched = timezone.now() - timedelta(days=1)
+        self.window_start = self.launched - timedelta(days=1)
+
+    def _create_instance(self, hours=None):
+        instance = InstanceFactory.create(
+            provider_alias=str(uuid.uuid4()),
+            created_by=self.user,
+            start_date=self.launched
+        )
+        InstanceHistoryFactory.create(
+            instance=instance,
+            status=self.active,
+            size=self.size,
+            start_date=self.launched,
+            end_date=self.launched + timedelta(hours=hours) if hours else None
+        )
+        return instance
+
+    def _change_allocation_source(self, instance, allocation_source, hours):
+        EventTable.objects.create(
+            name='instance_allocation_source_changed',
+            entity_id=self.user.username,
+            payload={
+                'instance_id': instance.provider_alias,
+                'allocation_source_name': allocation_source.name
+            },
+            timestamp=self.launched + timedelta(hours=hours)
+        )
+
+
+class CalculateUsageTest(AllocationUsageTestCase):
+    def test_usage_is_split_by_allocation_source_changes(self):
+        instance = self._create_instance(hours=4)
+        self._change_allocation_source(instance, self.source_a, 0)
+        self._change_allocation_source(instance, self.source_b, 1)
+        usage = calculate_usage(self.window_start)
+        self.assertEqual(usage[('test-username', 'source-a')].compute_used, 2.0)
+        self.assertEqual(usage[('test-username', 'source-b')].compute_used, 6.0)
+
+    def test_usage_is_clipped_to_the_allocation_source_window(self):
+        instance = self._create_instance(hours=4)
+        self._change_allocation_source(instance, self.source_b, 0)
+        usage = calculate_usage(
+            self.window_start,
+            start_dates={'source-b': self.launched + timedelta(hours=3)}
+        )
+        self.assertEqual(usage[('test-username', 'source-b')].compute_used, 2.0)
+
+    def test_running_instances_count_toward_burn_rate(self):
+        instance = self._create_instance()
+        self._change_allocation_source(instance, self.source_a, 0)
+        usage = calculate_usage(self.window_start)
+        self.assertEqual(usage[('test-username', 'source-a')].burn_rate, 1)
+
+    def test_instances_without_allocation_source_are_not_charged(self):
+        self._create_instance(hours=4)
+        usage = calculate_usage(self.window_start)
+        self.assertEqual(
+            usage.get(('test-username', 'source-a'), NO_USAGE), NO_USAGE
+        )
+
+    def test_query_count_does_not_grow_with_instances(self):
+        for _ in range(5):
+            instance = self._create_instance(hours=4)
+            self._change_allocation_source(instance, self.source_a, 0)
+        with self.assertNumQueries(3):
+            calculate_usage(self.window_start)
+
+
+class RefreshUserAllocationSnapshotsTest(AllocationUsageTestCase):
+    def setUp(self):
+        super(RefreshUserAllocationSnapshotsTest, self).setUp()
+        # Refreshes within 12 hours of the launch resume on the same day
+        self.launched = self.launched.replace(
+            hour=8, minute=0, second=0, microsecond=0
+        )
+        self.window_start = self.launched - timedelta(days=1)
+        instance = self._create_instance(hours=4)
+        self._change_allocation_source(instance, self.source_a, 0)
+        self.users_by_source = {
+            self.source_a: [(self.user.id, self.user.username)]
+        }
+
+    def _refresh(self, hours, start_date=None):
+        return refresh_user_allocation_snapshots(
+            self.users_by_source, {'source-a': start_date or self.window_start},
+            self.launched + timedelta(hours=hours)
+        )[('test-username', 'source-a')]
+
+    def test_usage_accumulates_from_the_watermark(self):
+        self.assertEqual(self._refresh(1).compute_used, 2.0)
+        self.assertEqual(self._refresh(3).compute_used, 6.0)
+        snapshot = UserAllocationSnapshot.objects.get(user=self.user)
+        self.assertEqual(snapshot.compute_used, 6)
+        self.assertEqual(
+            snapshot.usage_watermark, self.launched + timedelta(hours=3)
+        )
+        self.assertEqual(
+            self._refresh(6).compute_used,
+            calculate_usage(
+                self.window_start, self.launched + timedelta(hours=6)
+            )[('test-username', 'source-a')].compute_used
+        )
+
+    def test_renewal_recomputes_from_the_new_start_date(self):
+        self._refresh(3)
+        renewed = self.launched + timedelta(hours=2)
+        self.assertEqual(self._refresh(4, start_date=renewed).compute_used, 4.0)
+
+    def test_new_pairs_do_not_move_resumed_windows(self):
+        self._refresh(1)
+        self.users_by_source[self.source_b] = [
+            (self.user.id, self.user.username)
+        ]
+        with mock.patch(
+            'service.allocation_logic.load_usage_histories',
+            wraps=load_usage_histories
+        ) as load:
+            usage = refresh_user_allocation_snapshots(
+                self.users_by_source, {
+                    'source-a': self.window_start,
+                    'source-b': self.window_start
+                }, self.launched + timedelta(hours=3)
+            )
+        self.assertEqual(
+            sorted(call[0][0] for call in load.call_args_list),
+            [self.window_start, self.launched + timedelta(hours=1)]
+        )
+        self.assertEqual(usage[('test-username', 'source-a')].compute_used, 6)
+        self.assertEqual(usage[('test-username', 'source-b')], NO_USAGE)
+        self.assertEqual(
+            UserAllocationSnapshot.objects.get(
+                user=self.user, allocation_source=self.source_a
+            ).usage_seconds, 6 * 3600
+        )
+        self.assertTrue(
+            UserAllocationSnapshot.objects.filter(
+                user=self.user, allocation_source=self.source_b
+            ).exists()
+        )
+
+    def test_retroactive_end_dates_are_recounted_the_next_day(self):
+        self._refresh(3)
+        InstanceStatusHistory.objects.filter(
+            instance__created_by=self.user
+        ).update(end_date=self.launched + timedelta(hours=1))
+        # Resumed from the watermark: the hours already counted remain
+        self.assertEqual(self._refresh(4).compute_used, 6.0)
+        self.assertEqual(self._refresh(24).compute_used, 2.0)
+
+
+class VectorizedReportParityTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(username='test-username')
+        self.active = InstanceStatusFactory.create(name='active')
+        self.suspended = InstanceStatusFactory.create(name='suspended')
+        self.size = SizeFactory.create(cpu=2, mem=4, disk=20)
+        AllocationSourceFactory.create(name='source-a')
+        AllocationSourceFactory.create(name='source-b')
+        self.launched = timezone.now() - timedelta(days=1)
+        self.report_start = self.launched - timedelta(minutes=30)
+        self.report_end = self.launched + timedelta(hours=6)
+
+        switched = self._create_instance(
+            [(self.active, 0, 2), (self.suspended, 2, 3), (self.active, 3, 5)]
+        )
+        self._change_allocation_source(switched, 'source-a', -1)
+        self._change_allocation_source(switched, 'source-b', 1)
+        self._change_allocation_source(switched, 'source-a', 4)
+        self._create_instance([(self.active, 0, 4)])
+
+    def _at(self, hours):
+        return self.launched + timedelta(hours=hours)
+
+    def _create_instance(self, histories, owner=None):
+        instance = InstanceFactory.create(
+            provider_alias=str(uuid.uuid4()),
+            created_by=owner or self.user,
+            start_date=self.launched
+        )
+        for status, start, end in histories:
+            InstanceHistoryFactory.create(
+                instance=instance,
+                status=status,
+                size=self.size,
+                start_date=self._at(start),
+                end_date=self._at(end) if end is not None else None
+            )
+        return instance
+
+    def _change_allocation_source(
+        self, instance, source_name, hours, owner=None
+    ):
+        EventTable.objects.create(
+            name='instance_allocation_source_changed',
+            entity_id=(owner or self.user).username,
+            payload={
+                'instance_id': instance.provider_alias,
+                'allocation_source_name': source_name
+            },
+            timestamp=self._at(hours)
+        )
+
+    def _comparable(self, rows):
+        return sorted(
+            tuple(
+                round(value, 3) if isinstance(value, float) else value
+                for key, value in sorted(row.items()) if key != 'current_time'
+            ) for row in rows
+        )
+
+    def _reports(self, **kwargs):
+        # Running histories end 'now' -- the same 'now' for both reports
+        now = timezone.now()
+        with mock.patch(
+            'service.allocation_logic._get_current_date_utc', return_value=now
+        ), mock.patch(
+            'service.allocation_vectorized._get_current_date_utc',
+            return_value=now
+        ):
+            expected = create_report(
+                self.report_start, self.report_end, **kwargs
+            )
+            actual = create_vectorized_report(
+                self.report_start, self.report_end, **kwargs
+            )
+        return expected, actual
+
+    def _assert_parity(self, **kwargs):
+        expected, actual = self._reports(**kwargs)
+        self.assertTrue(expected)
+        self.assertEqual(self._comparable(actual), self._comparable(expected))
+
+    def test_parity_for_all_users(self):
+        self._assert_parity()
+
+    def test_parity_for_one_user_and_allocation_source(self):
+        self._assert_parity(
+            user_id='test-username', allocation_source_name='source-b'
+        )
+
+    def test_parity_for_running_histories(self):
+        owner = UserFactory.create(username='running-username')
+        # One instance: 'burn_rate' is only comparable per instance
+        running = self._create_instance([(self.active, 0, None)], owner=owner)
+        self._change_allocation_source(running, 'source-b', 3, owner=owner)
+        self._assert_parity(user_id='running-username')
+
+    def test_parity_without_allocation_source_changes(self):
+        owner = UserFactory.create(username='unchanged-username')
+        self._create_instance([(self.active, 0, 2)], owner=owner)
+        self._assert_parity(user_id='unchanged-username')
+
+    def test_parity_without_histories(self):
+        UserFactory.create(username='idle-username')
+        expected, actual = self._reports(user_id='idle-username')
+        self.assertEqual(actual, [])
+        self.assertEqual(actual, expected)
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import mock
+from django.test import SimpleTestCase, override_settings
+
+from service import cache
+from service.cache import (
+    LocalCache, cache_stats, get_cached_driver, invalidate_cached_driver,
+    reset_cache_stats
+)
+
+
+class FakeRedis(object):
+    """
+    The redis commands used by service.cache, kept in memory.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+        self.ttls[key] = ttl
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        with self._lock:
+            return self.locks.setdefault(name, threading.Lock())
+
+
+class LocalCacheTest(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        local = LocalCache(2)
+        local.set('a', 1, 60)
+        local.set('b', 2, 60)
+        self.assertEqual(local.get('a'), 1)
+        local.set('c', 3, 60)
+        self.assertIsNone(local.get('b'))
+        self.assertEqual(local.get('a'), 1)
+        self.assertEqual(local.get('c'), 3)
+        self.assertEqual(len(local), 2)
+
+    def test_expired_entries_are_misses(self):
+        local = LocalCache(2)
+        local.set('a', 1, -1)
+        self.assertIsNone(local.get('a'))
+
+
+class ListingCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch(
+            'service.cache.redis_connection', return_value=self.redis
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.listings.clear()
+        reset_cache_stats()
+        self.addCleanup(cache.listings.clear)
+        self.calls = 0
+
+    def _list(self):
+        self.calls += 1
+        return ['listing-%s' % self.calls]
+
+    def _get(self, key, force=False):
+        return cache._get_cached(key, self._list, lambda data: None, force)
+
+    def test_ttls_are_configurable(self):
+        with override_settings(CLOUD_CACHE_TTLS={'volumes': 5}):
+            self._get('volumes.1')
+        self.assertEqual(self.redis.ttls['volumes.1'], 5)
+        self._get('machines.1')
+        self.assertEqual(
+            self.redis.ttls['machines.1'], cache.DEFAULT_CACHE_TTLS['machines']
+        )
+
+    def test_listings_are_read_from_the_local_tier(self):
+        self.assertEqual(self._get('volumes.1'), ['listing-1'])
+        self.assertEqual(self._get('volumes.1'), ['listing-1'])
+        self.assertEqual(self.calls, 1)
+        stats = cache_stats()
+        self.assertEqual(stats['volumes.miss'], 1)
+        self.assertEqual(stats['volumes.refresh'], 1)
+        self.assertEqual(stats['volumes.local_hit'], 1)
+
+    def test_instances_are_only_cached_in_redis(self):
+        self._get('instances.1')
+        self.assertEqual(self._get('instances.1'), ['listing-1'])
+        self.assertIsNone(cache.listings.get('instances.1'))
+        self.assertEqual(cache_stats()['instances.redis_hit'], 1)
+        # Another worker invalidated the listing
+        self.redis.delete('instances.1')
+        self.assertEqual(self._get('instances.1'), ['listing-2'])
+
+    def test_force_refreshes_the_listing(self):
+        self._get('volumes.1')
+        self.assertEqual(self._get('volumes.1', force=True), ['listing-2'])
+
+    def test_concurrent_misses_refresh_once(self):
+        results = []
+
+        def slow_list():
+            time.sleep(0.1)
+            return self._list()
+
+        def read():
+            results.append(
+                cache._get_cached('volumes.1', slow_list, lambda data: None)
+            )
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [['listing-1']] * 4)
+        self.assertEqual(cache_stats()['volumes.refresh'], 1)
+
+
+class DriverCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.identity = mock.Mock(id=1)
+        self.fingerprint = mock.patch(
+            'service.cache.identity_driver_fingerprint', return_value='creds'
+        ).start()
+        self.get_esh_driver = mock.patch(
+            'service.cache.get_esh_driver',
+            side_effect=lambda identity: mock.Mock()
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        invalidate_cached_driver(identity=self.identity)
+
+    def _driver(self, **kwargs):
+        return get_cached_driver(identity=self.identity, **kwargs)
+
+    def test_force_builds_a_new_driver(self):
+        driver = self._driver()
+        self.assertIsNot(self._driver(force=True), driver)
+        self.assertIsNot(self._driver(), driver)
+
+    def test_drivers_are_reused_per_thread(self):
+        driver = self._driver()
+        self.assertIs(self._driver(), driver)
+        self.assertEqual(self.get_esh_driver.call_count, 1)
+        other_thread = []
+        thread = threading.Thread(
+            target=lambda: other_thread.append(self._driver())
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_thread[0], driver)
+
+    def test_credential_changes_rebuild_the_driver(self):
+        driver = self._driver()
+        self.fingerprint.return_value = 'new-creds'
+        self.assertIsNot(self._driver(), driver)
+
+    def test_invalidate_rebuilds_the_driver(self):
+        driver = self._driver()
+        invalidate_cached_driver(identity=self.identity)
+        self.assertIsNot(self._driver(), driver)
@@ -0,0 +1,66 @@
+import mock
+from django.test import TestCase, override_settings
+
+from api.tests.factories import ProviderFactory
+from core.models import ProviderCredential
+from service.driver import (
+    get_account_driver, invalidate_account_driver, account_driver_stats,
+    forget_credential_fingerprints, reset_account_driver_stats
+)
+
+
+class AccountDriverPoolTest(TestCase):
+    def setUp(self):
+        self.provider = ProviderFactory.create()
+        reset_account_driver_stats()
+        forget_credential_fingerprints()
+        self.build = mock.patch(
+            'service.driver._build_account_driver',
+            side_effect=lambda provider: mock.Mock()
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_account_driver_is_reused(self):
+        account_driver = get_account_driver(self.provider)
+        self.assertIs(get_account_driver(self.provider), account_driver)
+        self.assertEqual(self.build.call_count, 1)
+        stats = account_driver_stats()
+        self.assertEqual(stats['constructions'], 1)
+        self.assertEqual(stats['hit'], 1)
+
+    def test_credential_change_rebuilds_the_account_driver(self):
+        account_driver = get_account_driver(self.provider)
+        ProviderCredential.objects.create(
+            key='admin_url', value='https://keystone', provider=self.provider
+        )
+        self.assertIsNot(get_account_driver(self.provider), account_driver)
+
+    def test_credentials_are_not_read_on_every_lookup(self):
+        get_account_driver(self.provider)
+        with mock.patch(
+            'service.driver._account_driver_fingerprint'
+        ) as fingerprint:
+            get_account_driver(self.provider)
+        fingerprint.assert_not_called()
+
+    @override_settings(CREDENTIAL_FINGERPRINT_TTL=-1)
+    def test_expired_fingerprints_are_recomputed(self):
+        get_account_driver(self.provider)
+        with mock.patch(
+            'service.driver._account_driver_fingerprint',
+            return_value='changed'
+        ):
+            get_account_driver(self.provider)
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_invalidate_rebuilds_the_account_driver(self):
+        account_driver = get_account_driver(self.provider)
+        invalidate_account_driver(self.provider)
+        self.assertIsNot(get_account_driver(self.provider), account_driver)
+
+    @override_settings(ACCOUNT_DRIVER_TTL=-1)
+    def test_expired_account_driver_is_rebuilt(self):
+        get_account_driver(self.provider)
+        get_account_driver(self.provider)
+        self.assertEqual(self.build.call_count, 2)
+        self.assertEqual(account_driver_stats()['expired'], 1)
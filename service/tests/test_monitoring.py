@@ -0,0 +1,464 @@
+import uuid
+
+import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.tests.factories import (
+    UserFactory, ProviderFactory, IdentityFactory, InstanceFactory,
+    InstanceHistoryFactory, ProviderMachineFactory, AllocationSourceFactory,
+    UserAllocationSourceFactory, SizeFactory
+)
+from core.models import (
+    Credential, ProviderMachine, AllocationSourceSnapshot, Size, Volume
+)
+from core.models.volume import create_volume
+from core.plugins import AllocationSourcePluginManager
+from service.exceptions import EnforcementError
+from service.monitoring import (
+    InstanceReconciler, SizeReconciler, VolumeReconciler,
+    allocation_source_overage_enforcement_for, enforce_allocation_on_instances,
+    _convert_tenant_id_to_names, _get_instance_owner_map,
+    _wait_for_settled_instance
+)
+from service.tasks.monitoring import (
+    _end_date_missing_database_machines, monitor_allocation_sources
+)
+
+
+class InstanceReconcilerTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(username='test-username')
+        self.provider = ProviderFactory.create()
+        self.identity = IdentityFactory.create_identity(
+            created_by=self.user, provider=self.provider
+        )
+        Credential.objects.create(
+            key='ex_project_name', value='test-project', identity=self.identity
+        )
+        self.machine = ProviderMachineFactory.create_provider_machine(
+            self.user, self.identity
+        )
+
+    def _create_instance(self, open_histories=1):
+        instance = InstanceFactory.create(
+            provider_alias=uuid.uuid4(),
+            source=self.machine.instance_source,
+            created_by=self.user,
+            created_by_identity=self.identity,
+            start_date=timezone.now()
+        )
+        for _ in range(open_histories):
+            InstanceHistoryFactory.create(instance=instance)
+        return instance
+
+    def test_missing_instances_are_end_dated(self):
+        missing = self._create_instance()
+        reconciler = InstanceReconciler(self.provider)
+        with reconciler.stats:
+            reconciler.reconcile({'test-project': []})
+        missing.refresh_from_db()
+        self.assertIsNotNone(missing.end_date)
+        self.assertFalse(
+            missing.instancestatushistory_set.filter(end_date=None).exists()
+        )
+        report = reconciler.stats.report()
+        self.assertEqual(report['instances_end_dated'], 1)
+        self.assertEqual(report['histories_end_dated'], 1)
+
+    def test_unknown_tenants_are_left_alone(self):
+        untouched = self._create_instance()
+        reconciler = InstanceReconciler(self.provider)
+        with reconciler.stats:
+            reconciler.reconcile({'some-other-project': []})
+        untouched.refresh_from_db()
+        self.assertIsNone(untouched.end_date)
+
+    @override_settings(RUN_STATS_COUNT_QUERIES=True)
+    def test_query_count_does_not_grow_with_instances(self):
+        self._create_instance()
+        reconciler = InstanceReconciler(self.provider)
+        with reconciler.stats:
+            reconciler.reconcile({'test-project': []})
+        small_run = reconciler.stats.queries
+
+        for _ in range(10):
+            self._create_instance(open_histories=2)
+        reconciler = InstanceReconciler(self.provider)
+        with reconciler.stats:
+            reconciler.reconcile({'test-project': []})
+        self.assertEqual(reconciler.stats.queries, small_run)
+
+
+class ConvertTenantIdToNamesTest(TestCase):
+    def test_owners_are_resolved_through_the_index(self):
+        project = mock.Mock(id='project-id')
+        project.name = 'project-name'
+        tenant_index = {
+            'project-id': project,
+            'legacy-id': {
+                'id': 'legacy-id',
+                'name': 'legacy-name'
+            }
+        }
+        instances = [
+            mock.Mock(owner='project-id'),
+            mock.Mock(owner='legacy-id'),
+            mock.Mock(owner='unknown-id')
+        ]
+        _convert_tenant_id_to_names(instances, tenant_index)
+        self.assertEqual(
+            [instance.owner for instance in instances],
+            ['project-name', 'legacy-name', 'unknown-id']
+        )
+
+    def test_owner_map_refreshes_the_project_list(self):
+        accounts = mock.Mock()
+        accounts.get_tenant_index.return_value = {
+            'project-id': {
+                'id': 'project-id',
+                'name': 'new-project'
+            }
+        }
+        instance = mock.Mock(owner='project-id')
+        with mock.patch(
+            'service.driver.get_account_driver', return_value=accounts
+        ), mock.patch(
+            'service.monitoring.get_cached_instances', return_value=[instance]
+        ), mock.patch(
+            'service.monitoring._select_identities', return_value=[]
+        ):
+            owner_map = _get_instance_owner_map(ProviderFactory.create())
+        accounts.get_tenant_index.assert_called_once_with(force=True)
+        self.assertEqual(owner_map, {'new-project': [instance]})
+
+
+class CloudVolume(object):
+    def __init__(self, volume_id, tenant_id='project-id'):
+        self.id = volume_id
+        self.name = volume_id
+        self.size = 1
+        self.extra = {
+            'status': 'available',
+            'object': {
+                'os-vol-tenant-attr:tenant_id': tenant_id
+            }
+        }
+
+
+class VolumeReconcilerTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(username='test-username')
+        self.provider = ProviderFactory.create()
+        self.identity = IdentityFactory.create_identity(
+            created_by=self.user, provider=self.provider
+        )
+        Credential.objects.create(
+            key='ex_project_name', value='test-project', identity=self.identity
+        )
+        self.account_driver = mock.Mock()
+        self.account_driver.get_tenant_index.return_value = {
+            'project-id': {
+                'id': 'project-id',
+                'name': 'test-project'
+            }
+        }
+        self.kept = self._create_volume('kept-volume')
+        self.missing = self._create_volume('missing-volume')
+
+    def _create_volume(self, identifier):
+        return create_volume(
+            identifier, identifier, 1, self.provider.uuid, self.identity.uuid,
+            self.user
+        )
+
+    def _end_date(self, identifier):
+        return Volume.objects.get(
+            instance_source__identifier=identifier
+        ).end_date
+
+    def test_volumes_are_diffed_against_the_cloud(self):
+        reconciler = VolumeReconciler(self.provider, self.account_driver)
+        with reconciler.stats:
+            seen = reconciler.reconcile(
+                [
+                    CloudVolume('kept-volume'),
+                    CloudVolume('new-volume'),
+                    CloudVolume('orphan-volume', tenant_id='unknown-id'),
+                ]
+            )
+        self.assertEqual(
+            sorted(volume.identifier for volume in seen),
+            ['kept-volume', 'new-volume']
+        )
+        self.assertIsNone(self._end_date('kept-volume'))
+        self.assertIsNone(self._end_date('new-volume'))
+        self.assertIsNotNone(self._end_date('missing-volume'))
+        self.assertFalse(
+            Volume.objects.filter(instance_source__identifier='orphan-volume'
+                                 ).exists()
+        )
+        self.assertEqual(self.account_driver.get_tenant_index.call_count, 1)
+        report = reconciler.stats.report()
+        self.assertEqual(report['volumes_created'], 1)
+        self.assertEqual(report['volumes_skipped'], 1)
+        self.assertEqual(report['volumes_end_dated'], 1)
+
+
+class CloudSize(object):
+    def __init__(self, size_id, name, cpu=2, ram=4096):
+        self.id = size_id
+        self.name = name
+        self.cpu = cpu
+        self.ram = ram
+        self.disk = 20
+        self.ephemeral = 0
+
+
+class SizeReconcilerTest(TestCase):
+    def setUp(self):
+        self.provider = ProviderFactory.create()
+        self.account_driver = mock.Mock()
+        self.account_driver.list_all_sizes.return_value = [
+            CloudSize('private-size', 'm1.private')
+        ]
+        self.kept = SizeFactory.create(
+            provider=self.provider, alias='kept-size', name='m1.small'
+        )
+        self.missing = SizeFactory.create(
+            provider=self.provider, alias='missing-size'
+        )
+        self.unknown = SizeFactory.create(
+            provider=self.provider, alias='private-size', name='Unknown Size'
+        )
+
+    def _size(self, alias):
+        return Size.objects.get(provider=self.provider, alias=alias)
+
+    def test_sizes_are_diffed_against_the_cloud(self):
+        reconciler = SizeReconciler(self.provider, self.account_driver)
+        with reconciler.stats:
+            reconciler.reconcile(
+                [
+                    CloudSize('kept-size', 'm1.medium'),
+                    CloudSize('new-size', 'm1.large', cpu=8),
+                ]
+            )
+        kept = self._size('kept-size')
+        self.assertEqual((kept.name, kept.cpu), ('m1.medium', 2))
+        self.assertIsNone(kept.end_date)
+        self.assertEqual(self._size('new-size').cpu, 8)
+        self.assertIsNotNone(self._size('missing-size').end_date)
+        self.assertEqual(self._size('private-size').name, 'm1.private')
+        self.assertEqual(self.account_driver.list_all_sizes.call_count, 1)
+        report = reconciler.stats.report()
+        self.assertEqual(report['sizes_created'], 1)
+        self.assertEqual(report['sizes_updated'], 2)
+        self.assertEqual(report['hidden_sizes'], 1)
+
+    def test_listed_unknown_sizes_skip_the_full_listing(self):
+        reconciler = SizeReconciler(self.provider, self.account_driver)
+        reconciler.reconcile([CloudSize('private-size', 'm1.shared')])
+        self.assertEqual(self._size('private-size').name, 'm1.shared')
+        self.assertFalse(self.account_driver.list_all_sizes.called)
+
+
+class CloudMachine(object):
+    def __init__(self, machine_id):
+        self.id = machine_id
+
+
+class PruneMachinesTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(username='test-username')
+        self.provider = ProviderFactory.create()
+        self.identity = IdentityFactory.create_identity(
+            created_by=self.user, provider=self.provider
+        )
+        self.machine = ProviderMachineFactory.create_provider_machine(
+            self.user, self.identity
+        )
+        self.sibling = ProviderMachineFactory.create_provider_machine(
+            self.user, self.identity, version=self.machine.application_version
+        )
+        self.db_machines = ProviderMachine.objects.filter(
+            instance_source__provider=self.provider
+        )
+
+    def test_version_with_current_machine_is_kept(self):
+        counts = _end_date_missing_database_machines(
+            self.db_machines, [CloudMachine(str(self.sibling.identifier))]
+        )
+        self.assertEqual(counts, (1, 0, 0))
+        machine = ProviderMachine.objects.get(id=self.machine.id)
+        self.assertIsNotNone(machine.end_date)
+        self.assertIsNone(machine.application_version.end_date)
+
+    def test_cascade_to_version_and_application(self):
+        counts = _end_date_missing_database_machines(self.db_machines, [])
+        self.assertEqual(counts, (2, 1, 1))
+        machine = ProviderMachine.objects.get(id=self.machine.id)
+        self.assertIsNotNone(machine.application_version.end_date)
+        self.assertIsNotNone(machine.application.end_date)
+
+    def test_dry_run(self):
+        counts = _end_date_missing_database_machines(
+            self.db_machines, [], dry_run=True
+        )
+        self.assertEqual(counts, (2, 1, 1))
+        machine = ProviderMachine.objects.get(id=self.machine.id)
+        self.assertIsNone(machine.end_date)
+
+
+class CloudInstance(object):
+    def __init__(self, instance_id, status='active', task=None):
+        self.id = instance_id
+        self.extra = {'status': status, 'task': task}
+
+
+class FakeDriver(object):
+    def __init__(self, states):
+        self.states = list(states)
+
+    def get_instance(self, instance_id):
+        return self.states.pop(0)
+
+    def _is_active_instance(self, instance):
+        return instance.extra['status'] == 'active'
+
+
+class EnforcementTest(TestCase):
+    def setUp(self):
+        self.identity = mock.Mock()
+        self.identity.provider.uuid = uuid.uuid4()
+        self.action = mock.Mock()
+        self.action.name = 'Suspend'
+
+    def _execute(self, user, driver, identity, instance, action):
+        if instance.id == 'broken':
+            raise Exception("Cloud said no")
+        if instance.extra['status'] != 'active':
+            return 'skipped', None
+        return 'enforced', instance.id
+
+    @override_settings(ENFORCEMENT_CONCURRENCY={'default': 4})
+    def test_concurrent_results_keep_instance_order(self):
+        instances = [CloudInstance('instance-%s' % i) for i in range(6)]
+        instances.append(CloudInstance('broken'))
+        instances.append(CloudInstance('shelved', status='shelved'))
+        with mock.patch(
+            'service.monitoring._apply_provider_action',
+            side_effect=self._execute
+        ), mock.patch('service.monitoring.get_esh_driver'):
+            results = enforce_allocation_on_instances(
+                'test-username', None, self.identity, instances, self.action
+            )
+        self.assertEqual(
+            [result.instance_id for result in results],
+            [instance.id for instance in instances]
+        )
+        self.assertEqual(
+            [result.outcome for result in results],
+            ['enforced'] * 6 + ['failed', 'skipped']
+        )
+        self.assertEqual(results[-2].error, "Cloud said no")
+
+    @override_settings(ENFORCING=True)
+    def test_failures_are_raised_after_every_instance_is_tried(self):
+        self.identity.provider.over_allocation_action = self.action
+        instances = [
+            CloudInstance('instance'),
+            CloudInstance('broken'),
+            CloudInstance('shelved', status='shelved')
+        ]
+        with mock.patch(
+            'service.monitoring._apply_provider_action',
+            side_effect=self._execute
+        ), mock.patch('service.monitoring.get_cached_driver'), mock.patch(
+            'service.monitoring.get_esh_driver'
+        ), mock.patch(
+            'service.monitoring.filter_allocation_source_instances',
+            return_value=instances
+        ):
+            with self.assertRaises(EnforcementError) as raised:
+                allocation_source_overage_enforcement_for(
+                    None, 'test-username', self.identity
+                )
+        self.assertEqual(raised.exception.instances, ['instance'])
+        self.assertEqual(
+            raised.exception.failures, [('broken', "Cloud said no")]
+        )
+
+    def test_terminated_instances_are_enforced_with_the_given_driver(self):
+        self.action.name = 'Terminate'
+        instance = CloudInstance('instance')
+        instance.extra['metadata'] = {}
+        driver = FakeDriver([None])
+        with mock.patch('service.monitoring.destroy_instance') as destroy, \
+                mock.patch('service.monitoring.time.sleep'):
+            results = enforce_allocation_on_instances(
+                'test-username', driver, self.identity, [instance], self.action
+            )
+        self.assertEqual(results[0].outcome, 'enforced')
+        self.assertIsNone(results[0].core_instance)
+        self.assertIs(destroy.call_args[1]['esh_driver'], driver)
+
+    def test_polling_backs_off_until_the_instance_settles(self):
+        driver = FakeDriver(
+            [
+                CloudInstance('instance', task='suspending'),
+                CloudInstance('instance', task='suspending'),
+                CloudInstance('instance', status='suspended'),
+            ]
+        )
+        with mock.patch('service.monitoring.time.sleep') as sleep:
+            settled = _wait_for_settled_instance(driver, 'instance')
+        self.assertEqual(settled.extra['status'], 'suspended')
+        self.assertEqual(
+            [call[0][0] for call in sleep.call_args_list], [1, 2, 4]
+        )
+
+
+@mock.patch.object(
+    AllocationSourcePluginManager, 'list_of_classes',
+    ['jetstream.plugins.allocation_source.JetstreamAllocationSourcePlugin']
+)
+class MonitorAllocationSourcesTest(TestCase):
+    def setUp(self):
+        self.over = self._create_source('over-allocation', compute_used=20)
+        self.under = self._create_source('under-allocation', compute_used=5)
+
+    def _create_source(self, name, compute_used):
+        allocation_source = AllocationSourceFactory.create(
+            name=name, compute_allowed=10
+        )
+        AllocationSourceSnapshot.objects.create(
+            allocation_source=allocation_source,
+            compute_used=compute_used,
+            global_burn_rate=0
+        )
+        UserAllocationSourceFactory.create(
+            allocation_source=allocation_source,
+            user=UserFactory.create(username='%s-user' % name)
+        )
+        return allocation_source
+
+    def _enforced(self):
+        with mock.patch(
+            'service.tasks.monitoring.allocation_source_overage_enforcement_for_user'
+        ) as enforce_task, mock.patch('service.tasks.monitoring.celery_group'):
+            monitor_allocation_sources()
+        return [
+            call[1]['args'][0].name
+            for call in enforce_task.signature.call_args_list
+        ]
+
+    def test_only_over_allocation_is_enforced(self):
+        self.assertEqual(self._enforced(), ['over-allocation'])
+
+    def test_overrides_are_honored(self):
+        with override_settings(
+            ALLOCATION_OVERRIDES_NEVER_ENFORCE=['over-allocation'],
+            ALLOCATION_OVERRIDES_ALWAYS_ENFORCE=['under-allocation']
+        ):
+            self.assertEqual(self._enforced(), ['under-allocation'])
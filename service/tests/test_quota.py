@@ -0,0 +1,69 @@
+import mock
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from service.quota import QuotaSnapshot
+
+
+class CloudSize(object):
+    def __init__(self, cpu, ram):
+        self.cpu = cpu
+        self.ram = ram
+        self.extra = {'cpu': cpu}
+
+
+class CloudInstance(object):
+    def __init__(self, cpu=1, ram=1024):
+        self.size = mock.Mock(_size=CloudSize(cpu, ram))
+
+
+class QuotaSnapshotTest(TestCase):
+    def setUp(self):
+        self.identity = mock.Mock()
+        self.identity.quota = mock.Mock(
+            cpu=4,
+            memory=8,
+            instance_count=4,
+            floating_ip_count=2,
+            port_count=4,
+            storage=10,
+            storage_count=2,
+            snapshot_count=0
+        )
+        self.driver = mock.Mock()
+        self.driver.list_instances.return_value = [CloudInstance(cpu=2)]
+        self.driver._connection.ex_list_floating_ips.return_value = ['ip']
+        self.driver.list_volumes.return_value = [mock.Mock(size=4)]
+        self.fixed_ips = mock.patch(
+            'service.quota.list_quota_fixed_ips', return_value=['port']
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        self.snapshot = QuotaSnapshot(self.identity, driver=self.driver)
+
+    def test_each_listing_is_fetched_once(self):
+        self.snapshot.check_instance_quota(
+            CloudSize(cpu=1, ram=1024), include_networking=True
+        )
+        self.snapshot.check_instance_quota(CloudSize(cpu=1, ram=1024))
+        self.assertEqual(self.driver.list_instances.call_count, 1)
+        self.assertEqual(
+            self.driver._connection.ex_list_floating_ips.call_count, 1
+        )
+        self.assertEqual(self.fixed_ips.call_count, 1)
+
+    def test_unlimited_listings_are_not_fetched(self):
+        self.snapshot.check_storage_quota(new_disk=2, new_volume=1)
+        self.assertEqual(self.driver.list_volumes.call_count, 1)
+        self.assertFalse(self.driver._connection.ex_list_snapshots.called)
+
+    def test_over_quota_raises(self):
+        with self.assertRaises(ValidationError):
+            self.snapshot.check_instance_quota(CloudSize(cpu=4, ram=1024))
+        with self.assertRaises(ValidationError):
+            self.snapshot.check_storage_quota(new_disk=8, new_volume=1)
+
+    def test_unavailable_ports_are_not_enforced(self):
+        self.fixed_ips.side_effect = Exception("Neutron said no")
+        self.identity.quota.port_count = 1
+        self.snapshot.check_instance_quota(CloudSize(cpu=1, ram=1024))
+        self.assertIn('fixed_ips', self.snapshot.unavailable)
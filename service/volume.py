@@ -1,14 +1,14 @@
 from threepio import logger
 
 from django.core.exceptions import ValidationError
-from core.models.quota import get_quota, has_storage_count_quota
+from core.models.quota import has_storage_count_quota
 from core.models.identity import Identity
 from core.models.volume import Volume
 from core.models.instance_source import InstanceSource
 
 from service.cache import get_cached_driver
 from service.driver import _retrieve_source, get_esh_driver
-from service.quota import check_over_storage_quota
+from service.quota import check_over_storage_quota, get_quota_snapshot
 from service import exceptions
 from service.instance import boot_volume_instance
 
@@ -170,12 +170,25 @@ def create_esh_volume(
     image=None,
     raise_exception=False
 ):
-    quota = get_quota(identity_uuid)
+    quota_snapshot = get_quota_snapshot(
+        username, identity_uuid, driver=esh_driver
+    )
     try:
-        check_over_storage_quota(username, identity_uuid, new_volume_size=size)
+        check_over_storage_quota(
+            username,
+            identity_uuid,
+            new_volume_size=size,
+            quota_snapshot=quota_snapshot
+        )
     except ValidationError as over_quota:
         raise exceptions.OverQuotaError(message=over_quota.message)
-    if not has_storage_count_quota(esh_driver, quota, 1):
+    if not has_storage_count_quota(
+        esh_driver,
+        quota_snapshot.quota,
+        1,
+        raise_exc=False,
+        volumes=quota_snapshot.listings.get('volumes')
+    ):
         raise exceptions.OverQuotaError(
             message="Maximum # of Storage Volumes Exceeded"
         )